@@ -5,8 +5,71 @@ from functools import lru_cache
 class Settings(BaseSettings):
     database_url: str
     gemini_api_key: str
+    gemini_model: str = ""
+    gemini_base_url: str = "https://generativelanguage.googleapis.com/v1beta"
     app_name: str = "Wiki Quiz App"
     debug: bool = True
+    auto_migrate: bool = True
+    generation_lock_timeout: float = 180.0
+    generation_lock_poll_interval: float = 0.5
+    llm_max_concurrency: int = 32
+    llm_max_connections: int = 64
+    llm_keepalive_expiry: float = 30.0
+    llm_connect_timeout: float = 10.0
+    llm_timeout: float = 90.0
+    llm_requests_per_minute: int = 60
+    llm_tokens_per_minute: int = 1000000
+    llm_process_count: int = 1
+    llm_max_retries: int = 3
+    llm_retry_base_delay: float = 1.0
+    llm_retry_max_delay: float = 30.0
+    llm_governor_max_wait: float = 60.0
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_reset_timeout: float = 30.0
+    llm_sharded_min_questions: int = 8
+    llm_questions_per_shard: int = 3
+    llm_max_shards: int = 6
+    llm_shard_chars: int = 4000
+    llm_json_mode: bool = True
+    llm_topup_rounds: int = 1
+    quiz_bank_pool_size: int = 12
+    llm_condense_enabled: bool = True
+    llm_quiz_context_tokens: int = 1000
+    llm_simple_context_tokens: int = 600
+    llm_entities_context_tokens: int = 600
+    llm_condense_cache_entries: int = 256
+    llm_model_cache_path: str = ""
+    llm_model_cache_ttl: float = 24 * 3600
+    llm_cache_enabled: bool = True
+    llm_cache_ttl: float = 7 * 24 * 3600
+    llm_cache_max_entries: int = 50000
+    scraper_max_concurrent_fetches: int = 16
+    scraper_max_pending_parses: int = 8
+    scraper_parse_workers: int = 2
+    scraper_fetch_timeout: float = 10.0
+    scraper_engine: str = "lxml"
+    scraper_mirror_url: str = ""
+    batch_max_concurrency: int = 2
+    job_worker_concurrency: int = 4
+    job_embedded_workers: int = 0
+    job_poll_interval: float = 1.0
+    job_heartbeat_interval: float = 15.0
+    job_stale_after: float = 120.0
+    job_max_attempts: int = 3
+    job_retry_delay: float = 10.0
+    quiz_refresh_enabled: bool = True
+    quiz_refresh_budget_per_hour: int = 20
+    quiz_refresh_min_interval: float = 600
+    prefetch_enabled: bool = False
+    prefetch_topics_per_quiz: int = 3
+    prefetch_budget_per_hour: int = 30
+    prefetch_max_queued: int = 100
+    prefetch_idle_seconds: float = 10.0
+    prefetch_max_running: int = 1
+    quiz_cache_max_entries: int = 2048
+    quiz_cache_max_bytes: int = 64 * 1024 * 1024
+    quiz_cache_max_age: int = 300
+    history_cache_ttl: float = 5.0
 
     class Config:
         env_file = ".env"
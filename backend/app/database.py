@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import get_settings
@@ -16,6 +17,10 @@ engine = create_engine(
     pool_recycle=300,
 )
 
+# Advisory locks hold their connection for a whole generation, so they get their own
+# unpooled connections instead of pinning a slot in the pool the requests use
+lock_engine = create_engine(database_url, poolclass=NullPool)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -1,6 +1,6 @@
 # from fastapi import FastAPI
 # from fastapi.middleware.cors import CORSMiddleware
-# from app.database import engine, Base
+# from app.database import engine, Base, SessionLocal
 # from app.routers import quiz
 # from app.config import get_settings
 
@@ -38,44 +38,43 @@
 
 
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
-from app.database import engine, Base
 from app.routers import quiz
 from app.config import get_settings
+from app.migrations import ensure_schema
+from app.services.metrics import render_metrics
+from app.worker import build_worker
+import asyncio
 import os
 
 settings = get_settings()
 
-def run_migrations():
-    """Run database migrations to add missing columns"""
-    try:
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'quizzes' AND column_name = 'difficulty'
-            """))
-            
-            if result.fetchone() is None:
-                print("Adding 'difficulty' column...")
-                conn.execute(text("""
-                    ALTER TABLE quizzes 
-                    ADD COLUMN difficulty VARCHAR(20) DEFAULT 'mixed'
-                """))
-                conn.commit()
-                print("Migration completed!")
-    except Exception as e:
-        print(f"Migration check: {e}")
-
-Base.metadata.create_all(bind=engine)
-run_migrations()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_schema(auto_migrate=settings.auto_migrate)
+    # Local stand-in for `python -m app.worker`: run jobs inside the web process
+    stop = asyncio.Event()
+    embedded_worker = None
+    if settings.job_embedded_workers > 0:
+        worker = build_worker(quiz.job_queue, settings.job_embedded_workers)
+        embedded_worker = asyncio.create_task(worker.run(stop))
+    yield
+    stop.set()
+    if embedded_worker is not None:
+        await embedded_worker
+    await quiz.quiz_service.llm_service.response_cache.flush_hits()
+    await quiz.quiz_service.llm_service.transport.aclose()
+    await quiz.quiz_service.scraper.aclose()
+
 
 app = FastAPI(
     title=settings.app_name,
     description="Generate quizzes from Wikipedia articles using AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 allowed_origins = [
@@ -95,6 +94,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(quiz.router)
@@ -107,4 +107,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""Versioned schema migrations.
+
+Each step runs once, in order, inside its own transaction, and is recorded
+in the schema_version table. On Postgres the whole upgrade runs under an
+advisory lock so concurrent deploys or workers never race. Steps stay
+idempotent because databases created before versioning already have some
+of these changes applied.
+
+Run once per deploy with:
+
+    python -m app.migrations          # upgrade to the latest version
+    python -m app.migrations --status # print current and latest version
+"""
+import argparse
+from typing import Callable, List, NamedTuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.database import Base, engine as default_engine
+from app.models import BankQuestion, GenerationJob, QuizBatch, QuizBatchItem, SchemaVersion
+from app.services.generation_lock import advisory_lock_id
+from app.services.question_bank import backfill_question_bank, backfill_question_signatures
+from app.services.quiz_quality import mark_fallback_quizzes
+from app.services.snapshot_store import migrate_inline_html
+from app.services.url_canonicalizer import backfill_canonical_keys
+
+MIGRATION_LOCK_ID = advisory_lock_id("schema_migrations")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _create_tables(conn: Connection):
+    Base.metadata.create_all(bind=conn)
+
+
+def _add_difficulty(conn: Connection):
+    if not _has_column(conn, "quizzes", "difficulty"):
+        conn.execute(text("ALTER TABLE quizzes ADD COLUMN difficulty VARCHAR(20) DEFAULT 'mixed'"))
+
+
+def _add_page_snapshots(conn: Connection):
+    if not _has_column(conn, "quizzes", "snapshot_hash"):
+        conn.execute(text("ALTER TABLE quizzes ADD COLUMN snapshot_hash VARCHAR(64)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_quizzes_snapshot_hash ON quizzes (snapshot_hash)"))
+    moved = migrate_inline_html(Session(bind=conn))
+    if moved:
+        print(f"Moved {moved} inline raw_html rows to page_snapshots")
+
+
+def _add_history_index(conn: Connection):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_quizzes_created_at_id ON quizzes (created_at, id)"))
+
+
+def _add_canonical_key(conn: Connection):
+    if not _has_column(conn, "quizzes", "canonical_key"):
+        conn.execute(text("ALTER TABLE quizzes ADD COLUMN canonical_key VARCHAR(500)"))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE quizzes DROP CONSTRAINT IF EXISTS uq_quizzes_url_difficulty"))
+    conn.execute(text("DROP INDEX IF EXISTS uq_quizzes_url_difficulty"))
+    updated = backfill_canonical_keys(Session(bind=conn))
+    if updated:
+        print(f"Backfilled canonical_key for {updated} quizzes")
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_quizzes_canonical_key_difficulty "
+        "ON quizzes (canonical_key, difficulty)"
+    ))
+
+
+def _add_quiz_batches(conn: Connection):
+    QuizBatch.__table__.create(conn, checkfirst=True)
+    QuizBatchItem.__table__.create(conn, checkfirst=True)
+
+
+def _add_generation_jobs(conn: Connection):
+    GenerationJob.__table__.create(conn, checkfirst=True)
+
+
+def _add_quiz_quality(conn: Connection):
+    if not _has_column(conn, "quizzes", "quality"):
+        conn.execute(text("ALTER TABLE quizzes ADD COLUMN quality VARCHAR(20) NOT NULL DEFAULT 'llm'"))
+    if not _has_column(conn, "quizzes", "num_questions"):
+        conn.execute(text("ALTER TABLE quizzes ADD COLUMN num_questions INTEGER"))
+    if not _has_column(conn, "quizzes", "generated_at"):
+        conn.execute(text("ALTER TABLE quizzes ADD COLUMN generated_at TIMESTAMP WITH TIME ZONE"))
+        conn.execute(text("UPDATE quizzes SET generated_at = created_at"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_quizzes_quality ON quizzes (quality)"))
+    if not _has_column(conn, "generation_jobs", "kind"):
+        conn.execute(text("ALTER TABLE generation_jobs ADD COLUMN kind VARCHAR(20) NOT NULL DEFAULT 'generate'"))
+    marked = mark_fallback_quizzes(Session(bind=conn))
+    if marked:
+        print(f"Marked {marked} placeholder quizzes for regeneration")
+
+
+def _add_job_priority(conn: Connection):
+    if not _has_column(conn, "generation_jobs", "priority"):
+        conn.execute(text("ALTER TABLE generation_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_generation_jobs_status_priority "
+        "ON generation_jobs (status, priority, id)"
+    ))
+
+
+def _add_question_bank(conn: Connection):
+    BankQuestion.__table__.create(conn, checkfirst=True)
+    # Quizzes are now cached per length as well, since any length can be assembled from the bank
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE quizzes DROP CONSTRAINT IF EXISTS uq_quizzes_canonical_key_difficulty"))
+    conn.execute(text("DROP INDEX IF EXISTS uq_quizzes_canonical_key_difficulty"))
+    added = backfill_question_bank(Session(bind=conn))
+    if added:
+        print(f"Seeded the question bank with {added} stored questions")
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_quizzes_canonical_key_difficulty_count "
+        "ON quizzes (canonical_key, difficulty, num_questions)"
+    ))
+
+
+def _add_question_signatures(conn: Connection):
+    if not _has_column(conn, "question_bank", "signature"):
+        conn.execute(text("ALTER TABLE question_bank ADD COLUMN signature JSON"))
+    signed, removed = backfill_question_signatures(Session(bind=conn))
+    if signed or removed:
+        print(f"Signed {signed} bank questions and removed {removed} near-duplicates")
+
+
+def _resign_questions(conn: Connection):
+    # Questions are now shingled apart from their answers, so every stored signature is stale
+    conn.execute(text("UPDATE question_bank SET signature = NULL"))
+    signed, removed = backfill_question_signatures(Session(bind=conn))
+    if signed or removed:
+        print(f"Re-signed {signed} bank questions and removed {removed} near-duplicates")
+
+
+def _queue_batch_items(conn: Connection):
+    if not _has_column(conn, "quiz_batch_items", "job_id"):
+        conn.execute(text("ALTER TABLE quiz_batch_items ADD COLUMN job_id INTEGER"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_quiz_batch_items_job_id ON quiz_batch_items (job_id)"))
+    # Batch jobs take priority -1, so refreshes and prefetches move down one
+    conn.execute(text("UPDATE generation_jobs SET priority = priority - 1 WHERE priority < 0"))
+
+
+def _drop_history_index(conn: Connection):
+    # History pages by id now, so the (created_at, id) index only slows down inserts
+    conn.execute(text("DROP INDEX IF EXISTS ix_quizzes_created_at_id"))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_tables", _create_tables),
+    Migration(2, "add_quiz_difficulty", _add_difficulty),
+    Migration(3, "add_page_snapshots", _add_page_snapshots),
+    Migration(4, "add_history_index", _add_history_index),
+    Migration(5, "add_canonical_key", _add_canonical_key),
+    Migration(6, "add_quiz_batches", _add_quiz_batches),
+    Migration(7, "add_generation_jobs", _add_generation_jobs),
+    Migration(8, "add_job_priority", _add_job_priority),
+    Migration(9, "add_quiz_quality", _add_quiz_quality),
+    Migration(10, "add_question_bank", _add_question_bank),
+    Migration(11, "add_question_signatures", _add_question_signatures),
+    Migration(12, "resign_bank_questions", _resign_questions),
+    Migration(13, "queue_batch_items", _queue_batch_items),
+    Migration(14, "drop_history_index", _drop_history_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar() or 0
+
+
+def migrate(engine: Engine = default_engine) -> int:
+    """Apply pending migrations and return the resulting schema version"""
+    with engine.connect() as lock_conn:
+        is_postgres = lock_conn.dialect.name == "postgresql"
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+            lock_conn.commit()
+        try:
+            with engine.begin() as conn:
+                SchemaVersion.__table__.create(conn, checkfirst=True)
+                version = current_version(conn)
+
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+                print(f"Applying migration {migration.version}: {migration.name}")
+                with engine.begin() as conn:
+                    migration.apply(conn)
+                    conn.execute(
+                        SchemaVersion.__table__.insert().values(version=migration.version, name=migration.name)
+                    )
+                version = migration.version
+            return version
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+                lock_conn.commit()
+
+
+def ensure_schema(engine: Engine = default_engine, auto_migrate: bool = True) -> int:
+    """Boot-time check: a single version query when the schema is current.
+
+    If it is behind, either migrate (under the cluster-wide lock, so only the
+    first worker does the work) or refuse to start.
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+            "Run `python -m app.migrations` before starting the app."
+        )
+    return migrate(engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="print the current and latest version only")
+    args = parser.parse_args()
+
+    if args.status:
+        with default_engine.connect() as conn:
+            print(f"Schema version {current_version(conn)} (latest {LATEST_VERSION})")
+        return
+
+    version = migrate()
+    print(f"Schema is at version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, LargeBinary, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database import Base
 
 
 class Quiz(Base):
     __tablename__ = "quizzes"
+    __table_args__ = (
+        UniqueConstraint(
+            "canonical_key", "difficulty", "num_questions", name="uq_quizzes_canonical_key_difficulty_count"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String(500), index=True)
+    canonical_key = Column(String(500), nullable=True)
     title = Column(String(300))
     summary = Column(Text)
     key_entities = Column(JSON)
@@ -15,6 +22,123 @@ class Quiz(Base):
     quiz_data = Column(JSON)
     related_topics = Column(JSON)
     difficulty = Column(String(20), default="mixed")
-    raw_html = Column(Text, nullable=True)
+    # "llm", "partial" (fewer questions than requested) or "fallback" (placeholder questions)
+    quality = Column(String(20), default="llm", nullable=False, index=True)
+    num_questions = Column(Integer, nullable=True)
+    generated_at = Column(DateTime(timezone=True), server_default=func.now())
+    snapshot_hash = Column(String(64), index=True, nullable=True)
+    # Legacy inline HTML, moved into page_snapshots by the startup migration
+    raw_html = deferred(Column(Text, nullable=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class BankQuestion(Base):
+    __tablename__ = "question_bank"
+    __table_args__ = (
+        Index("ix_question_bank_canonical_key_difficulty", "canonical_key", "difficulty"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    canonical_key = Column(String(500), nullable=False)
+    # "easy", "medium" or "hard"
+    difficulty = Column(String(20), nullable=False)
+    question = Column(JSON, nullable=False)
+    # MinHash of the question text and answer, for near-duplicate checks (see question_dedup)
+    signature = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class PageSnapshot(Base):
+    __tablename__ = "page_snapshots"
+
+    content_hash = Column(String(64), primary_key=True)
+    encoding = Column(String(10), nullable=False)
+    size = Column(Integer, nullable=False)
+    data = deferred(Column(LargeBinary, nullable=False))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UrlAlias(Base):
+    __tablename__ = "url_aliases"
+
+    alias_key = Column(String(500), primary_key=True)
+    canonical_key = Column(String(500), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_response_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    model = Column(String(100), nullable=False)
+    response = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True)
+    last_used_at = Column(DateTime(timezone=True), index=True)
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String(200), nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class QuizBatch(Base):
+    __tablename__ = "quiz_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String(20), default="pending", nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    completed = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class QuizBatchItem(Base):
+    __tablename__ = "quiz_batch_items"
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(Integer, ForeignKey("quiz_batches.id", ondelete="CASCADE"), index=True, nullable=False)
+    position = Column(Integer, nullable=False)
+    url = Column(String(500), nullable=False)
+    difficulty = Column(String(20), default="mixed", nullable=False)
+    num_questions = Column(Integer, default=6, nullable=False)
+    status = Column(String(20), default="pending", nullable=False)
+    quiz_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    job_id = Column(Integer, index=True, nullable=True)
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        Index("ix_generation_jobs_status_run_after", "status", "run_after", "id"),
+        Index("ix_generation_jobs_status_priority", "status", "priority", "id"),
+        Index("ix_generation_jobs_canonical_key_difficulty", "canonical_key", "difficulty"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), nullable=False)
+    canonical_key = Column(String(500), nullable=False)
+    difficulty = Column(String(20), default="mixed", nullable=False)
+    num_questions = Column(Integer, default=6, nullable=False)
+    status = Column(String(20), default="queued", nullable=False)
+    # 0 for user requests, negative for refreshes and speculative prefetches (higher runs first)
+    priority = Column(Integer, default=0, nullable=False)
+    # "generate", or "refresh" to regenerate a degraded quiz in place
+    kind = Column(String(20), default="generate", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    quiz_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    error_status = Column(Integer, nullable=True)
+    worker_id = Column(String(100), nullable=True)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
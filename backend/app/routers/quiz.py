@@ -1,75 +1,282 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.schemas import QuizCreate, QuizResponse, QuizListItem, URLValidation, URLPreview
+from typing import List, Optional
+import asyncio
+import json
+from app.config import get_settings
+from app.database import get_db, SessionLocal
+from app.models import Quiz
+from app.schemas import (
+    BatchCreate, BatchStatus, DifficultyLevel, JobStatus, QuizCreate, QuizQuestion, QuizResponse, QuizListItem, URLValidation, URLPreview
+)
+from app.services.batch_service import BatchService
+from app.services.metrics import record_cache
+from app.services.job_queue import FINISHED_STATUSES, JobQueue
+from app.services.prefetcher import RelatedTopicPrefetcher
+from app.services.quiz_refresher import QuizRefresher
 from app.services.quiz_service import QuizService
+from app.services.response_cache import CachedResponse, make_etag, etag_matches
+from app.services.url_canonicalizer import canonicalize_url
+
+settings = get_settings()
 
 router = APIRouter(prefix="/api/quiz", tags=["quiz"])
 quiz_service = QuizService()
+job_queue = JobQueue(
+    quiz_service,
+    max_attempts=settings.job_max_attempts,
+    retry_delay=settings.job_retry_delay,
+    stale_after=settings.job_stale_after,
+)
+prefetcher = RelatedTopicPrefetcher(
+    job_queue,
+    enabled=settings.prefetch_enabled,
+    topics_per_quiz=settings.prefetch_topics_per_quiz,
+    budget_per_hour=settings.prefetch_budget_per_hour,
+    max_queued=settings.prefetch_max_queued,
+)
+refresher = QuizRefresher(
+    job_queue,
+    enabled=settings.quiz_refresh_enabled,
+    budget_per_hour=settings.quiz_refresh_budget_per_hour,
+    min_interval=settings.quiz_refresh_min_interval,
+)
+batch_service = BatchService(job_queue)
+
+
+def quiz_to_response(quiz: Quiz) -> dict:
+    return {
+        "id": quiz.id,
+        "url": quiz.url,
+        "title": quiz.title,
+        "summary": quiz.summary,
+        "key_entities": quiz.key_entities,
+        "sections": quiz.sections,
+        "quiz": quiz.quiz_data,
+        "related_topics": quiz.related_topics,
+        "difficulty": quiz.difficulty or "mixed",
+        "quality": quiz.quality or "llm",
+        "generated_at": quiz.generated_at or quiz.created_at,
+        "created_at": quiz.created_at
+    }
 
 
-@router.post("/generate", response_model=QuizResponse)
-async def generate_quiz(quiz_input: QuizCreate, db: Session = Depends(get_db)):
+def serialize_quiz(quiz: Quiz) -> CachedResponse:
+    body = QuizResponse.model_validate(quiz_to_response(quiz)).model_dump_json().encode("utf-8")
+    return CachedResponse(body=body, etag=make_etag(body))
+
+
+def cached_json_response(request: Request, entry: CachedResponse, cache_control: str) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control}
+    headers.update(dict(entry.extra_headers))
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def job_to_response(job) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "url": job.url,
+        "difficulty": job.difficulty,
+        "num_questions": job.num_questions,
+        "attempts": job.attempts,
+        "quiz_id": job.quiz_id,
+        "error": job.error,
+        "error_status": job.error_status,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at
+    }
+
+
+@router.post("/generate", response_model=JobStatus, status_code=202)
+async def generate_quiz(quiz_input: QuizCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     try:
-        quiz = await quiz_service.generate_quiz_async(
-            db, 
+        job = job_queue.enqueue(
+            db,
             str(quiz_input.url),
             quiz_input.difficulty.value,
             quiz_input.num_questions
         )
-        return {
-            "id": quiz.id,
-            "url": quiz.url,
-            "title": quiz.title,
-            "summary": quiz.summary,
-            "key_entities": quiz.key_entities,
-            "sections": quiz.sections,
-            "quiz": quiz.quiz_data,
-            "related_topics": quiz.related_topics,
-            "difficulty": quiz.difficulty,
-            "created_at": quiz.created_at
-        }
+        if job.status == "succeeded" and refresher.enabled:
+            # Answer with the stored quiz now; regenerate it in the background if it is degraded
+            background_tasks.add_task(refresher.schedule, job.quiz_id)
+        return job_to_response(job)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except ConnectionError as e:
-        raise HTTPException(status_code=503, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
-@router.get("/history", response_model=List[QuizListItem])
-async def get_quiz_history(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    quizzes = quiz_service.get_all_quizzes(db, skip, limit)
-    return [{
-        "id": q.id,
-        "url": q.url,
-        "title": q.title,
-        "difficulty": q.difficulty or "mixed",
-        "created_at": q.created_at
-    } for q in quizzes]
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = job_queue.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_response(job)
 
 
-@router.get("/{quiz_id}", response_model=QuizResponse)
-async def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
-    quiz = quiz_service.get_quiz_by_id(db, quiz_id)
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/generate/stream")
+async def generate_quiz_stream(url: str, difficulty: DifficultyLevel = DifficultyLevel.mixed, num_questions: int = 6):
+    try:
+        canonicalize_url(url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        # The stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        try:
+            async for event, data in quiz_service.generate_quiz_stream(db, url, difficulty.value, num_questions):
+                if event == "question":
+                    data = QuizQuestion.model_validate(data).model_dump()
+                yield sse_event(event, data)
+        except ValueError as e:
+            yield sse_event("error", {"status": 400, "detail": str(e)})
+        except ConnectionError as e:
+            yield sse_event("error", {"status": 503, "detail": str(e)})
+        except Exception as e:
+            yield sse_event("error", {"status": 500, "detail": f"An error occurred: {str(e)}"})
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def batch_to_response(batch, items) -> dict:
     return {
-        "id": quiz.id,
-        "url": quiz.url,
-        "title": quiz.title,
-        "summary": quiz.summary,
-        "key_entities": quiz.key_entities,
-        "sections": quiz.sections,
-        "quiz": quiz.quiz_data,
-        "related_topics": quiz.related_topics,
-        "difficulty": quiz.difficulty or "mixed",
-        "created_at": quiz.created_at
+        "id": batch.id,
+        "status": batch.status,
+        "total": batch.total,
+        "completed": batch.completed,
+        "failed": batch.failed,
+        "created_at": batch.created_at,
+        "finished_at": batch.finished_at,
+        "items": items
     }
 
 
+@router.post("/batch", response_model=BatchStatus, status_code=202)
+def create_batch(batch_input: BatchCreate, db: Session = Depends(get_db)):
+    # Sync so the up to 500 enqueues run on the threadpool, not the event loop
+    items = [{
+        "url": str(item.url),
+        "difficulty": item.difficulty.value,
+        "num_questions": item.num_questions
+    } for item in batch_input.items]
+    batch = batch_service.create_batch(db, items)
+    return batch_to_response(batch, batch_service.get_batch_items(db, batch.id))
+
+
+@router.get("/batch/{batch_id}", response_model=BatchStatus)
+async def get_batch(batch_id: int, db: Session = Depends(get_db)):
+    batch = batch_service.get_batch(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    batch = batch_service.sync(db, batch)
+    return batch_to_response(batch, batch_service.get_batch_items(db, batch_id))
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: int):
+    """Server-sent `status` events whenever the job changes, ending with `done` or `error`"""
+    db = SessionLocal()
+    try:
+        if job_queue.get_job(db, job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+    finally:
+        db.close()
+
+    async def event_stream():
+        last = None
+        while True:
+            db = SessionLocal()
+            try:
+                job = job_queue.get_job(db, job_id)
+                job = job_to_response(job) if job else None
+            finally:
+                db.close()
+            if job is None:
+                yield sse_event("error", {"status": 404, "detail": "Job not found"})
+                return
+            if (job["status"], job["attempts"]) != last:
+                last = (job["status"], job["attempts"])
+                yield sse_event("status", job)
+            if job["status"] == "succeeded":
+                yield sse_event("done", {"id": job["quiz_id"]})
+                return
+            if job["status"] in FINISHED_STATUSES:
+                yield sse_event("error", {"status": job["error_status"], "detail": job["error"]})
+                return
+            await asyncio.sleep(settings.job_poll_interval)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/history", response_model=List[QuizListItem])
+async def get_quiz_history(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    cache_key = (skip, limit, cursor)
+    entry = quiz_service.history_cache.get(cache_key)
+    record_cache("history_response", entry is not None)
+    if entry is None:
+        try:
+            quizzes, next_cursor = quiz_service.get_quiz_history(db, limit, cursor, skip)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        items = [QuizListItem(
+            id=q.id,
+            url=q.url,
+            title=q.title,
+            difficulty=q.difficulty or "mixed",
+            created_at=q.created_at
+        ).model_dump(mode="json") for q in quizzes]
+        body = json.dumps(items).encode("utf-8")
+        extra_headers = (("X-Next-Cursor", next_cursor),) if next_cursor else ()
+        entry = CachedResponse(body=body, etag=make_etag(body), extra_headers=extra_headers)
+        quiz_service.history_cache.put(cache_key, entry)
+    return cached_json_response(request, entry, "no-cache")
+
+
+@router.get("/{quiz_id}", response_model=QuizResponse)
+async def get_quiz(quiz_id: int, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    entry = quiz_service.quiz_cache.get(quiz_id)
+    record_cache("quiz_response", entry is not None)
+    cache_control = f"public, max-age={settings.quiz_cache_max_age}"
+    if entry is None:
+        quiz = quiz_service.get_quiz_by_id(db, quiz_id)
+        if not quiz:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        entry = serialize_quiz(quiz)
+        if refresher.needs_refresh(quiz):
+            # Serve it, but keep it out of every cache so the regenerated version shows up as soon as it lands
+            cache_control = "no-cache"
+            background_tasks.add_task(refresher.schedule, quiz_id)
+        else:
+            quiz_service.quiz_cache.put(quiz_id, entry)
+    if prefetcher.enabled:
+        background_tasks.add_task(prefetcher.record_view, quiz_id)
+    return cached_json_response(request, entry, cache_control)
+
+
 @router.post("/validate", response_model=URLPreview)
 async def validate_url(url_input: URLValidation):
-    result = quiz_service.validate_url(str(url_input.url))
-    return result
\ No newline at end of file
+    result = await quiz_service.validate_url_async(str(url_input.url))
+    return result
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 from typing import List, Optional
 from datetime import datetime
 from enum import Enum
@@ -41,6 +41,8 @@ class QuizResponse(BaseModel):
     quiz: List[QuizQuestion]
     related_topics: List[str]
     difficulty: str
+    quality: str = "llm"
+    generated_at: Optional[datetime] = None
     created_at: datetime
 
     class Config:
@@ -64,4 +66,52 @@ class URLValidation(BaseModel):
 
 class URLPreview(BaseModel):
     title: str
-    valid: bool
\ No newline at end of file
+    valid: bool
+
+
+class BatchItemCreate(BaseModel):
+    url: HttpUrl
+    difficulty: DifficultyLevel = DifficultyLevel.mixed
+    num_questions: int = 6
+
+
+class BatchCreate(BaseModel):
+    items: List[BatchItemCreate] = Field(..., min_length=1, max_length=500)
+
+
+class BatchItemStatus(BaseModel):
+    position: int
+    url: str
+    difficulty: str
+    num_questions: int
+    status: str
+    quiz_id: Optional[int] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BatchStatus(BaseModel):
+    id: int
+    status: str
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    items: List[BatchItemStatus] = []
+
+
+class JobStatus(BaseModel):
+    id: int
+    status: str
+    url: str
+    difficulty: str
+    num_questions: int
+    attempts: int
+    quiz_id: Optional[int] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
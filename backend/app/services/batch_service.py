@@ -0,0 +1,111 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app.models import GenerationJob, QuizBatch, QuizBatchItem
+from app.services.job_queue import FINISHED_STATUSES, PRIORITY_BATCH, JobQueue
+
+SETTLED_STATUSES = ("cached", "generated", "failed")
+
+
+class BatchService:
+    """Bulk quiz imports on top of the job queue.
+
+    Every item becomes a generation job at batch priority, so workers run
+    them, not the web process, and a restart loses nothing: any item that
+    never got its job is queued by the next worker's `resume`. Items asking
+    for the same quiz share one job, and the per-article lock and question
+    bank keep an article's quizzes to one scrape and one pool generation.
+    A batch's counters and status are derived from its items' jobs.
+    """
+
+    def __init__(self, job_queue: JobQueue):
+        self.job_queue = job_queue
+
+    def create_batch(self, db: Session, items: List[dict]) -> QuizBatch:
+        batch = QuizBatch(status="running", total=len(items))
+        db.add(batch)
+        db.flush()
+        db.add_all([
+            QuizBatchItem(
+                batch_id=batch.id,
+                position=position,
+                url=item["url"],
+                difficulty=item["difficulty"],
+                num_questions=item["num_questions"]
+            )
+            for position, item in enumerate(items)
+        ])
+        # Items are stored before any job, so a crash part way through is finished by `resume`
+        db.commit()
+        self.enqueue_items(db, batch.id)
+        return self.sync(db, batch)
+
+    def get_batch(self, db: Session, batch_id: int) -> Optional[QuizBatch]:
+        return db.query(QuizBatch).filter(QuizBatch.id == batch_id).first()
+
+    def get_batch_items(self, db: Session, batch_id: int) -> List[QuizBatchItem]:
+        return db.query(QuizBatchItem).filter(
+            QuizBatchItem.batch_id == batch_id
+        ).order_by(QuizBatchItem.position).all()
+
+    def enqueue_items(self, db: Session, batch_id: Optional[int] = None) -> int:
+        """Queue a job for every pending item that has none, returning how many were queued"""
+        query = db.query(QuizBatchItem).filter(
+            QuizBatchItem.status == "pending", QuizBatchItem.job_id.is_(None)
+        )
+        if batch_id is not None:
+            query = query.filter(QuizBatchItem.batch_id == batch_id)
+        queued = 0
+        for item in query.order_by(QuizBatchItem.id).all():
+            try:
+                job = self.job_queue.enqueue(
+                    db, item.url, item.difficulty, item.num_questions, priority=PRIORITY_BATCH
+                )
+            except ValueError as e:
+                item.status = "failed"
+                item.error = str(e)
+                db.commit()
+                continue
+            item.job_id = job.id
+            if job.status == "succeeded":
+                item.status = "cached"
+                item.quiz_id = job.quiz_id
+            db.commit()
+            queued += 1
+        return queued
+
+    def sync(self, db: Session, batch: QuizBatch) -> QuizBatch:
+        """Settle items whose jobs finished and recount the batch"""
+        items = self.get_batch_items(db, batch.id)
+        job_ids = [item.job_id for item in items if item.status == "pending" and item.job_id]
+        jobs = {
+            job.id: job for job in db.query(GenerationJob).filter(GenerationJob.id.in_(job_ids))
+        } if job_ids else {}
+        for item in items:
+            if item.status != "pending" or not item.job_id:
+                continue
+            job = jobs.get(item.job_id)
+            if job is None:
+                # The job row is gone; the next `resume` queues the item again
+                item.job_id = None
+            elif job.status == "succeeded":
+                item.status = "generated"
+                item.quiz_id = job.quiz_id
+            elif job.status in FINISHED_STATUSES:
+                item.status = "failed"
+                item.error = job.error
+
+        batch.completed = sum(item.status in ("cached", "generated") for item in items)
+        batch.failed = sum(item.status == "failed" for item in items)
+        if batch.status != "completed" and all(item.status in SETTLED_STATUSES for item in items):
+            batch.status = "completed"
+            batch.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        return batch
+
+    def resume(self, db: Session) -> int:
+        """Queue jobs for items that have none and settle unfinished batches; returns items queued"""
+        queued = self.enqueue_items(db)
+        for batch in db.query(QuizBatch).filter(QuizBatch.status != "completed").all():
+            self.sync(db, batch)
+        return queued
@@ -0,0 +1,203 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.services.metrics import record_cache, stage
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+WORD = re.compile(r"[a-z0-9]+")
+NUMBER = re.compile(r"\b\d[\d,.]*\b")
+PROPER_NOUN = re.compile(r"(?<!^)(?<![.!?]\s)\b[A-Z][a-z]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how i if in into is it its itself just may me might more most must my no nor not
+now of off on once only or other our out over own same she should so some such than that the their theirs
+them then there these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours one two many several however although though within
+""".split())
+
+MIN_SENTENCE_CHARS = 40
+MAX_SENTENCE_CHARS = 600
+# Sections whose share of the budget would be smaller than this are left out
+MIN_SECTION_CHARS = 200
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in WORD.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for sentence in SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if len(sentence) > MAX_SENTENCE_CHARS:
+            sentence = sentence[:MAX_SENTENCE_CHARS].rsplit(" ", 1)[0] + "..."
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+class ContentCondenser:
+    """Shrink an article to a character budget by keeping its most informative sentences.
+
+    Sentences are scored by TF-IDF similarity to the article as a whole
+    (a cheap stand-in for TextRank centrality), boosted for numbers, proper
+    nouns and title terms. The budget is split across sections by the square
+    root of their length so long sections cannot crowd out the rest, and the
+    chosen sentences are emitted in article order. Sentence scores are
+    cached per article and the output per (article, budget), so each task's
+    budget costs one scoring pass. Safe to call from worker threads.
+    """
+
+    def __init__(self, max_entries: int = 256, max_scored: int = 32):
+        self.max_entries = max_entries
+        self.max_scored = max_scored
+        self._entries: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._scored: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lru_get(entries: OrderedDict, key):
+        value = entries.get(key)
+        if value is not None:
+            entries.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _lru_put(entries: OrderedDict, key, value, limit: int):
+        entries[key] = value
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def condense(self, title: str, section_texts: Optional[List[Dict]], content: str, max_chars: int) -> str:
+        """Condensed article text of at most `max_chars`, from `section_texts` when available"""
+        sections = [s for s in section_texts or [] if s.get("text")]
+        if not sections:
+            sections = [{"heading": "Introduction", "text": content or ""}]
+
+        digest = hashlib.sha1(title.encode("utf-8"))
+        for section in sections:
+            digest.update(f"\0{section['heading']}\0{section['text']}".encode("utf-8"))
+        article = digest.hexdigest()
+
+        with self._lock:
+            cached = self._lru_get(self._entries, (article, max_chars))
+        record_cache("condensed", cached is not None)
+        if cached is not None:
+            return cached
+
+        with stage("condense"):
+            condensed = self._condense(article, title, sections, max_chars)
+        with self._lock:
+            self._lru_put(self._entries, (article, max_chars), condensed, self.max_entries)
+        return condensed
+
+    @staticmethod
+    def _render(blocks: List[Tuple[str, List[str]]]) -> str:
+        if len(blocks) == 1:
+            return " ".join(blocks[0][1])
+        return "\n\n".join(f"Section: {heading}\n{' '.join(sentences)}" for heading, sentences in blocks)
+
+    def _sentences(self, article: str, title: str, sections: List[Dict]) -> tuple:
+        """(sentences, scores) for an article, where each sentence is (section index, position, text, terms)"""
+        with self._lock:
+            scored = self._lru_get(self._scored, article)
+        if scored is None:
+            sentences = []
+            for index, section in enumerate(sections):
+                for position, sentence in enumerate(split_sentences(section["text"])):
+                    if len(sentence) >= MIN_SENTENCE_CHARS or position == 0:
+                        sentences.append((index, position, sentence, Counter(_terms(sentence))))
+            scored = (sentences, self._score(title, sentences))
+            with self._lock:
+                self._lru_put(self._scored, article, scored, self.max_scored)
+        return scored
+
+    def _condense(self, article: str, title: str, sections: List[Dict], max_chars: int) -> str:
+        whole = self._render([(s["heading"], [s["text"]]) for s in sections])
+        if len(whole) <= max_chars:
+            return whole
+
+        sentences, scores = self._sentences(article, title, sections)
+        if not sentences:
+            return whole[:max_chars]
+
+        allocation = self._allocate(sections, sentences, max_chars)
+
+        ranked = sorted(range(len(sentences)), key=lambda i: -scores[i])
+        remaining = dict(allocation)
+        chosen = set()
+        for i in ranked:
+            index = sentences[i][0]
+            cost = len(sentences[i][2]) + 1
+            if index in remaining and cost <= remaining[index]:
+                chosen.add(i)
+                remaining[index] -= cost
+        spare = sum(remaining.values())
+
+        # Hand the unused allowance to the best remaining sentences anywhere in the article
+        for i in ranked:
+            cost = len(sentences[i][2]) + 1
+            if i not in chosen and sentences[i][0] in allocation and cost <= spare:
+                chosen.add(i)
+                spare -= cost
+
+        blocks = []
+        for i in sorted(chosen):
+            heading = sections[sentences[i][0]]["heading"]
+            if not blocks or blocks[-1][0] != heading:
+                blocks.append((heading, []))
+            blocks[-1][1].append(sentences[i][2])
+        return self._render(blocks)[:max_chars] if blocks else whole[:max_chars]
+
+    @staticmethod
+    def _score(title: str, sentences: list) -> List[float]:
+        document_frequency = Counter()
+        for _, _, _, terms in sentences:
+            document_frequency.update(terms.keys())
+        n = len(sentences)
+        idf = {term: math.log((n + 1) / (df + 1)) + 1 for term, df in document_frequency.items()}
+
+        centroid = Counter()
+        vectors = []
+        for _, _, _, terms in sentences:
+            vector = {term: count * idf[term] for term, count in terms.items()}
+            vectors.append(vector)
+            centroid.update(vector)
+        centroid_norm = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+        title_terms = set(_terms(title))
+
+        scores = []
+        for (index, position, sentence, terms), vector in zip(sentences, vectors):
+            norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+            similarity = sum(weight * centroid[term] for term, weight in vector.items()) / (norm * centroid_norm)
+            facts = min(len(NUMBER.findall(sentence)), 3) * 0.15 + min(len(PROPER_NOUN.findall(sentence)), 5) * 0.08
+            bonus = 0.2 * len(title_terms & terms.keys()) + (0.3 if position == 0 else 0.0)
+            # The lead paragraph defines the subject; keep its first sentences likely
+            if index == 0 and position < 2:
+                bonus += 0.3
+            scores.append(similarity * (1 + facts) + bonus)
+        return scores
+
+    @staticmethod
+    def _allocate(sections: List[Dict], sentences: list, max_chars: int) -> Dict[int, int]:
+        """Per-section character allowance, proportional to sqrt(section length)"""
+        present = sorted({s[0] for s in sentences})
+        weights = {i: math.sqrt(len(sections[i]["text"])) * (1.5 if i == 0 else 1.0) for i in present}
+        # Header overhead for each kept section
+        overhead = {i: len(sections[i]["heading"]) + 12 for i in present}
+
+        while present:
+            total = sum(weights[i] for i in present)
+            usable = max_chars - sum(overhead[i] for i in present)
+            allocation = {i: int(usable * weights[i] / total) for i in present}
+            smallest = min(present, key=lambda i: weights[i])
+            if allocation[smallest] >= MIN_SECTION_CHARS or len(present) == 1:
+                return allocation
+            present.remove(smallest)
+        return {}
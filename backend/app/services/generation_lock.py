@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from sqlalchemy import text
+from app.config import get_settings
+from app.database import lock_engine
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-process execution.
+
+    The call runs in its own task that every caller awaits through a shield,
+    so one caller going away (a client disconnect, a preempted job) does not
+    cancel the others. The task is cancelled once its last caller is gone.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, list] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        entry = self._inflight.get(key)
+        if entry is None:
+            # [task, callers waiting on it]
+            entry = self._inflight[key] = [asyncio.ensure_future(fn()), 0]
+            entry[0].add_done_callback(lambda _, entry=entry: self._forget(key, entry))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not task.done():
+                # Nobody wants the result; new callers must not join a task being cancelled
+                self._forget(key, entry)
+                task.cancel()
+
+    def _forget(self, key: Hashable, entry: list):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+
+class KeyedLocks:
+    """In-process asyncio locks, created per key on demand and dropped once unused"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+
+_local_locks = KeyedLocks()
+
+
+def advisory_lock_id(key: str) -> int:
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+@asynccontextmanager
+async def advisory_lock(key: str):
+    """Hold `key` within this process and, on Postgres, across workers.
+
+    The in-process lock keeps user jobs, batches and refreshes in one
+    process from generating the same article at once, on any database.
+    Across processes a Postgres session-level advisory lock does the same;
+    it is polled with pg_try_advisory_lock so waiting never blocks the event
+    loop. On other databases, or if that lock cannot be taken before the
+    timeout, the unique constraint on quizzes is the backstop.
+    """
+    async with _local_locks.hold(key):
+        async with _advisory_lock(key) as acquired:
+            yield acquired
+
+
+def _try_lock(conn, lock_id: int) -> bool:
+    acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": lock_id}).scalar())
+    conn.commit()
+    return acquired
+
+
+def _unlock(conn, lock_id: int):
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+        conn.commit()
+    except Exception as e:
+        print(f"Advisory unlock failed: {e}")
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def _advisory_lock(key: str):
+    if lock_engine.dialect.name != "postgresql":
+        yield False
+        return
+
+    lock_id = advisory_lock_id(key)
+    # The session-level lock lives on this connection, which stays open while the
+    # lock is held; it comes from the unpooled lock engine and every call runs off the loop
+    conn = await asyncio.to_thread(lock_engine.connect)
+    acquired = False
+    try:
+        deadline = time.monotonic() + settings.generation_lock_timeout
+        while True:
+            acquired = await asyncio.to_thread(_try_lock, conn, lock_id)
+            if acquired or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(settings.generation_lock_poll_interval)
+
+        if not acquired:
+            print(f"Advisory lock timeout for {key}, continuing without lock")
+        yield acquired
+    finally:
+        if acquired:
+            await asyncio.to_thread(_unlock, conn, lock_id)
+        else:
+            await asyncio.to_thread(conn.close)
@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.models import GenerationJob, Quiz
+from app.services.quiz_service import QuizService
+from app.services.url_canonicalizer import canonicalize_url, resolve_alias
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed")
+PRIORITY_INTERACTIVE = 0
+# Bulk imports run after user jobs but, unlike background jobs, are never held back or preempted
+PRIORITY_BATCH = -1
+# Regenerating a degraded quiz someone is looking at beats speculative prefetches
+PRIORITY_REFRESH = -2
+PRIORITY_PREFETCH = -3
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def is_background(priority: int) -> bool:
+    """Refreshes and prefetches: claimed only by idle workers and preempted by user jobs"""
+    return priority < PRIORITY_BATCH
+
+
+class JobQueue:
+    """Generation jobs stored in the database and claimed by worker processes.
+
+    On Postgres a claim is SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of workers can poll the same table without handing out a job twice.
+    Other databases ignore the lock clause, which is fine for a single local
+    worker.
+    """
+
+    def __init__(self, quiz_service: QuizService, max_attempts: int = 3,
+                 retry_delay: float = 10.0, stale_after: float = 120.0):
+        self.quiz_service = quiz_service
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+
+    def enqueue(self, db: Session, url: str, difficulty: str = "mixed", num_questions: int = 6,
+                priority: int = PRIORITY_INTERACTIVE) -> GenerationJob:
+        """Queue a generation, or return an already finished or in-flight job for the same quiz"""
+        canonical = canonicalize_url(url)
+        key = resolve_alias(db, canonical.key)
+        now = utcnow()
+
+        existing = self.quiz_service._get_cached_by_key(db, key, difficulty, num_questions)
+        if existing:
+            # Reuse the job that produced the quiz, so repeated requests add no rows
+            finished = db.query(GenerationJob).filter(
+                GenerationJob.canonical_key == key,
+                GenerationJob.difficulty == difficulty,
+                GenerationJob.quiz_id == existing.id,
+                GenerationJob.status == "succeeded"
+            ).order_by(GenerationJob.id.desc()).first()
+            if finished:
+                return finished
+            job = GenerationJob(
+                url=canonical.url, canonical_key=key, difficulty=difficulty, num_questions=num_questions,
+                status="succeeded", quiz_id=existing.id, run_after=now, finished_at=now
+            )
+        else:
+            active = db.query(GenerationJob).filter(
+                GenerationJob.canonical_key == key,
+                GenerationJob.difficulty == difficulty,
+                GenerationJob.num_questions == num_questions,
+                GenerationJob.status.in_(ACTIVE_STATUSES)
+            ).order_by(GenerationJob.id).first()
+            if active:
+                # A user asking for a quiz that is only queued speculatively moves it to the front
+                if priority > active.priority:
+                    active.priority = priority
+                    db.commit()
+                return active
+            job = GenerationJob(
+                url=canonical.url, canonical_key=key, difficulty=difficulty, num_questions=num_questions,
+                status="queued", priority=priority, run_after=now
+            )
+
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def enqueue_refresh(self, db: Session, quiz: Quiz, min_interval: float = 0) -> Optional[GenerationJob]:
+        """Queue a background regeneration of a degraded quiz, unless one is queued or ran recently"""
+        num_questions = quiz.num_questions or max(len(quiz.quiz_data or []), 6)
+        recent = db.query(GenerationJob.id).filter(
+            GenerationJob.canonical_key == quiz.canonical_key,
+            GenerationJob.difficulty == quiz.difficulty,
+            GenerationJob.num_questions == num_questions,
+            GenerationJob.kind == "refresh",
+            (GenerationJob.status.in_(ACTIVE_STATUSES))
+            | (GenerationJob.created_at >= utcnow() - timedelta(seconds=min_interval))
+        ).first()
+        if recent:
+            return None
+
+        job = GenerationJob(
+            url=quiz.url, canonical_key=quiz.canonical_key, difficulty=quiz.difficulty or "mixed",
+            num_questions=num_questions,
+            status="queued", priority=PRIORITY_REFRESH, kind="refresh", run_after=utcnow()
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def get_job(self, db: Session, job_id: int) -> Optional[GenerationJob]:
+        return db.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+
+    def count_background(self, db: Session, since: Optional[datetime] = None, status: Optional[str] = None,
+                         kind: str = "generate") -> int:
+        """Count background jobs of one kind, optionally created after `since` or in one status"""
+        query = db.query(GenerationJob).filter(
+            GenerationJob.priority < PRIORITY_BATCH,
+            GenerationJob.kind == kind
+        )
+        if since is not None:
+            query = query.filter(GenerationJob.created_at >= since)
+        if status is not None:
+            query = query.filter(GenerationJob.status == status)
+        return query.count()
+
+    def claim(self, db: Session, worker_id: str, include_background: bool = True,
+              include_batch: bool = True) -> Optional[GenerationJob]:
+        """Claim the highest priority due job; batch and background jobs only when allowed"""
+        now = utcnow()
+        query = db.query(GenerationJob).filter(
+            GenerationJob.status == "queued",
+            GenerationJob.run_after <= now
+        )
+        if not include_batch:
+            query = query.filter(GenerationJob.priority >= PRIORITY_INTERACTIVE)
+        elif not include_background:
+            query = query.filter(GenerationJob.priority >= PRIORITY_BATCH)
+        job = query.order_by(
+            GenerationJob.priority.desc(), GenerationJob.id
+        ).with_for_update(skip_locked=True).first()
+        if job is None:
+            db.rollback()
+            return None
+
+        job.status = "running"
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        db.commit()
+        return job
+
+    def heartbeat(self, db: Session, job_id: int):
+        db.query(GenerationJob).filter(
+            GenerationJob.id == job_id,
+            GenerationJob.status == "running"
+        ).update({GenerationJob.heartbeat_at: utcnow()}, synchronize_session=False)
+        db.commit()
+
+    def complete(self, db: Session, job: GenerationJob, quiz_id: int):
+        job.status = "succeeded"
+        job.quiz_id = quiz_id
+        job.error = None
+        job.error_status = None
+        job.finished_at = utcnow()
+        db.commit()
+
+    def release(self, db: Session, job: GenerationJob):
+        """Hand a preempted job back to the queue without counting the attempt"""
+        db.rollback()
+        job.status = "queued"
+        job.attempts = max(0, job.attempts - 1)
+        job.worker_id = None
+        job.started_at = None
+        db.commit()
+
+    def fail(self, db: Session, job: GenerationJob, error: str, error_status: int, retry: bool):
+        """Requeue with exponential backoff while attempts remain, otherwise mark the job failed"""
+        db.rollback()
+        job.error = error
+        job.error_status = error_status
+        if retry and job.attempts < self.max_attempts:
+            job.status = "queued"
+            job.run_after = utcnow() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+        else:
+            job.status = "failed"
+            job.finished_at = utcnow()
+        db.commit()
+
+    def requeue_stale(self, db: Session) -> int:
+        """Put running jobs whose worker stopped heartbeating back in the queue"""
+        now = utcnow()
+        stale = db.query(GenerationJob).filter(
+            GenerationJob.status == "running",
+            GenerationJob.heartbeat_at < now - timedelta(seconds=self.stale_after)
+        )
+        # A job that keeps killing its worker must not be retried forever
+        stale.filter(GenerationJob.attempts >= self.max_attempts).update({
+            GenerationJob.status: "failed",
+            GenerationJob.error: "Worker stopped responding",
+            GenerationJob.error_status: 500,
+            GenerationJob.finished_at: now
+        }, synchronize_session=False)
+        count = stale.update(
+            {GenerationJob.status: "queued", GenerationJob.run_after: now}, synchronize_session=False
+        )
+        db.commit()
+        return count
@@ -0,0 +1,59 @@
+import json
+from typing import List, Sequence
+
+
+class IncrementalObjectParser:
+    """Pull complete JSON objects out of a growing, possibly truncated or fenced text.
+
+    Tracks string/escape state and brace depth across feed() calls, so each
+    object is emitted as soon as its closing brace arrives. Only objects that
+    parse on their own and contain all `required_keys` are returned, which
+    makes the parser indifferent to the wrapper ({"questions": [...]}, a bare
+    array, or code fences) around them.
+    """
+
+    def __init__(self, required_keys: Sequence[str] = ("question", "options")):
+        self.required_keys = tuple(required_keys)
+        self.buffer = ""
+        self._pos = 0
+        self._open: List[int] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.buffer += chunk
+        buf = self.buffer
+        found = []
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._open.append(i)
+            elif ch == "}" and self._open:
+                start = self._open.pop()
+                obj = self._load(buf[start:i + 1])
+                if obj is not None:
+                    found.append(obj)
+        self._pos = len(buf)
+        return found
+
+    def _load(self, text: str):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return None
+        if isinstance(obj, dict) and all(k in obj for k in self.required_keys):
+            return obj
+        return None
+
+
+def parse_objects(text: str, required_keys: Sequence[str] = ("question", "options")) -> List[dict]:
+    return IncrementalObjectParser(required_keys).feed(text or "")
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models import LLMCacheEntry
+
+
+def llm_cache_key(model: str, prompt: str, generation_config: dict) -> str:
+    material = json.dumps(
+        {"model": model, "config": generation_config, "prompt": prompt},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Persistent LLM response cache shared by all workers through the database.
+
+    Entries expire after `ttl` seconds; every `evict_every` stores the oldest
+    entries beyond `max_entries` (by last use) are dropped. Hit/miss counters
+    are per process.
+
+    A hit is a read only: entries' hit counts and last-use times are kept in
+    memory and written in one transaction every `touch_every` hits or
+    `touch_interval` seconds, and before each eviction.
+    """
+
+    def __init__(self, ttl: float = 7 * 24 * 3600, max_entries: int = 50000,
+                 enabled: bool = True, evict_every: int = 100,
+                 touch_every: int = 100, touch_interval: float = 60.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.evict_every = evict_every
+        self.touch_every = touch_every
+        self.touch_interval = touch_interval
+        self._touched: Dict[str, int] = {}
+        self._touched_since = time.monotonic()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0, "errors": 0}
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            response = await asyncio.to_thread(self._get_sync, key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"LLM cache read failed: {e}")
+            return None
+        self.stats["hits" if response is not None else "misses"] += 1
+        if response is not None:
+            self._touched[key] = self._touched.get(key, 0) + 1
+            if (sum(self._touched.values()) >= self.touch_every
+                    or time.monotonic() - self._touched_since >= self.touch_interval):
+                await self.flush_hits()
+        return response
+
+    async def flush_hits(self):
+        """Write the hit counts and last-use times gathered since the last flush"""
+        touched, self._touched = self._touched, {}
+        self._touched_since = time.monotonic()
+        if not touched:
+            return
+        try:
+            await asyncio.to_thread(self._touch_sync, touched)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"LLM cache hit update failed: {e}")
+
+    async def put(self, key: str, model: str, response: str):
+        if not self.enabled or not response:
+            return
+        try:
+            await asyncio.to_thread(self._put_sync, key, model, response)
+            self.stats["stores"] += 1
+            if self.stats["stores"] % self.evict_every == 0:
+                # Eviction goes by last use, so record recent hits first
+                await self.flush_hits()
+                self.stats["evictions"] += await asyncio.to_thread(self._evict_sync)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"LLM cache write failed: {e}")
+
+    async def invalidate(self, key: str):
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._invalidate_sync, key)
+            self.stats["invalidations"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"LLM cache invalidate failed: {e}")
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            entry = db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.cache_key == key,
+                LLMCacheEntry.expires_at > now
+            ).first()
+            return entry.response if entry is not None else None
+        finally:
+            db.close()
+
+    def _touch_sync(self, touched: Dict[str, int]):
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            for key, hits in touched.items():
+                db.execute(
+                    update(LLMCacheEntry).where(LLMCacheEntry.cache_key == key).values(
+                        hit_count=LLMCacheEntry.hit_count + hits, last_used_at=now
+                    )
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    def _put_sync(self, key: str, model: str, response: str):
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            db.merge(LLMCacheEntry(
+                cache_key=key,
+                model=model,
+                response=response,
+                hit_count=0,
+                expires_at=now + timedelta(seconds=self.ttl),
+                last_used_at=now
+            ))
+            db.commit()
+        except IntegrityError:
+            # Stored concurrently by another worker
+            db.rollback()
+        finally:
+            db.close()
+
+    def _invalidate_sync(self, key: str):
+        db = SessionLocal()
+        try:
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key == key).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _evict_sync(self) -> int:
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            evicted = db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.expires_at <= now
+            ).delete(synchronize_session=False)
+            
+            excess = db.query(LLMCacheEntry).count() - self.max_entries
+            if excess > 0:
+                oldest = db.query(LLMCacheEntry.cache_key).order_by(
+                    LLMCacheEntry.last_used_at.asc()
+                ).limit(excess).subquery()
+                evicted += db.query(LLMCacheEntry).filter(
+                    LLMCacheEntry.cache_key.in_(oldest.select())
+                ).delete(synchronize_session=False)
+            db.commit()
+            return evicted
+        finally:
+            db.close()
@@ -0,0 +1,204 @@
+import asyncio
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import httpx
+from app.services.metrics import LLM_WAITING
+
+# Highest priority first
+LANES = ("interactive", "batch", "prefetch")
+
+current_lane: ContextVar[str] = ContextVar("llm_lane", default="interactive")
+
+
+class LLMUnavailableError(ConnectionError):
+    """Gemini is rate limited or failing; the caller should retry later, not immediately"""
+
+
+@contextmanager
+def llm_lane(lane: str):
+    """Run LLM calls made in this context (and tasks started from it) in `lane`"""
+    token = current_lane.set(lane if lane in LANES else "interactive")
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header or the RetryInfo detail in a Gemini error body"""
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    match = re.search(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"', response.text or "")
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute's worth; a rate of 0 disables it"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        """Consume `amount`; a negative amount refunds. The balance may go below zero."""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial call through
+    every `reset_timeout` seconds until a call succeeds"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def is_open(self) -> bool:
+        return self.state != "closed" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state == "closed":
+                print(f"Gemini circuit breaker open after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class LLMGovernor:
+    """Shared gate in front of every Gemini call in this process.
+
+    Calls wait for a requests-per-minute and a tokens-per-minute bucket, in
+    lane order (interactive before batch before prefetch). A 429 pauses all
+    callers for its Retry-After (or a jittered exponential backoff), and
+    repeated 5xx or timeouts trip the circuit breaker so callers fail fast
+    with LLMUnavailableError instead of piling on.
+
+    The buckets and breaker live in this process only. The per-minute limits
+    are the quota for the whole deployment, so each of `processes` processes
+    gets an equal share of it.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_wait: float = 60.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 base_delay: float = 1.0, max_delay: float = 30.0, processes: int = 1):
+        processes = max(1, processes)
+        self.requests = TokenBucket(requests_per_minute / processes)
+        self.tokens = TokenBucket(tokens_per_minute / processes)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_wait = max_wait
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.blocked_until = 0.0
+        self._waiting = {lane: 0 for lane in LANES}
+        self.stats = {"requests": 0, "throttled": 0, "rate_limited": 0, "failures": 0, "rejected": 0}
+
+    def _higher_lane_waiting(self, lane: str) -> bool:
+        return any(self._waiting[other] for other in LANES[:LANES.index(lane)])
+
+    async def acquire(self, estimated_tokens: int, lane: Optional[str] = None) -> int:
+        """Wait for capacity and return the tokens reserved for the call"""
+        lane = lane if lane in LANES else current_lane.get()
+        deadline = time.monotonic() + self.max_wait
+        throttled = False
+        self._waiting[lane] += 1
+        LLM_WAITING.labels(lane).inc()
+        try:
+            while True:
+                if self.breaker.is_open():
+                    self.stats["rejected"] += 1
+                    raise LLMUnavailableError("Gemini API is unavailable, please try again shortly")
+
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0 and not self._higher_lane_waiting(lane):
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                    if wait <= 0 and self.breaker.allow():
+                        self.requests.take(1)
+                        self.tokens.take(estimated_tokens)
+                        self.stats["requests"] += 1
+                        return estimated_tokens
+
+                if now + max(wait, 0) > deadline:
+                    self.stats["rejected"] += 1
+                    raise LLMUnavailableError("Gemini rate limit reached, please try again shortly")
+                if not throttled:
+                    throttled = True
+                    self.stats["throttled"] += 1
+                await asyncio.sleep(min(max(wait, 0.05), 1.0))
+        finally:
+            self._waiting[lane] -= 1
+            LLM_WAITING.labels(lane).dec()
+
+    def retry_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def record_success(self, reserved: int, used: Optional[int] = None):
+        self.breaker.record_success()
+        if used is not None:
+            self.tokens.take(used - reserved)
+
+    def record_rate_limited(self, attempt: int, retry_after: Optional[float] = None, reserved: int = 0) -> float:
+        """Pause every caller until Gemini's quota window reopens; returns the pause in seconds.
+
+        A rejected call used no tokens, so its `reserved` tokens are refunded.
+        """
+        self.stats["rate_limited"] += 1
+        self.tokens.take(-reserved)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt + self.retry_delay(attempt))
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        return delay
+
+    def record_failure(self, reserved: int = 0):
+        """Count a 5xx or timeout towards the breaker and refund the call's `reserved` tokens"""
+        self.stats["failures"] += 1
+        self.tokens.take(-reserved)
+        self.breaker.record_failure()
@@ -1,88 +1,375 @@
-import requests
+import httpx
 import json
 import re
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import List
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional
 from app.config import get_settings
+from app.services.llm_transport import GeminiTransport, GeminiHTTPError
+from app.services.llm_governor import LLMGovernor, LLMUnavailableError, parse_retry_after
+from app.services.json_stream import IncrementalObjectParser, parse_objects
+from app.services.llm_cache import LLMResponseCache, llm_cache_key
+from app.services.content_condenser import ContentCondenser
+from app.services.model_resolver import GeminiModelResolver
+from app.services.question_bank import difficulty_targets
+from app.services.question_dedup import drop_near_duplicates, index_questions, report_duplicates, signature
+from app.services.metrics import (
+    LLM_CALL_SECONDS, LLM_IN_FLIGHT, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, LLM_RETRIES, LLM_TOKENS,
+    QUIZ_GENERATIONS, QUIZ_TOPUP_QUESTIONS, record_cache, stage, track
+)
 
 settings = get_settings()
 
+_bypass_cache: ContextVar[bool] = ContextVar("llm_bypass_cache", default=False)
+
+
+@contextmanager
+def bypass_llm_cache():
+    """Ask Gemini again for LLM calls made in this context instead of reusing cached responses;
+    fresh responses are still stored"""
+    token = _bypass_cache.set(True)
+    try:
+        yield
+    finally:
+        _bypass_cache.reset(token)
+
+# Gemini responseSchema (OpenAPI subset) for JSON mode; "question" first so streamed objects start usefully
+QUESTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "question": {"type": "STRING"},
+        "options": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "answer": {"type": "STRING"},
+        "difficulty": {"type": "STRING", "enum": ["easy", "medium", "hard"]},
+        "explanation": {"type": "STRING"},
+    },
+    "required": ["question", "options", "answer", "difficulty", "explanation"],
+    "propertyOrdering": ["question", "options", "answer", "difficulty", "explanation"],
+}
+QUIZ_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"questions": {"type": "ARRAY", "items": QUESTION_SCHEMA}},
+    "required": ["questions"],
+}
+ENTITIES_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "people": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "organizations": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "locations": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["people", "organizations", "locations"],
+}
+TOPICS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"topics": {"type": "ARRAY", "items": {"type": "STRING"}}},
+    "required": ["topics"],
+}
+
 
 class LLMService:
     def __init__(self):
         self.api_key = settings.gemini_api_key
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta"
-        self.model = self._find_working_model()
-        self.executor = ThreadPoolExecutor(max_workers=3)
-        print(f"Initialized LLM Service with model: {self.model}")
-
-    def _find_working_model(self) -> str:
-        models_to_try = [
-            "gemini-2.5-flash",
-            "gemini-1.5-flash",
-            "gemini-1.5-pro",
-            "gemini-pro",
-            "gemini-1.0-pro",
-        ]
+        self.base_url = settings.gemini_base_url.rstrip("/")
+        self.transport = GeminiTransport(
+            self.base_url,
+            self.api_key,
+            max_concurrency=settings.llm_max_concurrency,
+            max_connections=settings.llm_max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+            connect_timeout=settings.llm_connect_timeout,
+            default_timeout=settings.llm_timeout,
+        )
+        self.response_cache = LLMResponseCache(
+            ttl=settings.llm_cache_ttl,
+            max_entries=settings.llm_cache_max_entries,
+            enabled=settings.llm_cache_enabled,
+        )
+        self.governor = LLMGovernor(
+            requests_per_minute=settings.llm_requests_per_minute,
+            tokens_per_minute=settings.llm_tokens_per_minute,
+            max_wait=settings.llm_governor_max_wait,
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            reset_timeout=settings.llm_breaker_reset_timeout,
+            base_delay=settings.llm_retry_base_delay,
+            max_delay=settings.llm_retry_max_delay,
+            processes=settings.llm_process_count,
+        )
+        self.condenser = ContentCondenser(max_entries=settings.llm_condense_cache_entries)
+        self.model_resolver = GeminiModelResolver(
+            self.transport,
+            cache_path=settings.llm_model_cache_path,
+            ttl=settings.llm_model_cache_ttl,
+            pinned_model=settings.gemini_model,
+        )
+        print("Initialized LLM Service (model resolved on first call)")
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.model_resolver.model
+
+    def _generation_config(self, max_tokens: int, schema: Optional[dict] = None) -> dict:
+        config = {
+            "temperature": 0.7,
+            "maxOutputTokens": max_tokens,
+            "topP": 0.9,
+            "topK": 40
+        }
+        if schema and settings.llm_json_mode:
+            config["responseMimeType"] = "application/json"
+            config["responseSchema"] = schema
+        return config
+
+    def _cache_key(self, model: str, prompt: str, max_tokens: int, schema: Optional[dict] = None) -> str:
+        return llm_cache_key(model, prompt, self._generation_config(max_tokens, schema))
+
+    async def _forget_response(self, prompt: str, max_tokens: int, schema: Optional[dict] = None):
+        """Drop a cached response that turned out to be unusable"""
+        model = await self.model_resolver.get_model()
+        await self.response_cache.invalidate(self._cache_key(model, prompt, max_tokens, schema))
+
+    async def _context(self, title: str, content: str, section_texts: Optional[List[Dict]], task: str) -> str:
+        """Article text for a prompt, condensed to the task's token budget off the event loop"""
+        budget = {
+            "quiz": settings.llm_quiz_context_tokens,
+            "quiz_simple": settings.llm_simple_context_tokens,
+            "entities": settings.llm_entities_context_tokens,
+        }[task] * 4
+        if not settings.llm_condense_enabled:
+            return content[:budget]
+        return await asyncio.to_thread(self.condenser.condense, title, section_texts, content, budget)
+
+    def _estimate_tokens(self, prompt: str, max_tokens: int) -> int:
+        # Roughly four characters per token; the output side is reserved in full and refunded from usageMetadata
+        return len(prompt) // 4 + max_tokens
+
+    async def _call_llm(self, prompt: str, max_tokens: int = 4096, timeout: Optional[float] = None,
+                        task: str = "quiz", schema: Optional[dict] = None) -> str:
+        """Return the response text, or "" for an unusable response.
+
+        Rate limits, 5xx and timeouts are retried through the governor and
+        raise LLMUnavailableError once retries run out, so callers do not
+        answer an outage by firing another prompt.
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        LLM_PROMPT_CHARS.labels(task).observe(len(prompt))
+        try:
+            text = await self._complete(prompt, max_tokens, timeout, task, schema)
+            outcome = "ok" if text else "empty"
+            if text:
+                LLM_RESPONSE_CHARS.labels(task).observe(len(text))
+            return text
+        except LLMUnavailableError:
+            outcome = "unavailable"
+            raise
+        finally:
+            LLM_CALL_SECONDS.labels(task, outcome).observe(time.perf_counter() - start)
+
+    async def _complete(self, prompt: str, max_tokens: int, timeout: Optional[float], task: str,
+                        schema: Optional[dict] = None) -> str:
+        model = await self.model_resolver.get_model()
+        cache_key = self._cache_key(model, prompt, max_tokens, schema)
+        cached = None if _bypass_cache.get() else await self.response_cache.get(cache_key)
+        record_cache("llm", cached is not None)
+        if cached is not None:
+            print(f"LLM cache hit: {len(cached)} chars")
+            return cached
+
+        payload = {
+            "contents": [
+                {
+                    "parts": [{"text": prompt}]
+                }
+            ],
+            "generationConfig": self._generation_config(max_tokens, schema)
+        }
+        estimate = self._estimate_tokens(prompt, max_tokens)
         
-        for model in models_to_try:
+        for attempt in range(settings.llm_max_retries + 1):
+            reserved = await self.governor.acquire(estimate)
             try:
-                url = f"{self.base_url}/models/{model}:generateContent?key={self.api_key}"
-                payload = {
-                    "contents": [{"parts": [{"text": "Say hello"}]}],
-                    "generationConfig": {"maxOutputTokens": 10}
-                }
-                response = requests.post(url, json=payload, timeout=10)
-                if response.status_code == 200:
-                    print(f"Found working Gemini model: {model}")
-                    return model
-            except Exception as e:
-                print(f"Model {model} failed: {e}")
+                with track(LLM_IN_FLIGHT):
+                    response = await self.transport.generate_content(model, payload, timeout=timeout)
+            except httpx.TimeoutException:
+                print("Gemini API request timed out")
+                LLM_RETRIES.labels("timeout").inc()
+                self.governor.record_failure(reserved)
+                await self._backoff(attempt)
+                continue
+            except httpx.HTTPError as e:
+                print(f"LLM Error: {e}")
+                LLM_RETRIES.labels("transport").inc()
+                self.governor.record_failure(reserved)
+                await self._backoff(attempt)
                 continue
-        
-        return "gemini-2.5-flash"
-
-    def _call_llm(self, prompt: str, max_tokens: int = 4096) -> str:
-        try:
-            url = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
             
-            payload = {
-                "contents": [
-                    {
-                        "parts": [{"text": prompt}]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": max_tokens,
-                    "topP": 0.9,
-                    "topK": 40
-                }
-            }
+            if response.status_code == 404:
+                LLM_RETRIES.labels("model_not_found").inc()
+                self.governor.record_success(reserved, 0)
+                self.model_resolver.invalidate(model)
+                model = await self.model_resolver.get_model()
+                cache_key = self._cache_key(model, prompt, max_tokens, schema)
+                continue
             
-            response = requests.post(url, json=payload, timeout=90)
+            if response.status_code == 429:
+                LLM_RETRIES.labels("rate_limited").inc()
+                delay = self.governor.record_rate_limited(attempt, parse_retry_after(response), reserved)
+                print(f"Gemini rate limited, pausing calls for {delay:.1f}s")
+                continue
             
-            if response.status_code == 200:
+            if response.status_code >= 500:
+                print(f"Gemini API Error: {response.status_code} - {response.text[:500]}")
+                LLM_RETRIES.labels("server_error").inc()
+                self.governor.record_failure(reserved)
+                await self._backoff(attempt)
+                continue
+            
+            try:
                 data = response.json()
+            except ValueError:
+                data = {}
+            usage = data.get("usageMetadata", {}).get("totalTokenCount") if isinstance(data, dict) else None
+            self.governor.record_success(reserved, usage)
+            if usage:
+                LLM_TOKENS.labels(task).inc(usage)
+            
+            if response.status_code == 200:
                 if "candidates" in data and len(data["candidates"]) > 0:
                     candidate = data["candidates"][0]
                     if "content" in candidate and "parts" in candidate["content"]:
                         text = candidate["content"]["parts"][0]["text"]
                         print(f"LLM Response length: {len(text)} chars")
+                        await self.response_cache.put(cache_key, model, text)
                         return text
                 print(f"Unexpected response structure: {data}")
                 return ""
-            else:
-                print(f"Gemini API Error: {response.status_code} - {response.text[:500]}")
-                return ""
-                
-        except requests.Timeout:
-            print("Gemini API request timed out")
-            return ""
-        except Exception as e:
-            print(f"LLM Error: {e}")
+            
+            print(f"Gemini API Error: {response.status_code} - {response.text[:500]}")
             return ""
+        
+        raise LLMUnavailableError("Gemini API is rate limited or unavailable, please try again shortly")
+
+    async def _backoff(self, attempt: int):
+        if attempt < settings.llm_max_retries:
+            await asyncio.sleep(self.governor.retry_delay(attempt))
+
+    async def _stream_llm(self, prompt: str, max_tokens: int = 4096, timeout: Optional[float] = None,
+                          task: str = "stream", schema: Optional[dict] = None) -> AsyncIterator[str]:
+        """Like _call_llm, but yields the response text as it is generated.
+
+        Failures before the first chunk are retried like _call_llm; a stream
+        that breaks midway ends early with what it has.
+        """
+        model = await self.model_resolver.get_model()
+        cache_key = self._cache_key(model, prompt, max_tokens, schema)
+        cached = None if _bypass_cache.get() else await self.response_cache.get(cache_key)
+        record_cache("llm", cached is not None)
+        if cached is not None:
+            print(f"LLM cache hit: {len(cached)} chars")
+            yield cached
+            return
+
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": self._generation_config(max_tokens, schema)
+        }
+        estimate = self._estimate_tokens(prompt, max_tokens)
+        parts = []
+        finished = False
+        for attempt in range(settings.llm_max_retries + 1):
+            reserved = await self.governor.acquire(estimate)
+            try:
+                with track(LLM_IN_FLIGHT):
+                    async for text in self.transport.stream_generate_content(model, payload, timeout=timeout):
+                        parts.append(text)
+                        yield text
+                self.governor.record_success(reserved)
+                finished = True
+                break
+            except GeminiHTTPError as e:
+                print(str(e))
+                if e.status_code == 404:
+                    LLM_RETRIES.labels("model_not_found").inc()
+                    self.governor.record_success(reserved, 0)
+                    self.model_resolver.invalidate(model)
+                    model = await self.model_resolver.get_model()
+                    cache_key = self._cache_key(model, prompt, max_tokens, schema)
+                    continue
+                if e.status_code == 429:
+                    LLM_RETRIES.labels("rate_limited").inc()
+                    self.governor.record_rate_limited(attempt, e.retry_after, reserved)
+                    continue
+                if e.status_code >= 500:
+                    LLM_RETRIES.labels("server_error").inc()
+                    self.governor.record_failure(reserved)
+                    await self._backoff(attempt)
+                    continue
+                self.governor.record_success(reserved, 0)
+                break
+            except httpx.TimeoutException:
+                print("Gemini API stream timed out")
+                LLM_RETRIES.labels("timeout").inc()
+                # A stream that already produced text used its tokens, so only an empty one is refunded
+                self.governor.record_failure(0 if parts else reserved)
+            except Exception as e:
+                print(f"LLM stream error: {e}")
+                LLM_RETRIES.labels("transport").inc()
+                self.governor.record_failure(0 if parts else reserved)
+            if parts:
+                break
+            await self._backoff(attempt)
+        else:
+            raise LLMUnavailableError("Gemini API is rate limited or unavailable, please try again shortly")
+        
+        response = "".join(parts)
+        if response:
+            print(f"LLM streamed response length: {len(response)} chars")
+        # A stream cut short would be served truncated to every later caller
+        if response and finished:
+            await self.response_cache.put(cache_key, model, response)
+
+    async def stream_quiz(self, title: str, content: str, sections: List[str], difficulty: str = "mixed", num_questions: int = 6,
+                          section_texts: Optional[List[Dict]] = None) -> AsyncIterator[dict]:
+        """Yield validated questions one by one while the completion is still streaming"""
+        prompt = self._create_quiz_prompt(title, await self._context(title, content, section_texts, "quiz"), difficulty, num_questions)
+        parser = IncrementalObjectParser(required_keys=("question", "options"))
+        produced = []
+        index = index_questions([])
+        rejected = 0
+        
+        async for chunk in self._stream_llm(prompt, max_tokens=4096, task="stream", schema=QUIZ_SCHEMA):
+            for obj in parser.feed(chunk):
+                validated = self._validate_questions([obj], difficulty, 1)
+                if not validated or len(produced) >= num_questions:
+                    continue
+                if not index.add_if_new(signature(validated[0])):
+                    rejected += 1
+                    continue
+                produced.append(validated[0])
+                yield validated[0]
+        report_duplicates(rejected, "stream")
+        
+        if produced:
+            QUIZ_GENERATIONS.labels("stream").inc()
+        else:
+            await self._forget_response(prompt, 4096, QUIZ_SCHEMA)
+            LLM_RETRIES.labels("unparseable").inc()
+            print("Stream produced no questions, retrying with simplified prompt...")
+        
+        if produced:
+            completed = await self._fill_gaps(title, content, section_texts, list(produced), difficulty, num_questions)
+        else:
+            completed = await self._finish_quiz(
+                title, content, section_texts,
+                await self._generate_with_simple_prompt(title, content, difficulty, num_questions, section_texts),
+                difficulty, num_questions
+            )
+        for question in completed[len(produced):]:
+            yield question
 
     def _extract_json_from_response(self, response: str) -> str:
         """Extract JSON from response, handling various formats"""
@@ -94,20 +381,19 @@ class LLMService:
         response = re.sub(r'```\s*', '', response)
         response = response.strip()
         
-        # Try to find JSON object
-        json_match = re.search(r'\{[\s\S]*\}', response)
-        if json_match:
-            return json_match.group()
-        
-        # Try to find JSON array
-        array_match = re.search(r'\$\$[\s\S]*?\$\$', response)
-
-        if array_match:
-            return array_match.group()
+        # Decode the first complete JSON value, ignoring any prose before or after it
+        decoder = json.JSONDecoder()
+        for match in re.finditer(r'[\[{]', response):
+            try:
+                _, end = decoder.raw_decode(response, match.start())
+            except ValueError:
+                continue
+            return response[match.start():end]
         
         return response
 
-    def generate_quiz(self, title: str, content: str, sections: List[str], difficulty: str = "mixed", num_questions: int = 6) -> List[dict]:
+    async def generate_quiz(self, title: str, content: str, sections: List[str], difficulty: str = "mixed", num_questions: int = 6,
+                            section_texts: Optional[List[Dict]] = None, levels: Optional[Dict[str, int]] = None) -> List[dict]:
         """Generate quiz questions based on difficulty level"""
         
         print(f"\n{'='*50}")
@@ -115,61 +401,242 @@ class LLMService:
         print(f"{'='*50}")
         
         # Create difficulty-specific prompt
-        prompt = self._create_quiz_prompt(title, content, difficulty, num_questions)
+        prompt = self._create_quiz_prompt(
+            title, await self._context(title, content, section_texts, "quiz"), difficulty, num_questions, levels
+        )
         
         # Call LLM
-        response = self._call_llm(prompt, max_tokens=4096)
+        response = await self._call_llm(prompt, max_tokens=4096, schema=QUIZ_SCHEMA)
         
         if not response:
             print("ERROR: Empty response from LLM")
             return self._generate_fallback_quiz(title, difficulty, num_questions)
         
-        # Parse response
-        json_str = self._extract_json_from_response(response)
-        print(f"Extracted JSON length: {len(json_str)} chars")
+        validated = self._parse_questions(response, difficulty, num_questions)
+        if validated:
+            if len(validated) < num_questions:
+                print(f"PARTIAL: Recovered {len(validated)} of {num_questions} questions")
+            else:
+                print(f"SUCCESS: Generated {len(validated)} questions")
+            QUIZ_GENERATIONS.labels("llm").inc()
+            return await self._fill_gaps(title, content, section_texts, validated, difficulty, num_questions, levels)
         
+        print("ERROR: No questions could be recovered from the response")
+        print(f"Response preview: {response[:500]}")
+        
+        # Nothing usable at all: try a simpler prompt
+        await self._forget_response(prompt, 4096, QUIZ_SCHEMA)
+        LLM_RETRIES.labels("unparseable").inc()
+        print("Retrying with simplified prompt...")
+        questions = await self._generate_with_simple_prompt(title, content, difficulty, num_questions, section_texts)
+        return await self._finish_quiz(title, content, section_texts, questions, difficulty, num_questions, levels)
+
+    def _plan_shards(self, section_texts: List[Dict], num_questions: int) -> List[str]:
+        """Pack consecutive sections into chunks and pick an evenly spread subset"""
+        shard_chars = settings.llm_shard_chars
+        chunks = []
+        current = ""
+        for section in section_texts:
+            block = f"Section: {section['heading']}\n{section['text'][:shard_chars]}"
+            if current and len(current) + len(block) + 2 > shard_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{block}" if current else block
+        if current:
+            chunks.append(current)
+        
+        wanted = math.ceil(num_questions / max(settings.llm_questions_per_shard, 1))
+        n_shards = min(wanted, len(chunks), settings.llm_max_shards)
+        if n_shards <= 1:
+            return chunks[:n_shards]
+        
+        step = (len(chunks) - 1) / (n_shards - 1)
+        picks = sorted({round(i * step) for i in range(n_shards)})
+        return [chunks[i] for i in picks]
+
+    async def _generate_shard(self, title: str, chunk: str, difficulty: str, count: int) -> List[dict]:
+        prompt = self._create_quiz_prompt(title, chunk, difficulty, count)
+        response = await self._call_llm(prompt, max_tokens=1536, task="shard", schema=QUIZ_SCHEMA)
+        questions = self._parse_questions(response, difficulty, count)
+        if not questions and response:
+            await self._forget_response(prompt, 1536, QUIZ_SCHEMA)
+        return questions
+
+    def _difficulty_targets(self, difficulty: str, num_questions: int,
+                            levels: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        return dict(levels) if levels else difficulty_targets(difficulty, num_questions)
+
+    def _missing_questions(self, questions: List[dict], difficulty: str, num_questions: int,
+                           levels: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """How many questions of each difficulty the quiz still needs"""
+        short = num_questions - len(questions)
+        if short <= 0:
+            return {}
+        missing = self._difficulty_targets(difficulty, num_questions, levels)
+        for q in questions:
+            level = q.get("difficulty", "medium")
+            if missing.get(level, 0) > 0:
+                missing[level] -= 1
+        # Levels that came back over-filled leave fewer gaps than the per-level shortfalls add up to
+        while sum(missing.values()) > short:
+            missing[max(missing, key=missing.get)] -= 1
+        return {level: count for level, count in missing.items() if count > 0}
+
+    async def _fill_gaps(self, title: str, content: str, section_texts: Optional[List[Dict]], questions: List[dict],
+                         difficulty: str, num_questions: int, levels: Optional[Dict[str, int]] = None) -> List[dict]:
+        """Ask only for the questions that are missing, listing the existing ones so they are not repeated"""
+        for _ in range(settings.llm_topup_rounds):
+            missing = self._missing_questions(questions, difficulty, num_questions, levels)
+            if not missing:
+                break
+            added = await self._request_questions(title, content, section_texts, questions, missing)
+            if not added:
+                break
+            questions = questions + added
+        return questions
+
+    async def top_up_questions(self, title: str, content: str, section_texts: Optional[List[Dict]],
+                               existing: List[dict], missing: Dict[str, int]) -> List[dict]:
+        """New questions for a question bank that is `missing` some of each difficulty"""
+        added = []
+        missing = dict(missing)
+        for _ in range(max(settings.llm_topup_rounds, 1)):
+            if not missing:
+                break
+            new = await self._request_questions(title, content, section_texts, existing + added, missing)
+            if not new:
+                break
+            added += new
+            for q in new:
+                level = q.get("difficulty", "medium")
+                if missing.get(level, 0) > 0:
+                    missing[level] -= 1
+            missing = {level: count for level, count in missing.items() if count > 0}
+        return added
+
+    async def _request_questions(self, title: str, content: str, section_texts: Optional[List[Dict]],
+                                 questions: List[dict], missing: Dict[str, int]) -> List[dict]:
+        """One prompt for just the `missing` questions per difficulty; returns the new, unrepeated ones"""
+        wanted = sum(missing.values())
+        QUIZ_TOPUP_QUESTIONS.labels("requested").inc(wanted)
+        print(f"Topping up {wanted} missing questions: {missing}")
+        
+        context = await self._context(title, content, section_texts, "quiz_simple")
+        existing = "\n".join(f"- {q['question']}" for q in questions)
+        needed = ", ".join(f"{count} {level}" for level, count in missing.items())
+        prompt = f"""Write {wanted} more multiple choice questions about "{title}" for an existing quiz.
+
+NEEDED: {needed}
+
+ARTICLE CONTENT:
+{context}
+
+Do NOT repeat or rephrase these existing questions:
+{existing}
+
+Each question has exactly 4 options, an "answer" that exactly matches one option, a "difficulty" (easy, medium or hard) and a one-sentence "explanation".
+Return ONLY a JSON object: {{"questions": [...]}}"""
+        max_tokens = 350 * wanted + 200
         try:
-            data = json.loads(json_str)
-            
-            questions = []
-            if isinstance(data, dict):
-                if "questions" in data:
-                    questions = data["questions"]
-                elif "quiz" in data:
-                    questions = data["quiz"]
-                else:
-                    # Maybe the dict itself contains question fields
-                    questions = [data] if "question" in data else []
-            elif isinstance(data, list):
-                questions = data
-            
-            if questions:
-                validated = self._validate_questions(questions, difficulty, num_questions)
-                if validated:
-                    print(f"SUCCESS: Generated {len(validated)} questions")
-                    return validated
-                else:
-                    print("ERROR: No valid questions after validation")
+            response = await self._call_llm(prompt, max_tokens=max_tokens, task="topup", schema=QUIZ_SCHEMA)
+        except LLMUnavailableError:
+            # Keep the questions we have rather than fail the quiz
+            return []
+        
+        missing = dict(missing)
+        # A request for a single level is tagged with it, like a single-difficulty quiz
+        difficulty = next(iter(missing)) if len(missing) == 1 else "mixed"
+        picked, spare = [], []
+        for q in drop_near_duplicates(
+            self._parse_questions(response, difficulty, wanted * 2), index_questions(questions), "topup"
+        ):
+            level = q.get("difficulty", "medium")
+            if missing.get(level, 0) > 0:
+                missing[level] -= 1
+                picked.append(q)
             else:
-                print("ERROR: No questions found in response")
-                print(f"Response preview: {json_str[:500]}")
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON Parse Error: {e}")
-            print(f"Response preview: {json_str[:500] if json_str else 'empty'}")
+                spare.append(q)
+        added = (picked + spare)[:wanted]
+        if not added:
+            if response:
+                await self._forget_response(prompt, max_tokens, QUIZ_SCHEMA)
+            return []
+        QUIZ_TOPUP_QUESTIONS.labels("added").inc(len(added))
+        return added
+
+    async def _finish_quiz(self, title: str, content: str, section_texts: Optional[List[Dict]], questions: List[dict],
+                           difficulty: str, num_questions: int, levels: Optional[Dict[str, int]] = None) -> List[dict]:
+        """Top up a short quiz; the canned fallback quiz is only used when nothing was generated at all"""
+        if not questions:
+            return self._generate_fallback_quiz(title, difficulty, num_questions)
+        return await self._fill_gaps(title, content, section_texts, questions, difficulty, num_questions, levels)
+
+    def _rebalance(self, shard_results: List[List[dict]], difficulty: str, num_questions: int) -> List[dict]:
+        """Merge shard outputs round-robin, dropping duplicates and honouring the difficulty mix"""
+        targets = self._difficulty_targets(difficulty, num_questions)
+        
+        index = index_questions([])
+        queues = [drop_near_duplicates(questions, index, "merge") for questions in shard_results]
+        
+        selected = []
+        leftovers = []
+        while any(queues) and len(selected) < num_questions:
+            for queue in queues:
+                if not queue or len(selected) >= num_questions:
+                    continue
+                q = queue.pop(0)
+                level = q.get("difficulty", "medium")
+                if targets.get(level, 0) > 0:
+                    targets[level] -= 1
+                    selected.append(q)
+                else:
+                    leftovers.append(q)
         
-        # If we get here, try a simpler prompt
-        print("Retrying with simplified prompt...")
-        return self._generate_with_simple_prompt(title, content, difficulty, num_questions)
+        for q in leftovers:
+            if len(selected) >= num_questions:
+                break
+            selected.append(q)
+        return selected
+
+    async def generate_quiz_sharded(self, title: str, section_texts: List[Dict], sections: List[str], difficulty: str = "mixed", num_questions: int = 6) -> List[dict]:
+        """Ask for a few questions per section-aligned chunk in parallel, then merge"""
+        chunks = self._plan_shards(section_texts, num_questions)
+        # The whole article, for the single-prompt fallback and for top-ups when condensing is off
+        content = " ".join(section["text"] for section in section_texts)
+        if len(chunks) < 2:
+            return await self.generate_quiz(title, content, sections, difficulty, num_questions, section_texts)
+        
+        print(f"Generating {num_questions} {difficulty.upper()} questions for {title} across {len(chunks)} shards")
+        per_shard = math.ceil(num_questions / len(chunks)) + 1
+        levels = ["easy", "medium", "hard"]
+        shard_difficulties = [
+            levels[i % 3] if difficulty == "mixed" else difficulty for i in range(len(chunks))
+        ]
+        
+        shard_results = await asyncio.gather(*(
+            self._generate_shard(title, chunk, shard_difficulty, per_shard)
+            for chunk, shard_difficulty in zip(chunks, shard_difficulties)
+        ))
+        
+        merged = self._rebalance(shard_results, difficulty, num_questions)
+        if not merged:
+            print("Sharded generation produced no questions, falling back to a single prompt")
+            return await self.generate_quiz(title, content, sections, difficulty, num_questions, section_texts)
+        
+        print(f"SUCCESS: Merged {len(merged)} questions from {len(chunks)} shards")
+        QUIZ_GENERATIONS.labels("sharded").inc()
+        return await self._fill_gaps(title, content, section_texts, merged, difficulty, num_questions)
 
-    def _create_quiz_prompt(self, title: str, content: str, difficulty: str, num_questions: int) -> str:
-        """Create a prompt based on difficulty level"""
+    def _create_quiz_prompt(self, title: str, content: str, difficulty: str, num_questions: int,
+                            levels: Optional[Dict[str, int]] = None) -> str:
+        """Create a prompt based on difficulty level, or on an exact count per level"""
         
+        mix = self._difficulty_targets("mixed", num_questions, levels)
         difficulty_desc = {
             "easy": "EASY - Basic factual questions with obvious answers directly stated in the text. Use simple 'What', 'Who', 'Where', 'When' questions.",
             "medium": "MEDIUM - Questions requiring understanding of relationships and connections. Some inference needed but answers supported by text.",
             "hard": "HARD - Complex analytical questions requiring synthesis of multiple facts. Deep understanding and critical thinking needed.",
-            "mixed": "MIXED - Include 2 easy, 2 medium, and 2 hard questions."
+            "mixed": f"MIXED - Include {mix.get('easy', 0)} easy, {mix.get('medium', 0)} medium, and {mix.get('hard', 0)} hard questions."
         }
         
         diff_instruction = difficulty_desc.get(difficulty, difficulty_desc["mixed"])
@@ -179,7 +646,7 @@ class LLMService:
 DIFFICULTY LEVEL: {diff_instruction}
 
 ARTICLE CONTENT:
-{content[:5000]}
+{content}
 
 INSTRUCTIONS:
 1. Create exactly {num_questions} questions
@@ -218,12 +685,14 @@ Generate the quiz now:"""
 
         return prompt
 
-    def _generate_with_simple_prompt(self, title: str, content: str, difficulty: str, num_questions: int) -> List[dict]:
-        """Try with a simpler prompt if the main one fails"""
+    async def _generate_with_simple_prompt(self, title: str, content: str, difficulty: str, num_questions: int,
+                                           section_texts: Optional[List[Dict]] = None) -> List[dict]:
+        """Try with a simpler prompt if the main one fails; returns [] if this fails too"""
+        context = await self._context(title, content, section_texts, "quiz_simple")
         
         simple_prompt = f"""Create {num_questions} {difficulty} quiz questions about "{title}".
 
-Content: {content[:3000]}
+Content: {context}
 
 Return JSON format:
 {{"questions":[{{"question":"Q1?","options":["A","B","C","D"],"answer":"A","difficulty":"{difficulty}","explanation":"Why A is correct."}}]}}
@@ -235,27 +704,27 @@ Rules:
 - {difficulty} difficulty only
 - JSON only, no other text"""
 
-        response = self._call_llm(simple_prompt, max_tokens=3000)
+        response = await self._call_llm(simple_prompt, max_tokens=3000, task="quiz_simple", schema=QUIZ_SCHEMA)
         
         if not response:
             print("Simple prompt also failed")
-            return self._generate_fallback_quiz(title, difficulty, num_questions)
+            return []
         
-        json_str = self._extract_json_from_response(response)
+        validated = self._parse_questions(response, difficulty, num_questions)
+        if validated:
+            print(f"Simple prompt SUCCESS: {len(validated)} questions")
+            QUIZ_GENERATIONS.labels("simple_prompt").inc()
+            return validated
         
-        try:
-            data = json.loads(json_str)
-            questions = data.get("questions", data) if isinstance(data, dict) else data
-            
-            if questions:
-                validated = self._validate_questions(questions, difficulty, num_questions)
-                if validated:
-                    print(f"Simple prompt SUCCESS: {len(validated)} questions")
-                    return validated
-        except json.JSONDecodeError as e:
-            print(f"Simple prompt JSON error: {e}")
-        
-        return self._generate_fallback_quiz(title, difficulty, num_questions)
+        await self._forget_response(simple_prompt, 3000, QUIZ_SCHEMA)
+        return []
+
+    def _parse_questions(self, response: str, difficulty: str, num_questions: int) -> List[dict]:
+        """Every complete, valid and distinct question in the response, even if it is truncated or wrapped in prose"""
+        with stage("json_parse"):
+            questions = parse_objects(response)
+        validated = self._validate_questions(questions, difficulty, len(questions))
+        return drop_near_duplicates(validated)[:num_questions]
 
     def _validate_questions(self, questions: List, difficulty: str, num_questions: int) -> List[dict]:
         """Validate and fix questions"""
@@ -309,6 +778,7 @@ Rules:
     def _generate_fallback_quiz(self, title: str, difficulty: str, num_questions: int = 6) -> List[dict]:
         """Generate fallback questions when LLM fails"""
         print(f"WARNING: Using fallback quiz for {title}")
+        QUIZ_GENERATIONS.labels("fallback").inc()
         
         diff = difficulty if difficulty != "mixed" else "medium"
         
@@ -359,13 +829,13 @@ Rules:
         
         return fallback_questions[:num_questions]
 
-    def extract_entities(self, content: str) -> dict:
+    async def extract_entities(self, content: str, section_texts: Optional[List[Dict]] = None, title: str = "") -> dict:
         """Extract named entities from content"""
         
         prompt = f"""Extract named entities from this text into three categories.
 
 TEXT:
-{content[:3000]}
+{await self._context(title, content, section_texts, "entities")}
 
 Return JSON format:
 {{"people": ["Name 1", "Name 2"], "organizations": ["Org 1", "Org 2"], "locations": ["Place 1", "Place 2"]}}
@@ -376,7 +846,11 @@ Rules:
 - Use empty array [] if none found
 - Return ONLY JSON"""
 
-        response = self._call_llm(prompt, max_tokens=500)
+        try:
+            response = await self._call_llm(prompt, max_tokens=500, timeout=30, task="entities", schema=ENTITIES_SCHEMA)
+        except LLMUnavailableError:
+            # Entities are optional; do not fail the quiz over them
+            response = ""
         
         if not response:
             return {"people": [], "organizations": [], "locations": []}
@@ -385,15 +859,18 @@ Rules:
         
         try:
             data = json.loads(json_str)
+            if not isinstance(data, dict):
+                raise ValueError("entities response is not an object")
             return {
                 "people": data.get("people", [])[:8],
                 "organizations": data.get("organizations", [])[:8],
                 "locations": data.get("locations", [])[:8]
             }
-        except json.JSONDecodeError:
+        except ValueError:
+            await self._forget_response(prompt, 500, ENTITIES_SCHEMA)
             return {"people": [], "organizations": [], "locations": []}
 
-    def get_related_topics(self, title: str, links: List[str]) -> List[str]:
+    async def get_related_topics(self, title: str, links: List[str]) -> List[str]:
         """Get related Wikipedia topics"""
         
         if not links:
@@ -410,7 +887,10 @@ Return JSON format:
 
 Return ONLY JSON."""
 
-        response = self._call_llm(prompt, max_tokens=300)
+        try:
+            response = await self._call_llm(prompt, max_tokens=300, timeout=30, task="topics", schema=TOPICS_SCHEMA)
+        except LLMUnavailableError:
+            response = ""
         
         if not response:
             return available_links[:8]
@@ -422,33 +902,32 @@ Return ONLY JSON."""
             topics = data.get("topics", []) if isinstance(data, dict) else data
             return topics[:8] if isinstance(topics, list) else available_links[:8]
         except json.JSONDecodeError:
+            await self._forget_response(prompt, 300, TOPICS_SCHEMA)
             return available_links[:8]
 
-    async def generate_all_async(self, title: str, content: str, sections: List[str], links: List[str], difficulty: str = "mixed", num_questions: int = 6) -> dict:
-        """Generate all quiz data asynchronously"""
-        
-        loop = asyncio.get_event_loop()
-        
-        quiz_task = loop.run_in_executor(
-            self.executor,
-            self.generate_quiz,
-            title, content, sections, difficulty, num_questions
-        )
-        
-        entities_task = loop.run_in_executor(
-            self.executor,
-            self.extract_entities,
-            content
-        )
+    async def generate_all_async(self, title: str, content: str, sections: List[str], links: List[str], difficulty: str = "mixed", num_questions: int = 6, section_texts: Optional[List[Dict]] = None,
+                                 levels: Optional[Dict[str, int]] = None) -> dict:
+        """Generate all quiz data asynchronously.
+
+        `levels` asks for an exact count per difficulty, as a question bank pool
+        does; such a request is one prompt, never sharded.
+        """
         
-        topics_task = loop.run_in_executor(
-            self.executor,
-            self.get_related_topics,
-            title, links
+        use_shards = (
+            levels is None
+            and settings.llm_sharded_min_questions > 0
+            and num_questions >= settings.llm_sharded_min_questions
+            and section_texts and len(section_texts) >= 2
         )
+        if use_shards:
+            quiz_coro = self.generate_quiz_sharded(title, section_texts, sections, difficulty, num_questions)
+        else:
+            quiz_coro = self.generate_quiz(title, content, sections, difficulty, num_questions, section_texts, levels)
         
         quiz, entities, topics = await asyncio.gather(
-            quiz_task, entities_task, topics_task
+            quiz_coro,
+            self.extract_entities(content, section_texts, title),
+            self.get_related_topics(title, links)
         )
         
         return {
@@ -0,0 +1,109 @@
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+import httpx
+from app.services.llm_governor import parse_retry_after
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class GeminiHTTPError(Exception):
+    def __init__(self, status_code: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"Gemini API Error: {status_code} - {body}")
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+
+class GeminiTransport:
+    """Pooled keep-alive async HTTP client for the Gemini REST API.
+
+    One client (and concurrency semaphore) is kept per event loop, so the
+    service also works when driven from asyncio.run() in scripts.
+    """
+
+    def __init__(self, base_url: str, api_key: str, max_concurrency: int = 32,
+                 max_connections: int = 64, keepalive_expiry: float = 30.0,
+                 connect_timeout: float = 10.0, default_timeout: float = 90.0):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.in_flight = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(self.default_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    async def generate_content(self, model: str, payload: dict, timeout: Optional[float] = None) -> httpx.Response:
+        client = self._get_client()
+        url = f"{self.base_url}/models/{model}:generateContent"
+        request_timeout = httpx.Timeout(timeout or self.default_timeout, connect=self.connect_timeout)
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await client.post(
+                    url,
+                    params={"key": self.api_key},
+                    json=payload,
+                    timeout=request_timeout,
+                )
+            finally:
+                self.in_flight -= 1
+
+    async def stream_generate_content(self, model: str, payload: dict, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield text deltas from streamGenerateContent (server-sent events)"""
+        client = self._get_client()
+        url = f"{self.base_url}/models/{model}:streamGenerateContent"
+        request_timeout = httpx.Timeout(timeout or self.default_timeout, connect=self.connect_timeout)
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                async with client.stream(
+                    "POST",
+                    url,
+                    params={"key": self.api_key, "alt": "sse"},
+                    json=payload,
+                    timeout=request_timeout,
+                ) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", "replace")
+                        raise GeminiHTTPError(response.status_code, body[:500], parse_retry_after(response))
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = json.loads(line[len("data:"):].strip())
+                        for candidate in data.get("candidates", [])[:1]:
+                            for part in candidate.get("content", {}).get("parts", []):
+                                if part.get("text"):
+                                    yield part["text"]
+            finally:
+                self.in_flight -= 1
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
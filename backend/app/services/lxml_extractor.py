@@ -0,0 +1,226 @@
+import re
+from typing import Dict, Iterable, List, Tuple
+from lxml import etree
+
+SKIP_SECTIONS = ["See also", "References", "External links", "Notes",
+                 "Further reading", "Bibliography", "Contents"]
+
+# Elements extract_full_content decomposes before reading paragraphs and links
+REMOVED_TAGS = {"script", "style", "table", "sup"}
+
+# Elements whose text is read at their end event, so their subtree must survive until then
+CAPTURE_TAGS = {"p", "a", "h1", "h2", "h3"}
+
+CHUNK_SIZE = 64 * 1024
+
+# Upper bound on the section-aligned text kept for sharded generation
+SECTION_TEXT_LIMIT = 60000
+
+
+def _text(elem, skip=frozenset()) -> str:
+    parts = []
+    if elem.text:
+        parts.append(elem.text)
+    for child in elem:
+        if isinstance(child.tag, str) and child.tag not in skip:
+            parts.append(_text(child, skip))
+        if child.tail:
+            parts.append(child.tail)
+    return "".join(parts)
+
+
+def _has_class(elem, name: str) -> bool:
+    return name in (elem.get("class") or "").split()
+
+
+def _clean_text(text: str) -> str:
+    text = re.sub(r"\$\$\d+\$\$", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def build_section_texts(groups: List[list]) -> List[Dict]:
+    """Turn [heading, [paragraph, ...]] groups into non-empty {"heading", "text"} chunks"""
+    section_texts = []
+    total = 0
+    for heading, paragraphs in groups:
+        if heading in SKIP_SECTIONS:
+            continue
+        text = _clean_text(" ".join(paragraphs))
+        if not text:
+            continue
+        text = text[:max(SECTION_TEXT_LIMIT - total, 0)]
+        if not text:
+            break
+        section_texts.append({"heading": heading, "text": text})
+        total += len(text)
+    return section_texts
+
+
+class StreamingExtractor:
+    """Collect title, summary, sections, content and links in one pass over parser events.
+
+    Mirrors the BeautifulSoup extractors in WikipediaScraper without mutating
+    or retaining the tree: finished elements are cleared as soon as no open
+    paragraph, link or heading still needs their text.
+    """
+
+    def __init__(self):
+        self.title = ""
+        self.canonical_url = ""
+        self.summary_candidates: List[str] = []
+        self.paragraphs: List[str] = []
+        self.sections: List[str] = []
+        self.links: List[str] = []
+        self.section_groups: List[list] = [["Introduction", []]]
+        self._content_elem = None
+        self._removed_depth = 0
+        self._capture_depth = 0
+        self._title_found = False
+
+    @property
+    def in_content(self) -> bool:
+        return self._content_elem is not None
+
+    def consume(self, events: Iterable[Tuple[str, object]]):
+        for event, elem in events:
+            tag = elem.tag
+            if not isinstance(tag, str):
+                continue
+            if event == "start":
+                self._start(tag, elem)
+            else:
+                self._end(tag, elem)
+
+    def _start(self, tag: str, elem):
+        if tag == "link" and not self.canonical_url and "canonical" in (elem.get("rel") or "").split():
+            self.canonical_url = elem.get("href") or ""
+        if self._content_elem is None and tag == "div" and elem.get("id") == "mw-content-text":
+            self._content_elem = elem
+        elif self.in_content and tag in REMOVED_TAGS:
+            self._removed_depth += 1
+        if tag in CAPTURE_TAGS:
+            self._capture_depth += 1
+
+    def _end(self, tag: str, elem):
+        if tag == "h1":
+            if not self._title_found and elem.get("id") == "firstHeading":
+                self.title = _text(elem).strip()
+                self._title_found = True
+        elif tag in ("h2", "h3"):
+            self._add_section(elem)
+            if tag == "h2" and self.in_content:
+                self._start_section_group(elem)
+        elif self.in_content:
+            if tag == "p":
+                self._add_paragraph(elem)
+            elif tag == "a":
+                self._add_link(elem)
+
+        if self.in_content and tag in REMOVED_TAGS and elem is not self._content_elem:
+            self._removed_depth -= 1
+        if elem is self._content_elem:
+            self._content_elem = None
+            self._removed_depth = 0
+        if tag in CAPTURE_TAGS:
+            self._capture_depth -= 1
+
+        if self._capture_depth == 0 and elem is not self._content_elem:
+            self._release(elem)
+
+    def _add_section(self, elem):
+        # Older skins wrap the title in a headline span; current pages wrap the heading in div.mw-heading
+        headline = next((span for span in elem.iter("span") if _has_class(span, "mw-headline")), None)
+        parent = elem.getparent()
+        if headline is None and parent is not None and _has_class(parent, "mw-heading"):
+            headline = elem
+        if headline is not None:
+            section_name = _text(headline).strip()
+            if section_name not in SKIP_SECTIONS:
+                self.sections.append(section_name)
+
+    def _start_section_group(self, elem):
+        heading = None
+        for span in elem.iter("span"):
+            if _has_class(span, "mw-headline"):
+                heading = _text(span).strip()
+                break
+        if heading is None:
+            heading = _text(elem, REMOVED_TAGS).strip()
+        self.section_groups.append([heading, []])
+
+    def _add_paragraph(self, elem):
+        if len(self.summary_candidates) < 5:
+            self.summary_candidates.append(_text(elem).strip())
+        if self._removed_depth == 0:
+            text = _text(elem, REMOVED_TAGS).strip()
+            self.paragraphs.append(text)
+            self.section_groups[-1][1].append(text)
+
+    def _add_link(self, elem):
+        if self._removed_depth:
+            return
+        href = elem.get("href")
+        if href is None:
+            return
+        if href.startswith("/wiki/") and ":" not in href:
+            title = _text(elem, REMOVED_TAGS).strip()
+            if title and len(title) > 2:
+                self.links.append(title)
+
+    def _release(self, elem):
+        elem.clear(keep_tail=True)
+        parent = elem.getparent()
+        if parent is None:
+            return
+        while elem.getprevious() is not None:
+            del parent[0]
+
+    def summary(self) -> str:
+        summary_parts = []
+        for text in self.summary_candidates:
+            if len(text) > 50:
+                summary_parts.append(text)
+                if len(" ".join(summary_parts)) > 500:
+                    break
+        return " ".join(summary_parts)[:1000]
+
+    def content(self) -> str:
+        content = " ".join(self.paragraphs)
+        content = re.sub(r"\$\$\d+\$\$", "", content)
+        content = re.sub(r"\s+", " ", content)
+        return content[:8000]
+
+    def result(self) -> Dict:
+        return {
+            "title": self.title,
+            "summary": self.summary(),
+            "sections": self.sections[:15],
+            "content": self.content(),
+            "section_texts": build_section_texts(self.section_groups),
+            "links": list(dict.fromkeys(self.links))[:50],
+            "canonical_url": self.canonical_url,
+        }
+
+
+def extract_article_lxml(html: str, chunk_size: int = CHUNK_SIZE) -> Dict:
+    extractor = StreamingExtractor()
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    for i in range(0, len(html), chunk_size):
+        parser.feed(html[i:i + chunk_size])
+        extractor.consume(parser.read_events())
+    parser.close()
+    extractor.consume(parser.read_events())
+    return extractor.result()
+
+
+def extract_title_lxml(html: str, chunk_size: int = CHUNK_SIZE) -> str:
+    parser = etree.HTMLPullParser(events=("end",), tag="h1")
+    for i in range(0, len(html) + chunk_size, chunk_size):
+        if i < len(html):
+            parser.feed(html[i:i + chunk_size])
+        else:
+            parser.close()
+        for _, elem in parser.read_events():
+            if elem.get("id") == "firstHeading":
+                return _text(elem).strip()
+    return ""
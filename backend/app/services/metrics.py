@@ -0,0 +1,81 @@
+"""Prometheus metrics for the generation pipeline.
+
+Each process keeps its own registry. Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers so
+/metrics aggregates all of them.
+"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+STAGE_SECONDS = Histogram(
+    "quiz_stage_seconds", "Time spent in each quiz generation stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+LLM_CALL_SECONDS = Histogram(
+    "quiz_llm_call_seconds", "Latency of one Gemini call including retries",
+    ["task", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_PROMPT_CHARS = Histogram("quiz_llm_prompt_chars", "Prompt size sent to Gemini", ["task"], buckets=SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("quiz_llm_response_chars", "Response size from Gemini", ["task"], buckets=SIZE_BUCKETS)
+LLM_TOKENS = Counter("quiz_llm_tokens_total", "Gemini tokens reported by usageMetadata", ["task"])
+LLM_RETRIES = Counter("quiz_llm_retries_total", "Gemini calls retried, by reason", ["reason"])
+CACHE_REQUESTS = Counter("quiz_cache_requests_total", "Cache lookups, by cache and result", ["cache", "result"])
+QUIZ_GENERATIONS = Counter(
+    "quiz_generations_total", "Question sets produced, by the path that produced them", ["source"]
+)
+QUIZ_TOPUP_QUESTIONS = Counter(
+    "quiz_topup_questions_total", "Missing questions requested from and added by top-up prompts", ["result"]
+)
+QUIZ_DUPLICATE_QUESTIONS = Counter(
+    "quiz_duplicate_questions_total", "Near-duplicate questions rejected, each needing a replacement", ["stage"]
+)
+PARSE_QUEUE_DEPTH = Gauge(
+    "quiz_parse_queue_depth", "Article parses waiting for or running in the parse executor",
+    multiprocess_mode="livesum"
+)
+LLM_IN_FLIGHT = Gauge("quiz_llm_in_flight", "Gemini requests in flight", multiprocess_mode="livesum")
+LLM_WAITING = Gauge(
+    "quiz_llm_waiting", "Gemini calls waiting on the rate governor, by lane", ["lane"], multiprocess_mode="livesum"
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into quiz_stage_seconds{stage=name}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track(gauge: Gauge):
+    """Count the block as in progress on `gauge`"""
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_metrics():
+    """Return (body, content type) for the /metrics endpoint"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import List, Optional
+from app.services.llm_transport import GeminiTransport
+
+DEFAULT_MODELS = [
+    "gemini-2.5-flash",
+    "gemini-1.5-flash",
+    "gemini-1.5-pro",
+    "gemini-pro",
+    "gemini-1.0-pro",
+]
+
+
+class GeminiModelResolver:
+    """Resolve the Gemini model to use lazily, on first call rather than at import.
+
+    Candidates are probed concurrently and the highest-priority working one
+    wins. The result is written to a small JSON file so the other workers on
+    the host reuse it until `ttl` expires. Callers invalidate the choice when
+    Gemini reports the model as not found.
+    """
+
+    def __init__(self, transport: GeminiTransport, candidates: Optional[List[str]] = None,
+                 cache_path: str = "", ttl: float = 24 * 3600, pinned_model: str = "",
+                 probe_timeout: float = 10.0):
+        self.transport = transport
+        self.candidates = candidates or DEFAULT_MODELS
+        self.cache_path = cache_path or os.path.join(tempfile.gettempdir(), "wiki_quiz_gemini_model.json")
+        self.ttl = ttl
+        self.pinned_model = pinned_model
+        self.probe_timeout = probe_timeout
+        self.model: Optional[str] = pinned_model or None
+        self._resolved_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _fresh(self, resolved_at: float) -> bool:
+        return time.time() - resolved_at < self.ttl
+
+    async def get_model(self) -> str:
+        if self.pinned_model:
+            return self.pinned_model
+        if self.model and self._fresh(self._resolved_at):
+            return self.model
+
+        async with self._get_lock():
+            if self.model and self._fresh(self._resolved_at):
+                return self.model
+
+            cached = self._read_cache()
+            if cached:
+                self.model, self._resolved_at = cached
+                return self.model
+
+            model = await self._probe()
+            if model:
+                self._write_cache(model)
+                self.model, self._resolved_at = model, time.time()
+            else:
+                # Nothing answered; use the default for this process only and re-probe on the next failure
+                self.model, self._resolved_at = self.candidates[0], time.time()
+            print(f"Using Gemini model: {self.model}")
+            return self.model
+
+    def invalidate(self, model: str):
+        if self.pinned_model or model != self.model:
+            return
+        print(f"Gemini model {model} not found, re-resolving")
+        self.model = None
+        self._resolved_at = 0.0
+        cached = self._read_cache()
+        if cached and cached[0] == model:
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
+
+    async def _probe_one(self, model: str) -> bool:
+        payload = {
+            "contents": [{"parts": [{"text": "Say hello"}]}],
+            "generationConfig": {"maxOutputTokens": 10}
+        }
+        try:
+            response = await self.transport.generate_content(model, payload, timeout=self.probe_timeout)
+            return response.status_code == 200
+        except Exception as e:
+            print(f"Model {model} failed: {e}")
+            return False
+
+    async def _probe(self) -> Optional[str]:
+        results = await asyncio.gather(*(self._probe_one(m) for m in self.candidates))
+        for model, ok in zip(self.candidates, results):
+            if ok:
+                print(f"Found working Gemini model: {model}")
+                return model
+        return None
+
+    def _read_cache(self) -> Optional[tuple]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("model") in self.candidates and self._fresh(float(data["resolved_at"])):
+                return data["model"], float(data["resolved_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _write_cache(self, model: str):
+        directory = os.path.dirname(self.cache_path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".gemini_model_")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "resolved_at": time.time()}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not write model cache: {e}")
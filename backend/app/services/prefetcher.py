@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import List
+from urllib.parse import quote
+from app.database import SessionLocal
+from app.models import Quiz
+from app.services.job_queue import PRIORITY_PREFETCH, JobQueue, utcnow
+from app.services.url_canonicalizer import SUPPORTED_LANG, TITLE_SAFE_CHARS, canonicalize_url
+
+
+class RelatedTopicPrefetcher:
+    """Queue background jobs for the top related topics of viewed quizzes.
+
+    Jobs go into the generation queue with a negative priority, so workers
+    only pick them up when no user request is waiting (see JobWorker). The
+    number created per hour is capped across all processes by counting rows.
+    `record_view` runs on threadpool threads, so the seen set and the
+    count-then-enqueue budget check are each guarded by a lock.
+    """
+
+    def __init__(self, job_queue: JobQueue, enabled: bool = False, topics_per_quiz: int = 3,
+                 budget_per_hour: int = 30, max_queued: int = 100, seen_ttl: float = 600.0):
+        self.job_queue = job_queue
+        self.enabled = enabled
+        self.topics_per_quiz = topics_per_quiz
+        self.budget_per_hour = budget_per_hour
+        self.max_queued = max_queued
+        self.seen_ttl = seen_ttl
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._budget_lock = threading.Lock()
+
+    def _recently_seen(self, quiz_id: int) -> bool:
+        now = time.monotonic()
+        with self._seen_lock:
+            while self._seen and next(iter(self._seen.values())) < now:
+                self._seen.popitem(last=False)
+            if quiz_id in self._seen:
+                return True
+            self._seen[quiz_id] = now + self.seen_ttl
+            return False
+
+    def topic_urls(self, quiz: Quiz) -> List[str]:
+        """Article URLs for the quiz's related topics, in rank order, skipping ones that do not resolve"""
+        urls = []
+        for topic in quiz.related_topics or []:
+            if not isinstance(topic, str) or not topic.strip():
+                continue
+            title = quote(topic.strip().replace(" ", "_"), safe=TITLE_SAFE_CHARS)
+            try:
+                canonical = canonicalize_url(f"https://{SUPPORTED_LANG}.wikipedia.org/wiki/{title}")
+            except ValueError:
+                continue
+            if canonical.key != quiz.canonical_key and canonical.url not in urls:
+                urls.append(canonical.url)
+        return urls
+
+    def record_view(self, quiz_id: int) -> int:
+        """Queue prefetches for a viewed quiz, returning how many jobs were queued"""
+        if not self.enabled or self._recently_seen(quiz_id):
+            return 0
+
+        db = SessionLocal()
+        try:
+            quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+            if quiz is None:
+                return 0
+            difficulty = quiz.difficulty or "mixed"
+            num_questions = quiz.num_questions or 6
+
+            with self._budget_lock:
+                budget = self.budget_per_hour - self.job_queue.count_background(
+                    db, since=utcnow() - timedelta(hours=1)
+                )
+                room = self.max_queued - self.job_queue.count_background(db, status="queued")
+                queued = 0
+                for rank, url in enumerate(self.topic_urls(quiz)):
+                    if queued >= min(budget, room) or rank >= self.topics_per_quiz:
+                        break
+                    if self.job_queue.quiz_service.get_cached_quiz(db, url, difficulty, num_questions):
+                        continue
+                    # Higher ranked topics are claimed first
+                    self.job_queue.enqueue(db, url, difficulty, num_questions, priority=PRIORITY_PREFETCH - rank)
+                    queued += 1
+                return queued
+        except Exception as e:
+            print(f"Prefetch for quiz {quiz_id} failed: {e}")
+            return 0
+        finally:
+            db.close()
@@ -0,0 +1,144 @@
+import random
+from typing import Dict, List, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import BankQuestion, Quiz
+from app.services.question_dedup import NearDuplicateIndex, report_duplicates, signature
+from app.services.quiz_quality import FALLBACK_QUESTIONS
+
+BANK_LEVELS = ("easy", "medium", "hard")
+
+
+def difficulty_targets(difficulty: str, num_questions: int) -> Dict[str, int]:
+    """Questions of each level a quiz should have; mixed quizzes are split evenly"""
+    if difficulty != "mixed":
+        return {difficulty: num_questions}
+    targets = {level: num_questions // 3 for level in BANK_LEVELS}
+    for level in ["medium", "easy", "hard"][:num_questions % 3]:
+        targets[level] += 1
+    return targets
+
+
+class QuestionBank:
+    """Per-article pool of generated questions tagged easy, medium or hard.
+
+    An article's first generation fills the bank with a pool of at least
+    `pool_size` questions, and quizzes of any difficulty and length are then
+    sampled from it. Only a bank that runs short of a level costs another
+    LLM call, and that call asks for the missing questions alone.
+    """
+
+    def __init__(self, pool_size: int = 12):
+        self.pool_size = pool_size
+
+    def counts(self, db: Session, key: str) -> Dict[str, int]:
+        rows = db.query(BankQuestion.difficulty, func.count(BankQuestion.id)).filter(
+            BankQuestion.canonical_key == key
+        ).group_by(BankQuestion.difficulty).all()
+        return {level: count for level, count in rows}
+
+    def shortfall(self, db: Session, key: str, targets: Dict[str, int]) -> Dict[str, int]:
+        """How many more questions of each level the bank needs to cover `targets`"""
+        counts = self.counts(db, key)
+        return {level: count - counts.get(level, 0) for level, count in targets.items() if count > counts.get(level, 0)}
+
+    def pool_targets(self, targets: Dict[str, int]) -> Dict[str, int]:
+        """Per-level counts for an article's first generation: an even pool, or more where a request needs it"""
+        pool = difficulty_targets("mixed", self.pool_size)
+        return {level: max(pool[level], targets.get(level, 0)) for level in BANK_LEVELS}
+
+    def questions(self, db: Session, key: str) -> List[dict]:
+        rows = db.query(BankQuestion.question).filter(
+            BankQuestion.canonical_key == key
+        ).order_by(BankQuestion.id).all()
+        return [row.question for row in rows]
+
+    def index(self, db: Session, key: str) -> NearDuplicateIndex:
+        """Near-duplicate index over an article's bank, from the stored signatures"""
+        index = NearDuplicateIndex()
+        rows = db.query(BankQuestion.question, BankQuestion.signature).filter(
+            BankQuestion.canonical_key == key
+        ).order_by(BankQuestion.id).all()
+        for row in rows:
+            index.add(row.signature or signature(row.question))
+        return index
+
+    def add(self, db: Session, key: str, questions: List[dict]) -> int:
+        """Add questions to an article's bank, skipping placeholders and near-duplicates; the caller commits"""
+        index = self.index(db, key)
+        added = rejected = 0
+        for q in questions:
+            if not q.get("question") or q.get("difficulty") not in BANK_LEVELS or q["question"] in FALLBACK_QUESTIONS:
+                continue
+            sig = signature(q)
+            if not index.add_if_new(sig):
+                rejected += 1
+                continue
+            db.add(BankQuestion(canonical_key=key, difficulty=q["difficulty"], question=q, signature=sig))
+            added += 1
+        report_duplicates(rejected, "bank")
+        if added:
+            db.flush()
+        return added
+
+    def sample(self, db: Session, key: str, difficulty: str, num_questions: int) -> List[dict]:
+        """Pick a quiz from the bank; the same request always gets the same questions, in bank order"""
+        rows = db.query(BankQuestion.id, BankQuestion.difficulty, BankQuestion.question).filter(
+            BankQuestion.canonical_key == key
+        ).order_by(BankQuestion.id).all()
+        rng = random.Random(f"{key}:{difficulty}:{num_questions}")
+
+        by_level: Dict[str, list] = {}
+        for row in rows:
+            by_level.setdefault(row.difficulty, []).append(row)
+        picked = []
+        for level, count in difficulty_targets(difficulty, num_questions).items():
+            pool = by_level.get(level, [])
+            picked += rng.sample(pool, min(count, len(pool)))
+
+        if difficulty == "mixed" and len(picked) < num_questions:
+            # A level that ran short borrows from the others
+            chosen = {row.id for row in picked}
+            rest = [row for row in rows if row.id not in chosen]
+            picked += rng.sample(rest, min(num_questions - len(picked), len(rest)))
+        return [dict(row.question) for row in sorted(picked, key=lambda row: row.id)]
+
+
+def backfill_question_bank(db: Session, batch_size: int = 200) -> int:
+    """Record each quiz's length and seed the bank with the questions already stored, returning questions added"""
+    bank = QuestionBank()
+    added = 0
+    last_id = 0
+    while True:
+        quizzes = db.query(Quiz).filter(Quiz.id > last_id).order_by(Quiz.id).limit(batch_size).all()
+        if not quizzes:
+            break
+        last_id = quizzes[-1].id
+        for quiz in quizzes:
+            questions = quiz.quiz_data if isinstance(quiz.quiz_data, list) else []
+            if quiz.num_questions is None:
+                quiz.num_questions = len(questions) or 6
+            if quiz.canonical_key and quiz.quality != "fallback":
+                added += bank.add(db, quiz.canonical_key, [q for q in questions if isinstance(q, dict)])
+        db.commit()
+    return added
+
+
+def backfill_question_signatures(db: Session) -> Tuple[int, int]:
+    """Sign bank questions stored without a signature and drop near-duplicates, returning (signed, removed)"""
+    signed = removed = 0
+    keys = [row.canonical_key for row in db.query(BankQuestion.canonical_key).filter(
+        BankQuestion.signature.is_(None)
+    ).distinct().all()]
+    for key in keys:
+        index = NearDuplicateIndex()
+        for row in db.query(BankQuestion).filter(BankQuestion.canonical_key == key).order_by(BankQuestion.id).all():
+            sig = row.signature or signature(row.question)
+            if not index.add_if_new(sig):
+                db.delete(row)
+                removed += 1
+            elif row.signature is None:
+                row.signature = sig
+                signed += 1
+        db.commit()
+    return signed, removed
@@ -0,0 +1,112 @@
+"""Near-duplicate detection for quiz questions with MinHash and LSH.
+
+A question is reduced to the content words, and pairs of adjacent content
+words, of its question text, plus its whole answer as a single shingle, so
+two questions that merely share an answer ("Who directed Avatar?" and "Who
+wrote Avatar?") are not mistaken for one. A MinHash signature of NUM_PERM
+values estimates the Jaccard similarity of two such sets, and splitting it
+into BANDS bands gives LSH buckets, so a new question is only compared with
+the few questions it shares a bucket with. "When was X born?" and "In what
+year was X born?" score around 0.75. "When did X die?" scores around 0.3.
+"""
+import random
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.content_condenser import STOPWORDS, WORD
+from app.services.metrics import QUIZ_DUPLICATE_QUESTIONS
+
+NUM_PERM = 64
+# Narrow bands favour recall; every candidate is confirmed against the threshold
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+# Rewordings score 0.75 and up and distinct questions about one subject under
+# 0.5; 64 permutations estimate within about 0.06 of the true similarity
+DUPLICATE_THRESHOLD = 0.6
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Signatures are stored, so the permutations must be the same in every process
+_rng = random.Random(20240601)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(question: dict) -> set:
+    text = str(question.get("question", "")).lower()
+    words = [w for w in WORD.findall(text) if w not in STOPWORDS]
+    found = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])} or set(WORD.findall(text))
+    answer = " ".join(WORD.findall(str(question.get("answer", "")).lower()))
+    if answer:
+        found.add(f"answer: {answer}")
+    return found
+
+
+def signature(question: dict) -> List[int]:
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(question)]
+    if not hashes:
+        return [MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in PERMUTATIONS]
+
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """LSH index over question signatures; lookups cost a few bucket probes regardless of size"""
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._signatures: List[List[int]] = []
+        self._buckets: Dict[Tuple[int, tuple], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def find(self, sig: List[int]) -> Optional[int]:
+        """Position of an indexed signature that `sig` nearly duplicates, or None"""
+        checked = set()
+        for band in range(BANDS):
+            for position in self._buckets.get((band, tuple(sig[band * ROWS:(band + 1) * ROWS])), ()):
+                if position in checked:
+                    continue
+                checked.add(position)
+                if similarity(sig, self._signatures[position]) >= self.threshold:
+                    return position
+        return None
+
+    def add(self, sig: List[int]) -> int:
+        position = len(self._signatures)
+        self._signatures.append(sig)
+        for band in range(BANDS):
+            self._buckets.setdefault((band, tuple(sig[band * ROWS:(band + 1) * ROWS])), []).append(position)
+        return position
+
+    def add_if_new(self, sig: List[int]) -> bool:
+        """Index `sig` unless it nearly duplicates one already here; returns whether it was added"""
+        if self.find(sig) is not None:
+            return False
+        self.add(sig)
+        return True
+
+
+def index_questions(questions: Iterable[dict]) -> NearDuplicateIndex:
+    index = NearDuplicateIndex()
+    for question in questions:
+        index.add(signature(question))
+    return index
+
+
+def report_duplicates(rejected: int, stage: str):
+    if rejected:
+        QUIZ_DUPLICATE_QUESTIONS.labels(stage).inc(rejected)
+        print(f"Rejected {rejected} near-duplicate questions ({stage}); {rejected} replacements needed")
+
+
+def drop_near_duplicates(questions: List[dict], index: Optional[NearDuplicateIndex] = None,
+                         stage: str = "response") -> List[dict]:
+    """The questions that are not near-duplicates of each other or of those already in `index`"""
+    index = index if index is not None else NearDuplicateIndex()
+    unique = [q for q in questions if index.add_if_new(signature(q))]
+    report_duplicates(len(questions) - len(unique), stage)
+    return unique
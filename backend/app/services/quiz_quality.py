@@ -0,0 +1,53 @@
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app.models import Quiz
+
+# Worst to best
+QUALITY_TIERS = ("fallback", "partial", "llm")
+
+# Questions produced by LLMService._generate_fallback_quiz when Gemini gives us nothing
+FALLBACK_QUESTIONS = frozenset({
+    "What is the main topic of this Wikipedia article?",
+    "Which subject does this article focus on?",
+    "What would be an appropriate title for this article?",
+    "This article belongs to which category?",
+    "What type of information does this article provide?",
+    "Who would be most interested in reading this article?",
+})
+
+
+def quiz_quality(questions: List[dict], num_questions: Optional[int] = None) -> str:
+    if not questions or any(q.get("question") in FALLBACK_QUESTIONS for q in questions):
+        return "fallback"
+    if num_questions and len(questions) < num_questions:
+        return "partial"
+    return "llm"
+
+
+def is_degraded(quality: Optional[str]) -> bool:
+    return (quality or "llm") != "llm"
+
+
+def is_better(new: str, old: Optional[str]) -> bool:
+    return QUALITY_TIERS.index(new) > QUALITY_TIERS.index(old or "llm")
+
+
+def mark_fallback_quizzes(db: Session, batch_size: int = 500) -> int:
+    """Tag existing placeholder quizzes so they get regenerated, returning rows marked"""
+    marked = 0
+    last_id = 0
+    while True:
+        rows = db.query(Quiz.id, Quiz.quiz_data).filter(
+            Quiz.id > last_id, Quiz.quality == "llm"
+        ).order_by(Quiz.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        fallback_ids = [quiz_id for quiz_id, data in rows if quiz_quality(data or []) == "fallback"]
+        if fallback_ids:
+            db.query(Quiz).filter(Quiz.id.in_(fallback_ids)).update(
+                {Quiz.quality: "fallback"}, synchronize_session=False
+            )
+            marked += len(fallback_ids)
+        db.commit()
+    return marked
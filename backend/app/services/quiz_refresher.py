@@ -0,0 +1,46 @@
+from datetime import timedelta
+from app.database import SessionLocal
+from app.models import Quiz
+from app.services.job_queue import JobQueue, utcnow
+from app.services.quiz_quality import is_degraded
+
+
+class QuizRefresher:
+    """Stale-while-revalidate for degraded quizzes.
+
+    Partial and fallback quizzes are still served straight away, but each
+    time one is requested a background job is queued to regenerate it (see
+    QuizService.regenerate_quiz_async). Jobs are limited to one per quiz per
+    `min_interval` and to `budget_per_hour` across all processes, so an
+    outage does not turn every page view into another Gemini call.
+    """
+
+    def __init__(self, job_queue: JobQueue, enabled: bool = True, budget_per_hour: int = 20,
+                 min_interval: float = 600.0):
+        self.job_queue = job_queue
+        self.enabled = enabled
+        self.budget_per_hour = budget_per_hour
+        self.min_interval = min_interval
+
+    def needs_refresh(self, quiz: Quiz) -> bool:
+        return self.enabled and is_degraded(quiz.quality)
+
+    def schedule(self, quiz_id: int) -> bool:
+        """Queue a regeneration for a degraded quiz, returning whether a job was queued"""
+        db = SessionLocal()
+        try:
+            quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+            if quiz is None or not self.needs_refresh(quiz):
+                return False
+            used = self.job_queue.count_background(db, since=utcnow() - timedelta(hours=1), kind="refresh")
+            if used >= self.budget_per_hour:
+                return False
+            job = self.job_queue.enqueue_refresh(db, quiz, self.min_interval)
+            if job:
+                print(f"Queued regeneration of {quiz.quality} quiz {quiz_id} as job {job.id}")
+            return job is not None
+        except Exception as e:
+            print(f"Refresh for quiz {quiz_id} failed: {e}")
+            return False
+        finally:
+            db.close()
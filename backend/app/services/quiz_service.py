@@ -1,65 +1,419 @@
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import AsyncIterator, Dict, Iterator, Optional, List, Tuple
+from datetime import datetime, timezone
 import asyncio
+import base64
+import json
+import time
+from app.config import get_settings
+from app.database import SessionLocal
 from app.models import Quiz
 from app.services.scraper import WikipediaScraper
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, bypass_llm_cache
+from app.services.generation_lock import SingleFlight, advisory_lock
+from app.services.snapshot_store import store_snapshot, load_snapshot
+from app.services.response_cache import ResponseLRUCache, TTLResponseCache
+from app.services.metrics import STAGE_SECONDS, record_cache, stage
+from app.services.question_bank import QuestionBank, difficulty_targets
+from app.services.quiz_quality import is_better, is_degraded, quiz_quality
+from app.services.url_canonicalizer import (
+    CanonicalURL, canonicalize_url, try_canonicalize_url, resolve_alias, record_alias
+)
+
+settings = get_settings()
 
 
 class QuizService:
     def __init__(self):
-        self.scraper = WikipediaScraper()
+        self.scraper = WikipediaScraper(
+            max_concurrent_fetches=settings.scraper_max_concurrent_fetches,
+            max_pending_parses=settings.scraper_max_pending_parses,
+            parse_workers=settings.scraper_parse_workers,
+            fetch_timeout=settings.scraper_fetch_timeout,
+            engine=settings.scraper_engine,
+            mirror_url=settings.scraper_mirror_url,
+        )
         self.llm_service = LLMService()
+        self.question_bank = QuestionBank(pool_size=settings.quiz_bank_pool_size)
+        self.inflight = SingleFlight()
+        self.quiz_cache = ResponseLRUCache(
+            max_entries=settings.quiz_cache_max_entries,
+            max_bytes=settings.quiz_cache_max_bytes,
+        )
+        self.history_cache = TTLResponseCache(ttl=settings.history_cache_ttl)
 
-    def get_cached_quiz(self, db: Session, url: str, difficulty: str) -> Optional[Quiz]:
+    def get_cached_quiz(self, db: Session, url: str, difficulty: str, num_questions: int = 6) -> Optional[Quiz]:
+        canonical = try_canonicalize_url(url)
+        if canonical is None:
+            return None
+        quiz = self._get_cached_by_key(db, resolve_alias(db, canonical.key), difficulty, num_questions)
+        record_cache("quiz", quiz is not None)
+        return quiz
+
+    def _get_cached_by_key(self, db: Session, key: str, difficulty: str, num_questions: int) -> Optional[Quiz]:
         return db.query(Quiz).filter(
-            Quiz.url == url,
-            Quiz.difficulty == difficulty
+            Quiz.canonical_key == key,
+            Quiz.difficulty == difficulty,
+            Quiz.num_questions == num_questions
         ).first()
 
     async def generate_quiz_async(self, db: Session, url: str, difficulty: str = "mixed", num_questions: int = 6) -> Quiz:
-        existing = self.get_cached_quiz(db, url, difficulty)
+        canonical = canonicalize_url(url)
+        key = resolve_alias(db, canonical.key)
+        existing = self._get_cached_by_key(db, key, difficulty, num_questions)
+        record_cache("quiz", existing is not None)
         if existing:
             return existing
+
+        with stage("generate_total"):
+            quiz_id = await self.inflight.do(
+                (key, difficulty, num_questions),
+                lambda: self._generate_once(canonical.url, key, difficulty, num_questions)
+            )
+        return self.get_quiz_by_id(db, quiz_id)
+
+    async def _generate_once(self, url: str, key: str, difficulty: str, num_questions: int) -> int:
+        # Shared by every coalesced caller and outlives any one of them, so it uses its own session
+        db = SessionLocal()
+        try:
+            return await self._generate_locked(db, url, key, difficulty, num_questions)
+        finally:
+            db.close()
+
+    async def _generate_locked(self, db: Session, url: str, key: str, difficulty: str, num_questions: int) -> int:
+        lock_started = time.perf_counter()
+        # One lock per article: its quizzes share a question bank
+        async with advisory_lock(f"quiz:{key}"):
+            STAGE_SECONDS.labels("lock_wait").observe(time.perf_counter() - lock_started)
+            # Another worker may have committed while we waited for the lock
+            existing = self._get_cached_by_key(db, resolve_alias(db, key), difficulty, num_questions)
+            if existing:
+                return existing.id
+
+            quiz = await self._generate_and_store(db, url, key, difficulty, num_questions)
+            return quiz.id
+
+    async def _scrape_article(self, db: Session, url: str, key: str, difficulty: str,
+                              num_questions: int) -> Tuple[dict, CanonicalURL, Optional[Quiz]]:
+        """Scrape the article and resolve redirects, returning any quiz already stored under the real title"""
+        with stage("scrape"):
+            scraped_data = await self.scraper.scrape_async(url)
         
-        scraped_data = self.scraper.scrape(url)
+        # Follow redirects: the page's canonical link names the real article
+        resolved = try_canonicalize_url(scraped_data.get("canonical_url")) or canonicalize_url(url)
+        existing = None
+        if resolved.key != key:
+            record_alias(db, key, resolved.key)
+            db.commit()
+            existing = self._get_cached_by_key(db, resolved.key, difficulty, num_questions)
+        return scraped_data, resolved, existing
+
+    async def _generate_and_store(self, db: Session, url: str, key: str, difficulty: str, num_questions: int) -> Quiz:
+        quiz = await self._assemble_quiz(db, url, key, difficulty, num_questions)
+        # A redirect can lead to a quiz that is already stored
+        return quiz if quiz.id is not None else self._insert_quiz(db, quiz)
+
+    async def _assemble_quiz(self, db: Session, url: str, key: str, difficulty: str, num_questions: int) -> Quiz:
+        """Sample an unsaved quiz from the article's question bank, generating only what the bank lacks"""
+        quiz = self._quiz_from_bank(db, key, difficulty, num_questions)
+        if quiz:
+            return quiz
+
+        scraped_data, resolved, existing = await self._scrape_article(db, url, key, difficulty, num_questions)
+        if existing:
+            return existing
         
-        llm_results = await self.llm_service.generate_all_async(
-            title=scraped_data["title"],
-            content=scraped_data["content"],
-            sections=scraped_data["sections"],
-            links=scraped_data["links"],
+        with stage("llm"):
+            entities, topics, placeholders = await self._fill_bank(
+                db, resolved.key, scraped_data, difficulty_targets(difficulty, num_questions),
+                self._article_template(db, resolved.key)
+            )
+        questions = (
+            self.question_bank.sample(db, resolved.key, difficulty, num_questions)
+            or placeholders
+            or self.llm_service._generate_fallback_quiz(scraped_data["title"], difficulty, num_questions)
+        )
+        return self._build_quiz(db, resolved, scraped_data, difficulty, questions, entities, topics, num_questions)
+
+    def _article_template(self, db: Session, key: str) -> Optional[Quiz]:
+        """A stored quiz whose article data (title, summary, entities, topics) new quizzes can share"""
+        return db.query(Quiz).filter(
+            Quiz.canonical_key == key,
+            Quiz.quality != "fallback"
+        ).order_by(Quiz.id).first()
+
+    def _quiz_from_bank(self, db: Session, key: str, difficulty: str, num_questions: int) -> Optional[Quiz]:
+        """An unsaved quiz built without scraping or Gemini, if the article's bank already covers it"""
+        template = self._article_template(db, key)
+        covered = template is not None and not self.question_bank.shortfall(
+            db, key, difficulty_targets(difficulty, num_questions)
+        )
+        record_cache("question_bank", covered)
+        if not covered:
+            return None
+        
+        questions = self.question_bank.sample(db, key, difficulty, num_questions)
+        return Quiz(
+            url=template.url,
+            canonical_key=template.canonical_key,
+            title=template.title,
+            summary=template.summary,
+            key_entities=template.key_entities,
+            sections=template.sections,
+            quiz_data=questions,
+            related_topics=template.related_topics,
             difficulty=difficulty,
-            num_questions=num_questions
+            quality=quiz_quality(questions, num_questions),
+            num_questions=num_questions,
+            generated_at=datetime.now(timezone.utc),
+            snapshot_hash=template.snapshot_hash
         )
+
+    async def _fill_bank(self, db: Session, key: str, scraped_data: dict, targets: Dict[str, int],
+                         template: Optional[Quiz]) -> Tuple[dict, List[str], List[dict]]:
+        """Generate what the article's question bank lacks for `targets` and commit it.
+
+        Without a `template` this is the article's first generation: one pass
+        for a whole pool plus entities and topics. Otherwise only the missing
+        questions are requested and the template's entities and topics are
+        reused. Returns (entities, topics, placeholder questions), the last
+        being non-empty only when Gemini produced nothing usable.
+        """
+        title, content, section_texts = scraped_data["title"], scraped_data["content"], scraped_data.get("section_texts")
+        placeholders = []
+        if template is None:
+            pool = self.question_bank.pool_targets(targets)
+            llm_results = await self.llm_service.generate_all_async(
+                title=title,
+                content=content,
+                sections=scraped_data["sections"],
+                links=scraped_data["links"],
+                difficulty="mixed",
+                num_questions=sum(pool.values()),
+                section_texts=section_texts,
+                levels=pool
+            )
+            entities, topics = llm_results["entities"], llm_results["topics"]
+            if quiz_quality(llm_results["quiz"]) == "fallback":
+                placeholders = llm_results["quiz"]
+            else:
+                self.question_bank.add(db, key, llm_results["quiz"])
+                # Don't hold a write transaction open across the top-up call
+                db.commit()
+        else:
+            entities, topics = template.key_entities, template.related_topics
+        
+        missing = self.question_bank.shortfall(db, key, targets)
+        if missing and not placeholders:
+            print(f"Question bank for {key} is short of {missing}")
+            added = await self.llm_service.top_up_questions(
+                title, content, section_texts, self.question_bank.questions(db, key), missing
+            )
+            self.question_bank.add(db, key, added)
+        db.commit()
+        return entities, topics, placeholders
+
+    def _store_quiz(self, db: Session, resolved: CanonicalURL, scraped_data: dict, difficulty: str,
+                    questions: List[dict], entities: dict, topics: List[str], num_questions: int) -> Quiz:
+        quiz = self._build_quiz(db, resolved, scraped_data, difficulty, questions, entities, topics, num_questions)
+        return self._insert_quiz(db, quiz)
+
+    def _build_quiz(self, db: Session, resolved: CanonicalURL, scraped_data: dict, difficulty: str,
+                    questions: List[dict], entities: dict, topics: List[str], num_questions: int) -> Quiz:
+        """Store the page snapshot and return an unsaved Quiz row"""
+        with stage("snapshot"):
+            snapshot_hash = store_snapshot(db, scraped_data["raw_html"]) if scraped_data.get("raw_html") else None
         
-        quiz = Quiz(
-            url=url,
+        quality = quiz_quality(questions, num_questions)
+        if is_degraded(quality):
+            print(f"Storing {quality} quiz for {resolved.key}; it will be regenerated when Gemini recovers")
+        return Quiz(
+            url=resolved.url,
+            canonical_key=resolved.key,
             title=scraped_data["title"],
             summary=scraped_data["summary"],
-            key_entities=llm_results["entities"],
+            key_entities=entities,
             sections=scraped_data["sections"],
-            quiz_data=llm_results["quiz"],
-            related_topics=llm_results["topics"],
+            quiz_data=questions,
+            related_topics=topics,
             difficulty=difficulty,
-            raw_html=scraped_data["raw_html"][:50000] if scraped_data.get("raw_html") else None
+            quality=quality,
+            num_questions=num_questions,
+            generated_at=datetime.now(timezone.utc),
+            snapshot_hash=snapshot_hash
         )
-        
+
+    def _insert_quiz(self, db: Session, quiz: Quiz) -> Quiz:
         db.add(quiz)
-        db.commit()
+        try:
+            with stage("db_commit"):
+                db.commit()
+        except IntegrityError:
+            db.rollback()
+            existing = self._get_cached_by_key(db, quiz.canonical_key, quiz.difficulty, quiz.num_questions)
+            if existing:
+                return existing
+            raise
         db.refresh(quiz)
+        self.history_cache.clear()
         
         return quiz
 
+    async def regenerate_quiz_async(self, db: Session, url: str, difficulty: str = "mixed", num_questions: int = 6) -> Quiz:
+        """Regenerate a degraded quiz, swapping the new version into the same row only if it is better"""
+        canonical = canonicalize_url(url)
+        key = resolve_alias(db, canonical.key)
+        async with advisory_lock(f"quiz:{key}"):
+            current = self._get_cached_by_key(db, resolve_alias(db, key), difficulty, num_questions)
+            if current is None:
+                return await self._generate_and_store(db, canonical.url, key, difficulty, num_questions)
+            if not is_degraded(current.quality):
+                return current
+
+            # The cached responses are what produced the degraded quiz
+            with bypass_llm_cache():
+                fresh = await self._assemble_quiz(db, canonical.url, key, difficulty, num_questions)
+            if fresh.id is not None:
+                return fresh
+            if not is_better(fresh.quality, current.quality):
+                print(f"Regenerated quiz {current.id} is still {fresh.quality}; keeping the current version")
+                db.rollback()
+                return current
+            return self._replace_quiz(db, current, fresh)
+
+    def _replace_quiz(self, db: Session, current: Quiz, fresh: Quiz) -> Quiz:
+        """Overwrite a quiz row with a better version in one commit, keeping its id"""
+        for column in ("title", "summary", "key_entities", "sections", "quiz_data", "related_topics",
+                       "quality", "num_questions", "generated_at", "snapshot_hash"):
+            setattr(current, column, getattr(fresh, column))
+        with stage("db_commit"):
+            db.commit()
+        db.refresh(current)
+        self.quiz_cache.invalidate(current.id)
+        self.history_cache.clear()
+        print(f"Replaced quiz {current.id} with a {current.quality} version")
+        return current
+
+    async def generate_quiz_stream(self, db: Session, url: str, difficulty: str = "mixed", num_questions: int = 6) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield (event, data) pairs: article, each question as it is generated, entities, topics, done"""
+        canonical = canonicalize_url(url)
+        key = resolve_alias(db, canonical.key)
+        existing = self._get_cached_by_key(db, key, difficulty, num_questions)
+        if existing:
+            for event in self._replay_quiz(existing):
+                yield event
+            return
+
+        async with advisory_lock(f"quiz:{key}"):
+            existing = self._get_cached_by_key(db, resolve_alias(db, key), difficulty, num_questions)
+            if existing is None:
+                assembled = self._quiz_from_bank(db, key, difficulty, num_questions)
+                if assembled:
+                    existing = self._insert_quiz(db, assembled)
+            if existing is None:
+                scraped_data, resolved, existing = await self._scrape_article(
+                    db, canonical.url, key, difficulty, num_questions
+                )
+            if existing:
+                for event in self._replay_quiz(existing):
+                    yield event
+                return
+
+            yield "article", {
+                "url": resolved.url,
+                "title": scraped_data["title"],
+                "summary": scraped_data["summary"],
+                "sections": scraped_data["sections"],
+                "difficulty": difficulty
+            }
+            
+            entities_task = asyncio.create_task(self.llm_service.extract_entities(
+                scraped_data["content"], scraped_data.get("section_texts"), scraped_data["title"]
+            ))
+            topics_task = asyncio.create_task(
+                self.llm_service.get_related_topics(scraped_data["title"], scraped_data["links"])
+            )
+            try:
+                questions = []
+                async for question in self.llm_service.stream_quiz(
+                    scraped_data["title"], scraped_data["content"], scraped_data["sections"],
+                    difficulty, num_questions, scraped_data.get("section_texts")
+                ):
+                    questions.append(question)
+                    yield "question", question
+                
+                entities = await entities_task
+                yield "entities", entities
+                topics = await topics_task
+                yield "topics", topics
+            finally:
+                entities_task.cancel()
+                topics_task.cancel()
+            
+            self.question_bank.add(db, resolved.key, questions)
+            quiz = self._store_quiz(db, resolved, scraped_data, difficulty, questions, entities, topics, num_questions)
+            yield "done", {"id": quiz.id, "cached": False}
+
+    def _replay_quiz(self, quiz: Quiz) -> Iterator[Tuple[str, dict]]:
+        yield "article", {
+            "url": quiz.url,
+            "title": quiz.title,
+            "summary": quiz.summary,
+            "sections": quiz.sections,
+            "difficulty": quiz.difficulty or "mixed"
+        }
+        for question in quiz.quiz_data or []:
+            yield "question", question
+        yield "entities", quiz.key_entities
+        yield "topics", quiz.related_topics
+        yield "done", {"id": quiz.id, "cached": True}
+
     def generate_quiz(self, db: Session, url: str, difficulty: str = "mixed", num_questions: int = 6) -> Quiz:
         return asyncio.run(self.generate_quiz_async(db, url, difficulty, num_questions))
 
-    def get_all_quizzes(self, db: Session, skip: int = 0, limit: int = 100) -> List[Quiz]:
-        return db.query(Quiz).order_by(Quiz.created_at.desc()).offset(skip).limit(limit).all()
+    def get_quiz_history(self, db: Session, limit: int = 100, cursor: Optional[str] = None, skip: int = 0) -> Tuple[List, Optional[str]]:
+        """Return history rows (list columns only) newest first, plus the cursor for the next page"""
+        # Ids grow with creation, and unlike the stored created_at text they
+        # compare the same way on every database
+        query = db.query(
+            Quiz.id, Quiz.url, Quiz.title, Quiz.difficulty, Quiz.created_at
+        ).order_by(Quiz.id.desc())
+        
+        if cursor:
+            query = query.filter(Quiz.id < self.decode_history_cursor(cursor))
+        elif skip:
+            query = query.offset(skip)
+        
+        rows = query.limit(limit).all()
+        next_cursor = None
+        if rows and len(rows) == limit:
+            next_cursor = self.encode_history_cursor(rows[-1].id)
+        return rows, next_cursor
+
+    @staticmethod
+    def encode_history_cursor(quiz_id: int) -> str:
+        payload = json.dumps([quiz_id]).encode("utf-8")
+        return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_history_cursor(cursor: str) -> int:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            # Older cursors were [created_at, id]
+            return int(json.loads(base64.urlsafe_b64decode(padded))[-1])
+        except (ValueError, TypeError, IndexError, KeyError) as e:
+            raise ValueError("Invalid history cursor") from e
 
     def get_quiz_by_id(self, db: Session, quiz_id: int) -> Optional[Quiz]:
         return db.query(Quiz).filter(Quiz.id == quiz_id).first()
 
+    def get_quiz_snapshot(self, db: Session, quiz_id: int) -> Optional[str]:
+        row = db.query(Quiz.snapshot_hash).filter(Quiz.id == quiz_id).first()
+        if not row or not row.snapshot_hash:
+            return None
+        return load_snapshot(db, row.snapshot_hash)
+
     def validate_url(self, url: str) -> dict:
         is_valid = self.scraper.validate_wikipedia_url(url)
         title = None
@@ -67,6 +421,21 @@ class QuizService:
         if is_valid:
             title = self.scraper.get_title_preview(url)
         
+        return {
+            "valid": is_valid and title is not None,
+            "title": title or ""
+        }
+
+    async def validate_url_async(self, url: str) -> dict:
+        canonical = try_canonicalize_url(url)
+        if canonical:
+            url = canonical.url
+        is_valid = self.scraper.validate_wikipedia_url(url)
+        title = None
+        
+        if is_valid:
+            title = await self.scraper.get_title_preview_async(url)
+        
         return {
             "valid": is_valid and title is not None,
             "title": title or ""
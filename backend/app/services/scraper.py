@@ -1,14 +1,39 @@
+import asyncio
+import multiprocessing
 import requests
+import httpx
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional
 import re
+from urllib.parse import urlsplit
+from app.services.metrics import PARSE_QUEUE_DEPTH, stage, track
+from app.services.lxml_extractor import extract_article_lxml, extract_title_lxml, build_section_texts
+
+SCRAPER_ENGINES = ("lxml", "bs4")
 
 
 class WikipediaScraper:
-    def __init__(self):
+    def __init__(self, max_concurrent_fetches: int = 16, max_pending_parses: int = 8,
+                 parse_workers: int = 2, fetch_timeout: float = 10.0, engine: str = "lxml",
+                 mirror_url: str = ""):
+        if engine not in SCRAPER_ENGINES:
+            raise ValueError(f"Unknown scraper engine: {engine}")
+        self.engine = engine
+        # Serve article paths from a mirror (e.g. the offline benchmark server) instead of wikipedia.org
+        self.mirror_url = mirror_url.rstrip("/")
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.max_pending_parses = max_pending_parses
+        self.parse_workers = parse_workers
+        self.fetch_timeout = fetch_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fetch_semaphore: Optional[asyncio.Semaphore] = None
+        self._parse_semaphore: Optional[asyncio.Semaphore] = None
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
 
     def validate_wikipedia_url(self, url: str) -> bool:
         pattern = r"^https?://(en\.)?wikipedia\.org/wiki/.+"
@@ -22,10 +47,69 @@ class WikipediaScraper:
         except requests.RequestException:
             return None
 
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.fetch_timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrent_fetches,
+                    max_keepalive_connections=self.max_concurrent_fetches,
+                ),
+            )
+            self._fetch_semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+            self._parse_semaphore = asyncio.Semaphore(self.max_pending_parses)
+            self._loop = loop
+        return self._client
+
+    def _get_parse_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.parse_workers <= 0:
+            return None
+        if self._parse_executor is None:
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._parse_executor
+
+    def _fetch_url(self, url: str) -> str:
+        if not self.mirror_url:
+            return url
+        parts = urlsplit(url)
+        return f"{self.mirror_url}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+    async def fetch_page_async(self, url: str) -> Optional[str]:
+        client = self._get_client()
+        url = self._fetch_url(url)
+        try:
+            async with self._fetch_semaphore:
+                with stage("fetch"):
+                    response = await client.get(url)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError:
+            return None
+
+    async def _run_parser(self, func, *args):
+        self._get_client()
+        with track(PARSE_QUEUE_DEPTH):
+            async with self._parse_semaphore:
+                executor = self._get_parse_executor()
+                with stage("parse"):
+                    if executor is None:
+                        return await asyncio.to_thread(func, *args)
+                    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
     def extract_title(self, soup: BeautifulSoup) -> str:
         title_element = soup.find("h1", {"id": "firstHeading"})
         return title_element.get_text().strip() if title_element else ""
 
+    def extract_canonical_url(self, soup: BeautifulSoup) -> str:
+        link = soup.find("link", rel="canonical")
+        return link.get("href", "") if link else ""
+
     def extract_summary(self, soup: BeautifulSoup) -> str:
         content_div = soup.find("div", {"id": "mw-content-text"})
         if not content_div:
@@ -51,7 +135,10 @@ class WikipediaScraper:
                         "Further reading", "Bibliography", "Contents"]
         
         for heading in headings:
+            # Older skins wrap the title in a headline span; current pages wrap the heading in div.mw-heading
             headline = heading.find("span", {"class": "mw-headline"})
+            if headline is None and "mw-heading" in (heading.parent.get("class") or []):
+                headline = heading
             if headline:
                 section_name = headline.get_text().strip()
                 if section_name not in skip_sections:
@@ -75,6 +162,23 @@ class WikipediaScraper:
         
         return content[:8000]
 
+    def extract_section_texts(self, soup: BeautifulSoup) -> List[Dict]:
+        """Paragraph text grouped under its h2 heading; call after extract_full_content"""
+        content_div = soup.find("div", {"id": "mw-content-text"})
+        if not content_div:
+            return []
+        
+        groups = [["Introduction", []]]
+        for element in content_div.find_all(["h2", "p"]):
+            if element.name == "h2":
+                headline = element.find("span", {"class": "mw-headline"})
+                heading = (headline or element).get_text().strip()
+                groups.append([heading, []])
+            else:
+                groups[-1][1].append(element.get_text().strip())
+        
+        return build_section_texts(groups)
+
     def extract_links(self, soup: BeautifulSoup) -> List[str]:
         content_div = soup.find("div", {"id": "mw-content-text"})
         if not content_div:
@@ -98,16 +202,21 @@ class WikipediaScraper:
         if not html:
             raise ConnectionError("Failed to fetch the Wikipedia page")
         
-        soup = BeautifulSoup(html, "html.parser")
+        data = extract_article(html, self.engine)
+        data["raw_html"] = html
+        return data
+
+    async def scrape_async(self, url: str) -> Dict:
+        if not self.validate_wikipedia_url(url):
+            raise ValueError("Invalid Wikipedia URL")
+        
+        html = await self.fetch_page_async(url)
+        if not html:
+            raise ConnectionError("Failed to fetch the Wikipedia page")
         
-        return {
-            "title": self.extract_title(soup),
-            "summary": self.extract_summary(soup),
-            "sections": self.extract_sections(soup),
-            "content": self.extract_full_content(soup),
-            "links": self.extract_links(soup),
-            "raw_html": html
-        }
+        data = await self._run_parser(extract_article, html, self.engine)
+        data["raw_html"] = html
+        return data
 
     def get_title_preview(self, url: str) -> Optional[str]:
         if not self.validate_wikipedia_url(url):
@@ -117,5 +226,49 @@ class WikipediaScraper:
         if not html:
             return None
         
-        soup = BeautifulSoup(html, "html.parser")
-        return self.extract_title(soup)
\ No newline at end of file
+        return extract_title(html, self.engine)
+
+    async def get_title_preview_async(self, url: str) -> Optional[str]:
+        if not self.validate_wikipedia_url(url):
+            return None
+        
+        html = await self.fetch_page_async(url)
+        if not html:
+            return None
+        
+        return await self._run_parser(extract_title, html, self.engine)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(wait=False, cancel_futures=True)
+            self._parse_executor = None
+
+
+# Module-level entry points so they can be pickled into the parse process pool
+
+def extract_article(html: str, engine: str = "lxml") -> Dict:
+    if engine == "lxml":
+        return extract_article_lxml(html)
+    
+    scraper = WikipediaScraper()
+    soup = BeautifulSoup(html, "html.parser")
+    
+    return {
+        "title": scraper.extract_title(soup),
+        "summary": scraper.extract_summary(soup),
+        "sections": scraper.extract_sections(soup),
+        "content": scraper.extract_full_content(soup),
+        "section_texts": scraper.extract_section_texts(soup),
+        "links": scraper.extract_links(soup),
+        "canonical_url": scraper.extract_canonical_url(soup),
+    }
+
+
+def extract_title(html: str, engine: str = "lxml") -> str:
+    if engine == "lxml":
+        return extract_title_lxml(html)
+    return WikipediaScraper().extract_title(BeautifulSoup(html, "html.parser"))
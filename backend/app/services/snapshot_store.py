@@ -0,0 +1,78 @@
+import hashlib
+import zlib
+from typing import Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import PageSnapshot, Quiz
+
+try:
+    import zstandard
+    DEFAULT_ENCODING = "zstd"
+except ImportError:
+    zstandard = None
+    DEFAULT_ENCODING = "zlib"
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def compress(html: str) -> Tuple[str, bytes]:
+    raw = html.encode("utf-8")
+    if DEFAULT_ENCODING == "zstd":
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def decompress(encoding: str, data: bytes) -> str:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this snapshot")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def store_snapshot(db: Session, html: str) -> str:
+    """Store a compressed page snapshot once per content hash and return the hash"""
+    digest = content_hash(html)
+    if db.query(PageSnapshot.content_hash).filter(PageSnapshot.content_hash == digest).first():
+        return digest
+
+    encoding, data = compress(html)
+    try:
+        with db.begin_nested():
+            db.add(PageSnapshot(content_hash=digest, encoding=encoding, size=len(html), data=data))
+    except IntegrityError:
+        # Stored concurrently by another request
+        pass
+    return digest
+
+
+def load_snapshot(db: Session, digest: str) -> Optional[str]:
+    row = db.query(PageSnapshot.encoding, PageSnapshot.data).filter(
+        PageSnapshot.content_hash == digest
+    ).first()
+    if row is None:
+        return None
+    return decompress(row.encoding, row.data)
+
+
+def migrate_inline_html(db: Session, batch_size: int = 100) -> int:
+    """Move legacy quizzes.raw_html into page_snapshots, returning rows moved"""
+    moved = 0
+    while True:
+        rows = db.query(Quiz.id, Quiz.raw_html).filter(
+            Quiz.raw_html.isnot(None),
+            Quiz.snapshot_hash.is_(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+        for quiz_id, html in rows:
+            digest = store_snapshot(db, html)
+            db.query(Quiz).filter(Quiz.id == quiz_id).update(
+                {Quiz.snapshot_hash: digest, Quiz.raw_html: None},
+                synchronize_session=False
+            )
+        db.commit()
+        moved += len(rows)
+    return moved
@@ -0,0 +1,114 @@
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Quiz, UrlAlias
+
+# Characters MediaWiki leaves unescaped in canonical article URLs
+TITLE_SAFE_CHARS = "/:_(),'!*-.~;@$&"
+
+# The scraper and the prompts only handle English Wikipedia
+SUPPORTED_LANG = "en"
+
+
+class CanonicalURL(NamedTuple):
+    url: str
+    key: str
+
+
+def _normalize_title(title: str) -> str:
+    title = unquote(title).replace(" ", "_").strip("_")
+    title = re.sub(r"_+", "_", title)
+    if not title:
+        return title
+    # MediaWiki treats the first letter of a title as case-insensitive
+    return title[0].upper() + title[1:]
+
+
+def canonicalize_url(url: str) -> CanonicalURL:
+    """Normalize scheme, host, path encoding, query and fragment of a Wikipedia article URL.
+
+    The key is "<lang>:<Title>", the form used for cache lookups. Articles
+    outside SUPPORTED_LANG are rejected here, so they fail before any job is queued.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    labels = [label for label in host.split(".") if label not in ("www", "m")]
+    if labels[-2:] != ["wikipedia", "org"]:
+        raise ValueError("Invalid Wikipedia URL")
+    lang = labels[0] if len(labels) > 2 else SUPPORTED_LANG
+    if lang != SUPPORTED_LANG:
+        raise ValueError("Only English Wikipedia articles are supported")
+
+    title = None
+    if parts.path.startswith("/wiki/"):
+        title = parts.path[len("/wiki/"):]
+    elif parts.path == "/w/index.php":
+        title = parse_qs(parts.query).get("title", [None])[0]
+    title = _normalize_title(title or "")
+    if not title:
+        raise ValueError("Invalid Wikipedia URL")
+
+    canonical = f"https://{lang}.wikipedia.org/wiki/{quote(title, safe=TITLE_SAFE_CHARS)}"
+    return CanonicalURL(url=canonical, key=f"{lang}:{title}")
+
+
+def try_canonicalize_url(url: Optional[str]) -> Optional[CanonicalURL]:
+    if not url:
+        return None
+    try:
+        return canonicalize_url(url)
+    except ValueError:
+        return None
+
+
+def resolve_alias(db: Session, key: str) -> str:
+    row = db.query(UrlAlias.canonical_key).filter(UrlAlias.alias_key == key).first()
+    return row.canonical_key if row else key
+
+
+def record_alias(db: Session, alias_key: str, canonical_key: str):
+    """Remember that alias_key redirects to canonical_key so later lookups skip the scrape"""
+    if alias_key == canonical_key:
+        return
+    try:
+        with db.begin_nested():
+            db.merge(UrlAlias(alias_key=alias_key, canonical_key=canonical_key))
+    except IntegrityError:
+        pass
+
+
+def backfill_canonical_keys(db: Session, batch_size: int = 200) -> int:
+    """Fill quizzes.canonical_key for legacy rows, returning rows updated.
+
+    Rows whose canonical (key, difficulty) is already taken keep a NULL key so
+    the unique index can be built without deleting any quiz.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.query(Quiz.id, Quiz.url, Quiz.difficulty).filter(
+            Quiz.canonical_key.is_(None),
+            Quiz.id > last_id
+        ).order_by(Quiz.id).limit(batch_size).all()
+        if not rows:
+            break
+        for quiz_id, url, difficulty in rows:
+            last_id = quiz_id
+            canonical = try_canonicalize_url(url)
+            if canonical is None:
+                continue
+            taken = db.query(Quiz.id).filter(
+                Quiz.canonical_key == canonical.key,
+                Quiz.difficulty == difficulty
+            ).first()
+            if taken:
+                continue
+            db.query(Quiz).filter(Quiz.id == quiz_id).update(
+                {Quiz.canonical_key: canonical.key}, synchronize_session=False
+            )
+            db.flush()
+            updated += 1
+        db.commit()
+    return updated
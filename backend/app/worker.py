@@ -0,0 +1,238 @@
+"""Generation worker: claims queued jobs and runs them outside the web process.
+
+Run one or more per deploy, independently of the API replicas:
+
+    python -m app.worker [--concurrency 4]
+"""
+import argparse
+import asyncio
+import contextvars
+import os
+import signal
+import socket
+import time
+from app.config import get_settings
+from app.database import SessionLocal
+from app.migrations import ensure_schema
+from app.models import GenerationJob
+from app.services.batch_service import BatchService
+from app.services.job_queue import PRIORITY_BATCH, JobQueue, is_background
+from app.services.llm_governor import current_lane, llm_lane
+from app.services.quiz_service import QuizService
+
+settings = get_settings()
+
+
+class JobWorker:
+    """Runs `concurrency` claim loops in one event loop, heartbeating each running job.
+
+    Batch jobs run behind user jobs, at most `batch_max_running` at a time so
+    a slot stays free for users. Background (refresh and prefetch) jobs are
+    only claimed when this worker has been free of user jobs for
+    `background_idle_seconds` and no LLM call is in flight, and they are
+    preempted as soon as a user job is claimed, unless a user or batch has
+    asked for that quiz meanwhile. The reaper also requeues stale jobs and
+    resumes batches a restart interrupted.
+    """
+
+    def __init__(self, job_queue: JobQueue, concurrency: int = 4, poll_interval: float = 1.0,
+                 heartbeat_interval: float = 15.0, background_enabled: bool = False,
+                 background_idle_seconds: float = 10.0, background_max_running: int = 1,
+                 batch_max_running: int = 2):
+        self.job_queue = job_queue
+        self.quiz_service = job_queue.quiz_service
+        self.batches = BatchService(job_queue)
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.background_enabled = background_enabled
+        self.background_idle_seconds = background_idle_seconds
+        self.background_max_running = background_max_running
+        self.batch_max_running = max(1, batch_max_running)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._interactive_running = 0
+        self._last_interactive = 0.0
+        # Running background generations: task -> (job id, the task's context)
+        self._background_tasks = {}
+        # Background generations moved to another lane: task -> lane
+        self._promoted = {}
+        self._batch_running = 0
+
+    def _idle(self) -> bool:
+        return (
+            self.background_enabled
+            and self._interactive_running == 0
+            and len(self._background_tasks) < self.background_max_running
+            and time.monotonic() - self._last_interactive >= self.background_idle_seconds
+            and self.quiz_service.llm_service.transport.in_flight == 0
+        )
+
+    def _preempt_background(self, db):
+        """Cancel background generations, moving any whose job was promoted by `enqueue` to its new lane"""
+        if not self._background_tasks:
+            return
+        job_ids = [job_id for job_id, _ in self._background_tasks.values()]
+        priorities = dict(
+            db.query(GenerationJob.id, GenerationJob.priority).filter(GenerationJob.id.in_(job_ids)).all()
+        )
+        for task, (job_id, context) in list(self._background_tasks.items()):
+            priority = priorities.get(job_id)
+            if priority is None or is_background(priority):
+                task.cancel()
+                continue
+            del self._background_tasks[task]
+            lane = "batch" if priority == PRIORITY_BATCH else "interactive"
+            # The task is suspended here, so its context can be switched to the new lane
+            context.run(current_lane.set, lane)
+            self._promoted[task] = lane
+            if lane == "batch":
+                self._batch_running += 1
+            else:
+                self._interactive_running += 1
+            print(f"Background job {job_id} was promoted, keeping it running")
+
+    async def run(self, stop: asyncio.Event):
+        print(f"Worker {self.worker_id} started with {self.concurrency} slots")
+        await asyncio.gather(self._reaper(stop), *(self._slot(stop) for _ in range(self.concurrency)))
+        print(f"Worker {self.worker_id} stopped")
+
+    async def _wait(self, stop: asyncio.Event, timeout: float):
+        try:
+            await asyncio.wait_for(stop.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _slot(self, stop: asyncio.Event):
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                job = self.job_queue.claim(
+                    db, self.worker_id, include_background=self._idle(),
+                    include_batch=self._batch_running < self.batch_max_running
+                )
+                if job is None:
+                    await self._wait(stop, self.poll_interval)
+                    continue
+                await self._run_job(db, job)
+            except Exception as e:
+                print(f"Worker slot error: {e}")
+                await self._wait(stop, self.poll_interval)
+            finally:
+                db.close()
+
+    async def _reaper(self, stop: asyncio.Event):
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                requeued = self.job_queue.requeue_stale(db)
+                if requeued:
+                    print(f"Requeued {requeued} stale jobs")
+                resumed = self.batches.resume(db)
+                if resumed:
+                    print(f"Queued {resumed} batch items")
+            except Exception as e:
+                print(f"Stale job check failed: {e}")
+            finally:
+                db.close()
+            await self._wait(stop, self.heartbeat_interval)
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            db = SessionLocal()
+            try:
+                self.job_queue.heartbeat(db, job_id)
+            except Exception as e:
+                print(f"Heartbeat failed for job {job_id}: {e}")
+            finally:
+                db.close()
+
+    async def _run_job(self, db, job: GenerationJob):
+        print(f"Running job {job.id}: {job.url} ({job.difficulty})")
+        lane = "prefetch" if is_background(job.priority) else "batch" if job.priority == PRIORITY_BATCH else "interactive"
+        run = self.quiz_service.regenerate_quiz_async if job.kind == "refresh" else self.quiz_service.generate_quiz_async
+        with llm_lane(lane):
+            context = contextvars.copy_context()
+        generation = asyncio.create_task(run(db, job.url, job.difficulty, job.num_questions), context=context)
+        if lane == "prefetch":
+            self._background_tasks[generation] = (job.id, context)
+        elif lane == "batch":
+            self._batch_running += 1
+        else:
+            self._interactive_running += 1
+            self._last_interactive = time.monotonic()
+            # Real traffic arrived: give the LLM capacity back to it
+            self._preempt_background(db)
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            quiz = await generation
+            self.job_queue.complete(db, job, quiz.id)
+        except asyncio.CancelledError:
+            if not generation.cancelled():
+                raise
+            # LLM responses generated so far stay in the response cache for the retry
+            print(f"Preempted background job {job.id}")
+            self.job_queue.release(db, job)
+        except ValueError as e:
+            self.job_queue.fail(db, job, str(e), 400, retry=False)
+        except ConnectionError as e:
+            self.job_queue.fail(db, job, str(e), 503, retry=True)
+        except Exception as e:
+            self.job_queue.fail(db, job, f"An error occurred: {str(e)}", 500, retry=True)
+        finally:
+            heartbeat.cancel()
+            lane = self._promoted.pop(generation, lane)
+            if lane == "prefetch":
+                self._background_tasks.pop(generation, None)
+            elif lane == "batch":
+                self._batch_running -= 1
+            else:
+                self._interactive_running -= 1
+                self._last_interactive = time.monotonic()
+
+
+def build_worker(job_queue: JobQueue, concurrency: int) -> JobWorker:
+    return JobWorker(
+        job_queue,
+        concurrency=concurrency,
+        poll_interval=settings.job_poll_interval,
+        heartbeat_interval=settings.job_heartbeat_interval,
+        background_enabled=settings.prefetch_enabled or settings.quiz_refresh_enabled,
+        background_idle_seconds=settings.prefetch_idle_seconds,
+        background_max_running=settings.prefetch_max_running,
+        batch_max_running=settings.batch_max_concurrency,
+    )
+
+
+async def serve(concurrency: int):
+    ensure_schema(auto_migrate=settings.auto_migrate)
+    quiz_service = QuizService()
+    job_queue = JobQueue(
+        quiz_service,
+        max_attempts=settings.job_max_attempts,
+        retry_delay=settings.job_retry_delay,
+        stale_after=settings.job_stale_after,
+    )
+    worker = build_worker(job_queue, concurrency)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await worker.run(stop)
+    finally:
+        await quiz_service.llm_service.response_cache.flush_hits()
+        await quiz_service.llm_service.transport.aclose()
+        await quiz_service.scraper.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run quiz generation jobs from the queue")
+    parser.add_argument("--concurrency", type=int, default=settings.job_worker_concurrency)
+    args = parser.parse_args()
+    asyncio.run(serve(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
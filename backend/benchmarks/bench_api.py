@@ -0,0 +1,238 @@
+"""End-to-end API benchmark against the local fake upstream; needs no network or API key.
+
+Starts benchmarks.fake_upstream and the app (uvicorn, embedded job workers,
+throwaway SQLite database) as subprocesses, then measures:
+
+- generate: POST /api/quiz/generate, poll the job, GET the quiz, for fresh
+  articles at each concurrency level (latency percentiles and requests/s)
+- cached_read: GET /api/quiz/{id} for quizzes already in the response cache,
+  with and without If-None-Match (304)
+
+    python -m benchmarks.bench_api [--concurrency 1 4 16] [--requests 32] [--json]
+        [--latency 0.3] [--error-rate 0.01] [--rate-limit-rate 0.02] [--malformed-rate 0.05]
+        [--app-env SCRAPER_ENGINE=bs4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def start_servers(args, workdir: str):
+    upstream_port, app_port = free_port(), free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    upstream = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstream", "--port", str(upstream_port),
+         "--latency", str(args.latency), "--jitter", str(args.jitter),
+         "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+         "--malformed-rate", str(args.malformed_rate), "--retry-after", str(args.retry_after),
+         "--seed", str(args.seed)],
+        cwd=BACKEND_DIR, stdout=sys.stderr,
+    )
+    wait_for(f"{upstream_url}/stats", upstream)
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "GEMINI_API_KEY": "offline-benchmark",
+        "GEMINI_MODEL": "fake-model",
+        "GEMINI_BASE_URL": f"{upstream_url}/v1beta",
+        "SCRAPER_MIRROR_URL": upstream_url,
+        "LLM_MODEL_CACHE_PATH": "",
+        "LLM_REQUESTS_PER_MINUTE": "0",
+        "LLM_RETRY_BASE_DELAY": "0.1",
+        "JOB_EMBEDDED_WORKERS": str(args.workers),
+        "JOB_POLL_INTERVAL": "0.05",
+        "PREFETCH_ENABLED": "false",
+    })
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+        # Server logs go to stderr so --json output stays parseable
+        cwd=BACKEND_DIR, env=env, stdout=sys.stderr,
+    )
+    wait_for(f"http://127.0.0.1:{app_port}/health", app, timeout=60.0)
+    return upstream, app, upstream_url, f"http://127.0.0.1:{app_port}"
+
+
+async def generate_once(client: httpx.AsyncClient, title: str, num_questions: int, timeout: float):
+    """Returns (seconds, quiz id or None, error or None) for one enqueue-poll-fetch round trip"""
+    start = time.perf_counter()
+    response = await client.post("/api/quiz/generate", json={
+        "url": f"https://en.wikipedia.org/wiki/{title}", "difficulty": "mixed", "num_questions": num_questions
+    })
+    if response.status_code != 202:
+        return time.perf_counter() - start, None, f"enqueue {response.status_code}"
+    job = response.json()
+    deadline = start + timeout
+    while job["status"] not in ("succeeded", "failed"):
+        if time.perf_counter() > deadline:
+            return time.perf_counter() - start, None, "timeout"
+        await asyncio.sleep(0.02)
+        job = (await client.get(f"/api/quiz/jobs/{job['id']}")).json()
+    if job["status"] == "failed":
+        return time.perf_counter() - start, None, f"job {job['error_status']}"
+    quiz = await client.get(f"/api/quiz/{job['quiz_id']}")
+    if quiz.status_code != 200:
+        return time.perf_counter() - start, None, f"fetch {quiz.status_code}"
+    return time.perf_counter() - start, job["quiz_id"], None
+
+
+async def run_pool(concurrency: int, total: int, call):
+    """Run `call(i)` for i in range(total) with `concurrency` in flight; returns (results, wall seconds)"""
+    counter = iter(range(total))
+    results = []
+
+    async def worker():
+        for i in counter:
+            results.append(await call(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+async def bench_generate(client: httpx.AsyncClient, levels: list, total: int, args, run_id: str):
+    rows, quiz_ids = [], []
+    for concurrency in levels:
+        results, wall = await run_pool(concurrency, total, lambda i: generate_once(
+            client, f"Bench_{run_id}_c{concurrency}_{i}", args.num_questions, args.timeout
+        ))
+        ok = [seconds for seconds, quiz_id, error in results if error is None]
+        errors = {}
+        for _, quiz_id, error in results:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                quiz_ids.append(quiz_id)
+        rows.append({
+            "scenario": "generate", "concurrency": concurrency, "requests": total,
+            "succeeded": len(ok), "errors": errors, "rps": round(len(ok) / wall, 2),
+            "mean_ms": round(statistics.mean(ok) * 1000, 2) if ok else None, **percentiles(ok),
+        })
+    return rows, quiz_ids
+
+
+async def bench_cached_read(client: httpx.AsyncClient, levels: list, total: int, quiz_ids: list):
+    rows = []
+    if not quiz_ids:
+        return rows
+    etags = {}
+    for quiz_id in quiz_ids:
+        etags[quiz_id] = (await client.get(f"/api/quiz/{quiz_id}")).headers.get("etag")
+
+    for conditional in (False, True):
+        for concurrency in levels:
+            async def read(i):
+                quiz_id = quiz_ids[i % len(quiz_ids)]
+                headers = {"If-None-Match": etags[quiz_id]} if conditional and etags[quiz_id] else {}
+                start = time.perf_counter()
+                response = await client.get(f"/api/quiz/{quiz_id}", headers=headers)
+                return time.perf_counter() - start, response.status_code
+
+            results, wall = await run_pool(concurrency, total, read)
+            ok = [seconds for seconds, status in results if status in (200, 304)]
+            rows.append({
+                "scenario": "cached_read_304" if conditional else "cached_read", "concurrency": concurrency,
+                "requests": total, "succeeded": len(ok), "errors": {}, "rps": round(len(ok) / wall, 2),
+                "mean_ms": round(statistics.mean(ok) * 1000, 2) if ok else None, **percentiles(ok),
+            })
+    return rows
+
+
+async def run_benchmarks(args, app_url: str):
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        rows, quiz_ids = await bench_generate(client, args.concurrency, args.requests, args, str(int(time.time())))
+        rows += await bench_cached_read(client, args.concurrency, args.read_requests, quiz_ids)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="generate requests per concurrency level")
+    parser.add_argument("--read-requests", type=int, default=500, help="cached reads per concurrency level")
+    parser.add_argument("--num-questions", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=4, help="embedded job worker slots in the app")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request deadline in seconds")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app process, repeatable")
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        upstream, app, upstream_url, app_url = start_servers(args, workdir)
+        try:
+            rows = asyncio.run(run_benchmarks(args, app_url))
+            upstream_stats = httpx.get(f"{upstream_url}/stats").json()
+        finally:
+            for process in (app, upstream):
+                process.terminate()
+                process.wait(timeout=30)
+
+    if args.json:
+        print(json.dumps({"results": rows, "upstream": upstream_stats}, indent=2))
+        return
+
+    print(f"{'scenario':<18}{'conc':>5}{'ok':>6}{'rps':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}  errors")
+    for r in rows:
+        print(f"{r['scenario']:<18}{r['concurrency']:>5}{r['succeeded']:>6}{r['rps']:>10}"
+              f"{r['p50_ms']!s:>10}{r['p90_ms']!s:>10}{r['p99_ms']!s:>10}  {r['errors'] or ''}")
+    print(f"upstream: {upstream_stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compare the BeautifulSoup and streaming lxml scraper engines on fixture pages.
+
+Each (fixture, engine) pair runs in a fresh interpreter so peak RSS is
+attributable to that page alone. Rows for the committed synthetic fixtures
+are marked as such: they compare the engines with each other, but are not
+timings of real Wikipedia pages.
+
+    python -m benchmarks.bench_scraper [--repeat 5] [--engine lxml] [--json]
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import is_synthetic, load_fixtures
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _max_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_worker(fixture: str, engine: str, repeat: int) -> dict:
+    from app.services.scraper import extract_article
+
+    html = load_fixtures()[fixture]
+    baseline_kb = _max_rss_kb()
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extract_article(html, engine)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    median_ms = statistics.median(timings)
+    return {
+        "fixture": fixture,
+        "synthetic": is_synthetic(fixture),
+        "engine": engine,
+        "html_kb": len(html) // 1024,
+        "parse_ms_median": round(median_ms, 2),
+        "parse_ms_min": round(min(timings), 2),
+        "pages_per_s": round(1000 / median_ms, 2),
+        "mb_per_s": round(len(html) / 1024 / 1024 / (median_ms / 1000), 2),
+        "peak_rss_delta_kb": _max_rss_kb() - baseline_kb,
+        "result": result,
+    }
+
+
+def same_result(a: dict, b: dict) -> bool:
+    fields = ("title", "summary", "sections", "content", "section_texts")
+    if any(a[f] != b[f] for f in fields):
+        return False
+    # The BeautifulSoup engine truncates an unordered set to 50 links
+    if len(a["links"]) < 50 and len(b["links"]) < 50:
+        return set(a["links"]) == set(b["links"])
+    return len(a["links"]) == len(b["links"])
+
+
+def run_isolated(fixture: str, engine: str, repeat: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_scraper", "--worker", fixture, engine, str(repeat)],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engine", action="append", choices=["bs4", "lxml"])
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    parser.add_argument("--worker", nargs=3, metavar=("FIXTURE", "ENGINE", "REPEAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        fixture, engine, repeat = args.worker
+        print(json.dumps(run_worker(fixture, engine, int(repeat))))
+        return
+
+    engines = args.engine or ["bs4", "lxml"]
+    rows = []
+    for fixture in load_fixtures():
+        results = {engine: run_isolated(fixture, engine, args.repeat) for engine in engines}
+        if len(results) > 1:
+            outputs = [r["result"] for r in results.values()]
+            matches = all(same_result(o, outputs[0]) for o in outputs[1:])
+        else:
+            matches = None
+        for r in results.values():
+            r.pop("result")
+            r["matches_other_engines"] = matches
+            rows.append(r)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'fixture':<36}{'source':<11}{'engine':<8}{'html KB':>9}{'median ms':>11}{'min ms':>9}{'MB/s':>8}"
+          f"{'peak RSS KB':>13}  match")
+    for r in rows:
+        source = "synthetic" if r["synthetic"] else "saved"
+        print(f"{r['fixture']:<36}{source:<11}{r['engine']:<8}{r['html_kb']:>9}{r['parse_ms_median']:>11}"
+              f"{r['parse_ms_min']:>9}{r['mb_per_s']:>8}{r['peak_rss_delta_kb']:>13}  {r['matches_other_engines']}")
+    if any(r["synthetic"] for r in rows):
+        print("Synthetic fixtures are generated pages; compare engines on them, not absolute timings.")
+
+
+if __name__ == "__main__":
+    main()
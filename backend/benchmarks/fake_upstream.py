@@ -0,0 +1,174 @@
+"""Local stand-in for the Gemini REST API and a Wikipedia mirror, for offline benchmarks.
+
+    python -m benchmarks.fake_upstream --port 8765 [--latency 0.3] [--jitter 0.1]
+        [--error-rate 0.01] [--rate-limit-rate 0.02] [--malformed-rate 0.05] [--seed 1]
+
+Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta and
+SCRAPER_MIRROR_URL=http://127.0.0.1:8765.
+
+Gemini:    POST /v1beta/models/{model}:generateContent and :streamGenerateContent
+Wikipedia: GET /wiki/{title} serves benchmarks/fixtures, or a deterministic
+           synthetic article for any other title
+Stats:     GET /stats returns request and injected-fault counts
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from collections import Counter
+from urllib.parse import unquote
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from benchmarks.fixtures import build_article, load_fixtures
+
+
+class FakeUpstream:
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, malformed_rate: float = 0.0, retry_after: float = 1.0,
+                 seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.fixtures = load_fixtures()
+        self.pages = {}
+        self.stats = Counter()
+
+    def page(self, title: str) -> str:
+        if title in self.fixtures:
+            return self.fixtures[title]
+        if title not in self.pages:
+            seed = int(hashlib.sha1(title.encode("utf-8")).hexdigest()[:8], 16)
+            self.pages[title] = build_article(title.replace("_", " "), 8 + seed % 8, 4 + seed % 4, seed, "mw-heading")
+        return self.pages[title]
+
+    def completion(self, prompt: str) -> str:
+        """A plausible answer for each of the app's prompt types"""
+        if "Extract named entities" in prompt:
+            return json.dumps({"people": ["Alan Turing"], "organizations": ["Bletchley Park"], "locations": ["London"]})
+        if "most relevant" in prompt:
+            topics = re.search(r"Topics: (.*)", prompt)
+            names = [t.strip() for t in topics.group(1).split(",")][:8] if topics else []
+            return json.dumps({"topics": names})
+
+        count = re.search(r"(?:Create (?:exactly )?|Write )(\d+)", prompt)
+        count = int(count.group(1)) if count else 6
+        title = re.search(r'about "([^"]+)"', prompt)
+        title = title.group(1) if title else "the article"
+        levels = ["easy", "medium", "hard"]
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+        def term(i: int, k: int) -> str:
+            # Distinct made-up words, so questions are not near-duplicates of each other
+            return "q" + hashlib.sha1(f"{digest}:{i}:{k}".encode("utf-8")).hexdigest()[:7]
+
+        questions = [{
+            "question": f"What links {term(i, 0)} {term(i, 1)} to {term(i, 2)} in {title}?",
+            "options": [f"{term(i, 3 + k)} {term(i, 8 + k)}" for k in range(4)],
+            "answer": f"{term(i, 3)} {term(i, 8)}",
+            "difficulty": levels[i % 3],
+            "explanation": f"The article connects {term(i, 0)} with {term(i, 3)}."
+        } for i in range(count)]
+        return json.dumps({"questions": questions}, indent=2)
+
+    def _fault(self) -> str:
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            return "error"
+        roll -= self.error_rate
+        if roll < self.malformed_rate:
+            return "malformed"
+        return ""
+
+    async def _delay(self):
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+
+    async def generate(self, request: Request) -> Response:
+        action = request.path_params["action"]
+        payload = await request.json()
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        self.stats["gemini_requests"] += 1
+
+        fault = self._fault()
+        if fault:
+            self.stats[fault] += 1
+        if fault == "rate_limited":
+            return JSONResponse(
+                {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded"}},
+                status_code=429, headers={"Retry-After": str(self.retry_after)}
+            )
+        await self._delay()
+        if fault == "error":
+            return JSONResponse({"error": {"code": 503, "status": "UNAVAILABLE"}}, status_code=503)
+
+        text = self.completion(prompt)
+        if fault == "malformed":
+            text = "Here is your quiz:\n" + text[:len(text) // 2]
+        usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4,
+                 "totalTokenCount": (len(prompt) + len(text)) // 4}
+
+        if action == "streamGenerateContent":
+            return StreamingResponse(self._stream(text, usage), media_type="text/event-stream")
+        return JSONResponse({"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": usage})
+
+    async def _stream(self, text: str, usage: dict):
+        chunk_size = 120
+        for start in range(0, len(text), chunk_size):
+            data = {"candidates": [{"content": {"parts": [{"text": text[start:start + chunk_size]}]}}]}
+            if start + chunk_size >= len(text):
+                data["usageMetadata"] = usage
+            yield f"data: {json.dumps(data)}\r\n\r\n"
+            await asyncio.sleep(0.01)
+
+    async def wiki(self, request: Request) -> Response:
+        self.stats["wiki_requests"] += 1
+        title = unquote(request.path_params["title"])
+        return HTMLResponse(self.page(title))
+
+    async def stats_endpoint(self, request: Request) -> Response:
+        return JSONResponse(dict(self.stats))
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v1beta/models/{model}:{action}", self.generate, methods=["POST"]),
+            Route("/wiki/{title:path}", self.wiki, methods=["GET"]),
+            Route("/stats", self.stats_endpoint, methods=["GET"]),
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="mean Gemini latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of calls with truncated JSON")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, malformed_rate=args.malformed_rate,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+    uvicorn.run(upstream.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Synthetic Wikipedia-like article fixtures for the offline benchmarks.
+
+The committed pages are generated, not saved from Wikipedia: their text is
+random words, and their names say how big they are and which heading markup
+they use. They copy the MediaWiki skin's structure (head scripts and styles,
+infobox, reference superscripts, navboxes and reference lists) and come in
+both heading styles: the legacy `<h2><span class="mw-headline">` and the
+current `<div class="mw-heading mw-heading2"><h2 id=...>`. Rebuild them with:
+
+    python -m benchmarks.fixtures
+
+Real pages can be dropped into benchmarks/fixtures/ as .html or .html.gz
+(e.g. `curl https://en.wikipedia.org/wiki/Alan_Turing > fixtures/Alan_Turing.html`),
+and the benchmarks report them apart from the synthetic ones.
+"""
+import gzip
+import random
+from pathlib import Path
+from typing import Dict
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+WORDS = (
+    "the of and in to was a his he for as with by on at from that which university "
+    "war research mathematics computer theory machine work published developed "
+    "government london cambridge war-time codebreaking logic model science history "
+    "first later became early life career legacy death during after before known "
+    "including paper proposed system national society award royal fellow college "
+    "student professor laboratory project design method test problem solution"
+).split()
+
+SYNTHETIC_PREFIX = "Synthetic_"
+
+# (slug, sections, paragraphs per section, seed, heading markup)
+CORPUS = [
+    ("Synthetic_medium_legacy_headings", 11, 6, 1, "legacy"),
+    ("Synthetic_large_mw_heading", 16, 9, 2, "mw-heading"),
+    ("Synthetic_medium_mw_heading", 13, 7, 3, "mw-heading"),
+    ("Synthetic_small_legacy_headings", 9, 5, 4, "legacy"),
+]
+
+
+def is_synthetic(name: str) -> bool:
+    return name.startswith(SYNTHETIC_PREFIX)
+
+
+def _sentence(rng: random.Random, refs: bool = True) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 22))]
+    words[0] = words[0].capitalize()
+    for i in range(len(words)):
+        if rng.random() < 0.08:
+            target = rng.choice(WORDS).capitalize()
+            words[i] = f'<a href="/wiki/{target}_{rng.randint(1, 400)}" title="{target}">{words[i]} {target}</a>'
+    sentence = " ".join(words) + "."
+    if refs and rng.random() < 0.4:
+        n = rng.randint(1, 180)
+        sentence += f'<sup id="cite_ref-{n}" class="reference"><a href="#cite_note-{n}">[{n}]</a></sup>'
+    return sentence
+
+
+def _paragraph(rng: random.Random) -> str:
+    return "<p>" + " ".join(_sentence(rng) for _ in range(rng.randint(3, 8))) + "\n</p>\n"
+
+
+def _heading(level: int, text: str, anchor: str, slug: str, section: int, markup: str) -> str:
+    edit = (f"<span class=\"mw-editsection\"><span class=\"mw-editsection-bracket\">[</span>"
+            f"<a href=\"/w/index.php?title={slug}&amp;action=edit&amp;section={section}\">edit</a>"
+            f"<span class=\"mw-editsection-bracket\">]</span></span>")
+    if markup == "mw-heading":
+        return f"<div class=\"mw-heading mw-heading{level}\"><h{level} id=\"{anchor}\">{text}</h{level}>{edit}</div>\n"
+    return f"<h{level}><span class=\"mw-headline\" id=\"{anchor}\">{text}</span>{edit}</h{level}>\n"
+
+
+def build_article(title: str, sections: int, paragraphs: int, seed: int, markup: str = "legacy") -> str:
+    rng = random.Random(seed)
+    slug = title.replace(" ", "_")
+    parts = [
+        "<!DOCTYPE html>\n<html class=\"client-nojs\" lang=\"en\" dir=\"ltr\">\n<head>\n",
+        f"<meta charset=\"UTF-8\">\n<title>{title} - Wikipedia</title>\n",
+    ]
+    for i in range(12):
+        parts.append(f"<script>RLCONF_{i}={{" + ",".join(f'"wg{j}":{rng.randint(0, 9999)}' for j in range(120)) + "};</script>\n")
+        parts.append("<style>" + "".join(f".c{i}-{j}{{margin:{j}px}}" for j in range(200)) + "</style>\n")
+    parts.append("</head>\n<body class=\"mediawiki skin-vector\">\n<div id=\"mw-page-base\"></div>\n")
+    parts.append("<div id=\"content\" class=\"mw-body\" role=\"main\">\n")
+    parts.append(f"<h1 id=\"firstHeading\" class=\"firstHeading mw-first-heading\"><span class=\"mw-page-title-main\">{title}</span></h1>\n")
+    parts.append("<div id=\"bodyContent\" class=\"vector-body\">\n")
+    parts.append("<div id=\"mw-content-text\" class=\"mw-body-content\"><div class=\"mw-content-ltr mw-parser-output\" lang=\"en\" dir=\"ltr\">\n")
+
+    parts.append("<table class=\"infobox vcard\"><tbody>\n")
+    for i in range(25):
+        parts.append(f"<tr><th scope=\"row\">Field {i}</th><td>{_sentence(rng, refs=False)}</td></tr>\n")
+    parts.append("</tbody></table>\n")
+    for _ in range(3):
+        parts.append(_paragraph(rng))
+
+    parts.append("<div id=\"toc\" class=\"toc\"><h2 id=\"mw-toc-heading\">Contents</h2><ul>\n")
+    for i in range(sections):
+        parts.append(f"<li class=\"toclevel-1\"><a href=\"#Section_{i}\"><span class=\"toctext\">Section {i}</span></a></li>\n")
+    parts.append("</ul></div>\n")
+
+    for i in range(sections):
+        heading = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).capitalize()
+        parts.append(_heading(2, heading, f"Section_{i}", slug, i, markup))
+        for j in range(paragraphs):
+            if j and j % 3 == 0:
+                sub = " ".join(rng.choice(WORDS) for _ in range(2)).capitalize()
+                parts.append(_heading(3, sub, f"Sub_{i}_{j}", slug, i, markup))
+            parts.append(_paragraph(rng))
+        if rng.random() < 0.5:
+            parts.append("<table class=\"wikitable\"><tbody>" + "".join(
+                f"<tr><td>{_sentence(rng, refs=False)}</td><td>{rng.randint(1900, 2020)}</td></tr>" for _ in range(8)
+            ) + "</tbody></table>\n")
+
+    for i, heading in enumerate(("See also", "Notes", "References", "External links"), sections):
+        parts.append(_heading(2, heading, heading.replace(" ", "_"), slug, i, markup))
+    parts.append("<div class=\"reflist\"><ol class=\"references\">\n")
+    for n in range(1, 181):
+        parts.append(f"<li id=\"cite_note-{n}\"><span class=\"reference-text\"><cite class=\"citation book\">{_sentence(rng, refs=False)}</cite> <a href=\"/wiki/Special:BookSources/{n}\">ISBN</a></span></li>\n")
+    parts.append("</ol></div>\n")
+    parts.append("<div class=\"navbox\"><table class=\"nowraplinks\"><tbody>\n")
+    for i in range(30):
+        parts.append("<tr><td>" + " · ".join(f'<a href="/wiki/Nav_{i}_{k}">Nav {i} {k}</a>' for k in range(12)) + "</td></tr>\n")
+    parts.append("</tbody></table></div>\n")
+    parts.append("</div></div>\n")
+    parts.append("<div id=\"catlinks\" class=\"catlinks\"><ul>" + "".join(
+        f"<li><a href=\"/wiki/Category:Cat_{i}\">Cat {i}</a></li>" for i in range(20)
+    ) + "</ul></div>\n")
+    parts.append("</div></div>\n</body>\n</html>\n")
+    return "".join(parts)
+
+
+def load_fixtures() -> Dict[str, str]:
+    fixtures = {}
+    for path in sorted(FIXTURES_DIR.iterdir()):
+        if path.name.endswith(".html.gz"):
+            fixtures[path.name[:-len(".html.gz")]] = gzip.decompress(path.read_bytes()).decode("utf-8")
+        elif path.name.endswith(".html"):
+            fixtures[path.name[:-len(".html")]] = path.read_text(encoding="utf-8")
+    return fixtures
+
+
+def write_corpus():
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    for slug, sections, paragraphs, seed, markup in CORPUS:
+        html = build_article(slug.replace("_", " "), sections, paragraphs, seed, markup)
+        path = FIXTURES_DIR / f"{slug}.html.gz"
+        path.write_bytes(gzip.compress(html.encode("utf-8"), mtime=0))
+        print(f"Wrote {path} ({len(html) // 1024} KB uncompressed)")
+
+
+if __name__ == "__main__":
+    write_corpus()
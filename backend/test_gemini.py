@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -23,13 +24,13 @@ def test_quiz_generation():
         print(f"Testing {difficulty.upper()} difficulty")
         print(f"{'='*60}")
         
-        questions = llm.generate_quiz(
+        questions = asyncio.run(llm.generate_quiz(
             title=data["title"],
             content=data["content"],
             sections=data["sections"],
             difficulty=difficulty,
             num_questions=4
-        )
+        ))
         
         print(f"\nGenerated {len(questions)} questions:")
         for i, q in enumerate(questions, 1):
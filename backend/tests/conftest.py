@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Settings are read at import time, so the throwaway database must be configured first
+_workdir = tempfile.mkdtemp(prefix="wiki-quiz-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ["LLM_MODEL_CACHE_PATH"] = ""
+os.environ["PREFETCH_ENABLED"] = "false"
+os.environ["QUIZ_REFRESH_ENABLED"] = "false"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.migrations import migrate  # noqa: E402
+
+migrate(engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+
+from app.database import SessionLocal
+from app.models import GenerationJob, QuizBatch, QuizBatchItem
+from app.services.batch_service import BatchService
+from app.services.job_queue import PRIORITY_BATCH, JobQueue
+from app.services.question_bank import BANK_LEVELS
+from app.services.quiz_service import QuizService
+from app.worker import JobWorker
+
+_keys = itertools.count()
+
+
+class FakeScraper:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = 0
+
+    async def scrape_async(self, url: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        title = url.rsplit("/", 1)[-1]
+        if title in self.failing:
+            raise ValueError(f"Could not fetch {title}")
+        return {
+            "title": title, "summary": "", "content": f"{title} text", "sections": [], "links": [],
+            "section_texts": None, "canonical_url": url,
+        }
+
+
+def fake_questions(title: str, count: int) -> list:
+    # Every question has its own words so none of them look like near-duplicates
+    return [
+        {"question": f"{title.lower()}q{i}a {title.lower()}q{i}b?", "options": ["a", "b", "c", "d"],
+         "answer": f"{title.lower()}a{i}", "difficulty": BANK_LEVELS[i % 3], "explanation": ""}
+        for i in range(count)
+    ]
+
+
+def fake_service(failing=()) -> QuizService:
+    service = QuizService()
+    service.scraper = FakeScraper(failing)
+    service.generations = 0
+
+    async def generate_all_async(title, content, sections, links, difficulty="mixed", num_questions=6,
+                                 section_texts=None, levels=None):
+        service.generations += 1
+        await asyncio.sleep(0.01)
+        return {"quiz": fake_questions(title, num_questions), "entities": {}, "topics": []}
+
+    service.llm_service.generate_all_async = generate_all_async
+    return service
+
+
+def fake_worker(failing=()) -> JobWorker:
+    return JobWorker(JobQueue(fake_service(failing), max_attempts=1))
+
+
+def run_jobs(worker: JobWorker):
+    """Run queued jobs one at a time until none are left, like a worker slot would"""
+    async def drain():
+        while True:
+            db = SessionLocal()
+            try:
+                job = worker.job_queue.claim(db, "test-worker")
+                if job is None:
+                    return
+                await worker._run_job(db, job)
+            finally:
+                db.close()
+
+    asyncio.run(drain())
+
+
+def wiki(title: str) -> str:
+    return f"https://en.wikipedia.org/wiki/{title}"
+
+
+def test_batch_items_run_as_jobs_and_settle_one_by_one(db):
+    good, bad = f"Good_{next(_keys)}", f"Bad_{next(_keys)}"
+    worker = fake_worker(failing={bad})
+    batch = worker.batches.create_batch(db, [
+        {"url": url, "difficulty": "mixed", "num_questions": 6}
+        for url in [wiki(good), wiki(bad), wiki(good), "https://example.com/wiki/Foo"]
+    ])
+
+    assert (batch.status, batch.failed) == ("running", 1)
+    items = worker.batches.get_batch_items(db, batch.id)
+    assert items[0].job_id == items[2].job_id
+    job = db.query(GenerationJob).filter(GenerationJob.id == items[0].job_id).one()
+    assert job.priority == PRIORITY_BATCH
+
+    run_jobs(worker)
+    db.expire_all()
+    batch = worker.batches.sync(db, worker.batches.get_batch(db, batch.id))
+    items = worker.batches.get_batch_items(db, batch.id)
+
+    assert (batch.status, batch.completed, batch.failed) == ("completed", 2, 2)
+    assert [item.status for item in items] == ["generated", "failed", "generated", "failed"]
+    assert items[0].quiz_id and items[0].quiz_id == items[2].quiz_id
+    assert worker.quiz_service.generations == 1
+
+
+def test_batch_left_pending_survives_a_restart(db):
+    # The web process stored the batch and died before queueing any job
+    titles = [f"Restart_{next(_keys)}" for _ in range(2)]
+    batch = QuizBatch(status="running", total=len(titles))
+    db.add(batch)
+    db.flush()
+    db.add_all([
+        QuizBatchItem(batch_id=batch.id, position=position, url=wiki(title), difficulty="easy", num_questions=4)
+        for position, title in enumerate(titles)
+    ])
+    db.commit()
+
+    # A freshly started worker picks it up on its first reaper pass
+    worker = fake_worker()
+    assert worker.batches.resume(db) == 2
+    run_jobs(worker)
+    worker.batches.resume(db)
+
+    db.expire_all()
+    batch = db.query(QuizBatch).filter(QuizBatch.id == batch.id).one()
+    assert (batch.status, batch.completed, batch.failed) == ("completed", 2, 0)
+    assert all(item.quiz_id for item in BatchService(worker.job_queue).get_batch_items(db, batch.id))
@@ -0,0 +1,53 @@
+from app.services.content_condenser import ContentCondenser, split_sentences
+
+
+def filler(topic: str, count: int) -> str:
+    return " ".join(
+        f"The {topic} section goes on about yet another minor detail at some considerable length here." for _ in range(count)
+    )
+
+
+SECTIONS = [
+    {"heading": "Introduction", "text": "Ada Lovelace was an English mathematician born in London in 1815. " + filler("intro", 20)},
+    {"heading": "Early life", "text": "Lovelace studied mathematics with Mary Somerville from 1833. " + filler("early", 60)},
+    {"heading": "Work", "text": "In 1843 Lovelace published the first algorithm for the Analytical Engine. " + filler("work", 40)},
+]
+
+
+def test_short_articles_are_returned_whole():
+    sections = [{"heading": "Introduction", "text": "Short."}, {"heading": "History", "text": "Also short."}]
+    assert ContentCondenser().condense("Short", sections, "", 1000) == (
+        "Section: Introduction\nShort.\n\nSection: History\nAlso short."
+    )
+    assert ContentCondenser().condense("Plain", None, "Just the content.", 1000) == "Just the content."
+
+
+def test_condensed_text_fits_the_budget_and_keeps_every_section():
+    condensed = ContentCondenser().condense("Ada Lovelace", SECTIONS, "", 1500)
+
+    assert len(condensed) <= 1500
+    assert [line for line in condensed.splitlines() if line.startswith("Section: ")] == [
+        "Section: Introduction", "Section: Early life", "Section: Work"
+    ]
+    # Lead sentences and fact-dense sentences win over filler
+    for fact in ["born in London in 1815", "from 1833", "first algorithm for the Analytical Engine"]:
+        assert fact in condensed
+
+
+def test_results_are_cached_per_article_and_budget():
+    condenser = ContentCondenser()
+    first = condenser.condense("Ada Lovelace", SECTIONS, "", 1500)
+
+    assert condenser.condense("Ada Lovelace", SECTIONS, "", 1500) is first
+    assert len(condenser._scored) == 1
+    assert len(condenser.condense("Ada Lovelace", SECTIONS, "", 800)) <= 800
+    # A second budget reuses the sentence scores
+    assert len(condenser._scored) == 1
+
+
+def test_sentences_are_split_and_long_ones_trimmed():
+    assert split_sentences("First one. Second one! Third? 4th is lower.") == [
+        "First one.", "Second one!", "Third?", "4th is lower."
+    ]
+    long = split_sentences("word " * 200)[0]
+    assert len(long) <= 604 and long.endswith("...")
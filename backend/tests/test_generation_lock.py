@@ -0,0 +1,84 @@
+import asyncio
+
+from app.services.generation_lock import SingleFlight, advisory_lock
+
+
+def test_follower_survives_a_cancelled_leader():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "quiz"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return leader, await follower
+
+    leader, result = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert result == "quiz"
+
+
+def test_work_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        state = {"cancelled": False}
+
+        async def work():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # A new call starts fresh instead of joining the cancelled work
+        fresh = await flight.do("key", lambda: asyncio.sleep(0, result="again"))
+        return state["cancelled"], fresh
+
+    assert asyncio.run(scenario()) == (True, "again")
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("Invalid Wikipedia URL")
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_advisory_lock_serializes_one_key_in_process():
+    async def scenario():
+        order = []
+
+        async def hold(name: str):
+            async with advisory_lock("quiz:en:Lock_test"):
+                order.append(f"{name} in")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} out")
+
+        await asyncio.gather(hold("a"), hold("b"))
+        return order
+
+    assert asyncio.run(scenario()) == ["a in", "a out", "b in", "b out"]
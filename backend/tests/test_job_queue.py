@@ -0,0 +1,92 @@
+import asyncio
+import itertools
+
+import pytest
+
+from app.database import SessionLocal
+from app.models import GenerationJob
+from app.routers.quiz import job_events
+from app.services.job_queue import PRIORITY_PREFETCH, JobQueue
+from app.services.quiz_service import QuizService
+from tests.test_batch_service import fake_worker, wiki
+from tests.test_quiz_service import make_quiz
+
+_keys = itertools.count()
+
+
+def test_enqueue_for_a_stored_quiz_reuses_one_job(db):
+    service = QuizService()
+    queue = JobQueue(service)
+    key = f"Stored_{next(_keys)}"
+    quiz = service._insert_quiz(db, make_quiz(key))
+
+    first = queue.enqueue(db, f"https://en.wikipedia.org/wiki/{key}")
+    second = queue.enqueue(db, f"https://en.wikipedia.org/wiki/{key}")
+
+    assert (first.status, first.quiz_id) == ("succeeded", quiz.id)
+    assert second.id == first.id
+    assert db.query(GenerationJob).filter(GenerationJob.canonical_key == f"en:{key}").count() == 1
+
+
+def test_promoted_prefetch_job_is_not_preempted(db):
+    worker = fake_worker()
+    queue = worker.job_queue
+    prefetched, other = f"Prefetched_{next(_keys)}", f"Other_{next(_keys)}"
+    prefetch = queue.enqueue(db, wiki(prefetched), priority=PRIORITY_PREFETCH)
+
+    async def scenario():
+        background_db, user_db = SessionLocal(), SessionLocal()
+        try:
+            job = queue.claim(background_db, "test-worker")
+            assert job.id == prefetch.id
+            running = asyncio.create_task(worker._run_job(background_db, job))
+            await asyncio.sleep(0)
+            # A user asks for the quiz being prefetched, then another user job arrives
+            assert queue.enqueue(db, wiki(prefetched)).id == prefetch.id
+            queue.enqueue(db, wiki(other))
+            await asyncio.gather(running, worker._run_job(user_db, queue.claim(user_db, "test-worker")))
+        finally:
+            background_db.close()
+            user_db.close()
+
+    asyncio.run(scenario())
+    db.expire_all()
+
+    assert (queue.get_job(db, prefetch.id).status, queue.get_job(db, prefetch.id).attempts) == ("succeeded", 1)
+    assert worker.quiz_service.generations == 2
+    assert (worker._interactive_running, worker._background_tasks, worker._promoted) == (0, {}, {})
+
+
+def test_enqueue_rejects_articles_the_scraper_cannot_fetch(db):
+    queue = JobQueue(QuizService())
+    title = f"Berlin_{next(_keys)}"
+    jobs = db.query(GenerationJob).count()
+
+    for url in [f"https://de.wikipedia.org/wiki/{title}", f"https://de.m.wikipedia.org/wiki/{title}"]:
+        with pytest.raises(ValueError):
+            queue.enqueue(db, url)
+
+    assert db.query(GenerationJob).count() == jobs
+    job = queue.enqueue(db, f"https://en.m.wikipedia.org/wiki/{title}")
+    assert queue.quiz_service.scraper.validate_wikipedia_url(job.url)
+    # Leave nothing queued for tests that claim jobs
+    db.delete(job)
+    db.commit()
+
+
+def test_job_events_end_with_an_error_when_the_job_disappears(db):
+    queue = JobQueue(QuizService())
+    job = queue.enqueue(db, wiki(f"Vanishing_{next(_keys)}"))
+
+    async def events():
+        response = await job_events(job.id)
+        stream = response.body_iterator
+        first = await stream.__anext__()
+        db.delete(job)
+        db.commit()
+        return [first] + [event async for event in stream]
+
+    received = asyncio.run(events())
+
+    assert received[0].startswith("event: status")
+    assert received[-1].startswith("event: error") and '"status": 404' in received[-1]
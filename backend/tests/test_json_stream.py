@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.services.json_stream import IncrementalObjectParser, parse_objects
+
+QUESTIONS = [
+    {"question": "Who proposed it {first}?", "options": ["A \"quoted\" one", "B}", "C\\", "D"], "answer": "B}"},
+    {"question": "When?", "options": ["1936", "1937", "1938", "1939"], "answer": "1936", "difficulty": "easy"},
+]
+
+
+def feed_in_chunks(text: str, size: int) -> list:
+    parser = IncrementalObjectParser()
+    found = []
+    for i in range(0, len(text), size):
+        found.extend(parser.feed(text[i:i + size]))
+    return found
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_objects_arrive_whole_whatever_the_chunking(size):
+    text = json.dumps({"questions": QUESTIONS})
+    assert feed_in_chunks(text, size) == QUESTIONS
+
+
+def test_each_object_is_emitted_once_its_brace_closes():
+    text = json.dumps(QUESTIONS)
+    cut = text.index("}, {") + 1
+    parser = IncrementalObjectParser()
+
+    assert parser.feed(text[:cut - 1]) == []
+    assert parser.feed(text[cut - 1:cut]) == [QUESTIONS[0]]
+    assert parser.feed(text[cut:]) == [QUESTIONS[1]]
+
+
+@pytest.mark.parametrize("wrapper", [
+    "```json\n{body}\n```",
+    "Here is your quiz: {body} Good luck!",
+    '{{"quiz": {{"questions": {body}}}}}',
+])
+def test_wrappers_around_the_objects_are_ignored(wrapper):
+    text = wrapper.format(body=json.dumps(QUESTIONS))
+    assert parse_objects(text) == QUESTIONS
+
+
+def test_truncated_response_keeps_the_complete_objects():
+    text = json.dumps({"questions": QUESTIONS})
+    assert parse_objects(text[:text.index('"When?"') + 10]) == QUESTIONS[:1]
+
+
+def test_objects_missing_required_keys_are_skipped():
+    text = json.dumps([{"question": "No options?"}, {"options": []}, QUESTIONS[1]])
+    assert parse_objects(text) == [QUESTIONS[1]]
+    assert parse_objects(json.dumps({"name": "x"}), required_keys=("name",)) == [{"name": "x"}]
+    assert parse_objects(None) == []
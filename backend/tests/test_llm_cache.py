@@ -0,0 +1,31 @@
+import asyncio
+import itertools
+
+from app.models import LLMCacheEntry
+from app.services.llm_cache import LLMResponseCache
+
+_keys = itertools.count()
+
+
+def stored_entry(db, key: str) -> LLMCacheEntry:
+    db.expire_all()
+    return db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key == key).one()
+
+
+def test_hits_are_recorded_in_batches(db):
+    cache = LLMResponseCache(touch_every=3, touch_interval=3600)
+    key = f"hits-{next(_keys)}"
+
+    async def hit(times: int):
+        return [await cache.get(key) for _ in range(times)]
+
+    asyncio.run(cache.put(key, "test-model", "response"))
+    assert asyncio.run(hit(2)) == ["response", "response"]
+    assert stored_entry(db, key).hit_count == 0
+
+    asyncio.run(hit(1))
+    assert stored_entry(db, key).hit_count == 3
+
+    asyncio.run(hit(1))
+    asyncio.run(cache.flush_hits())
+    assert stored_entry(db, key).hit_count == 4
@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from app.services.llm_governor import LLMGovernor, LLMUnavailableError, parse_retry_after
+from app.services.llm_service import LLMService
+
+_prompts = itertools.count()
+
+
+def service_with_responses(responses, governor: LLMGovernor) -> LLMService:
+    service = LLMService()
+    service.model_resolver.pinned_model = "test-model"
+    service.governor = governor
+    service.calls = 0
+
+    async def generate_content(model, payload, timeout=None):
+        response = responses[service.calls]
+        service.calls += 1
+        return response
+
+    service.transport.generate_content = generate_content
+    return service
+
+
+def ok(text: str, used: int) -> httpx.Response:
+    return httpx.Response(200, json={
+        "candidates": [{"content": {"parts": [{"text": text}]}}],
+        "usageMetadata": {"totalTokenCount": used},
+    })
+
+
+def test_rate_limited_call_waits_for_retry_after_and_is_refunded():
+    governor = LLMGovernor(requests_per_minute=600, tokens_per_minute=60000, base_delay=0.01)
+    service = service_with_responses([httpx.Response(429, headers={"retry-after": "0.2"}), ok("done", 100)], governor)
+
+    start = time.monotonic()
+    text = asyncio.run(service._call_llm(f"rate limited {next(_prompts)}", max_tokens=4000))
+
+    assert text == "done"
+    assert service.calls == 2
+    assert time.monotonic() - start >= 0.2
+    assert governor.stats["rate_limited"] == 1
+    # Only the 100 tokens actually used stay charged; the rejected attempt's reservation came back
+    assert governor.tokens.tokens >= governor.tokens.capacity - 200
+
+
+def test_server_errors_refund_their_reservation():
+    governor = LLMGovernor(tokens_per_minute=60000, base_delay=0.01)
+    service = service_with_responses([httpx.Response(503), httpx.Response(500), ok("done", 100)], governor)
+
+    assert asyncio.run(service._call_llm(f"server error {next(_prompts)}", max_tokens=4000)) == "done"
+    assert governor.stats["failures"] == 2
+    assert governor.tokens.tokens >= governor.tokens.capacity - 200
+
+
+def test_retry_after_blocks_every_caller():
+    governor = LLMGovernor(requests_per_minute=600, max_wait=0.1, base_delay=0.01)
+
+    delay = governor.record_rate_limited(0, retry_after=5)
+
+    assert 5 <= delay <= 5.01
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(governor.acquire(10))
+
+
+def test_breaker_opens_then_lets_one_trial_call_through():
+    governor = LLMGovernor(failure_threshold=2, reset_timeout=0.05)
+    governor.record_failure()
+    governor.record_failure()
+
+    assert governor.breaker.state == "open"
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(governor.acquire(10))
+
+    time.sleep(0.06)
+    asyncio.run(governor.acquire(10))
+    assert governor.breaker.state == "half_open"
+    # Only the trial call goes out while half open
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(governor.acquire(10))
+
+    governor.record_failure()
+    assert governor.breaker.state == "open"
+    time.sleep(0.06)
+    asyncio.run(governor.acquire(10))
+    governor.record_success(10)
+    assert (governor.breaker.state, governor.breaker.failures) == ("closed", 0)
+
+
+def test_backoff_is_jittered_exponential_and_capped():
+    governor = LLMGovernor(base_delay=1.0, max_delay=8.0)
+
+    for attempt in range(6):
+        delays = [governor.retry_delay(attempt) for _ in range(50)]
+        assert all(0 <= delay <= min(8.0, 2 ** attempt) for delay in delays)
+    # Without Retry-After a 429 pauses for at least the exponential step, up to max_delay
+    assert 4.0 <= governor.record_rate_limited(2) <= 8.0
+    assert governor.record_rate_limited(10) == 8.0
+
+
+@pytest.mark.parametrize("response, expected", [
+    (httpx.Response(429, headers={"retry-after": "7"}), 7.0),
+    (httpx.Response(429, headers={"retry-after": "-3"}), 0.0),
+    (httpx.Response(429, text='{"error": {"details": [{"retryDelay": "12.5s"}]}}'), 12.5),
+    (httpx.Response(429), None),
+])
+def test_retry_after_is_read_from_the_header_or_the_error_body(response, expected):
+    assert parse_retry_after(response) == expected
+
+
+def test_retry_after_accepts_an_http_date():
+    when = formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after(httpx.Response(429, headers={"retry-after": when})) <= 30
@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+
+from app.services.llm_governor import LLMGovernor
+from app.services.llm_service import LLMService, settings
+
+_prompts = itertools.count()
+
+
+def streaming_service(chunks, fail_after=None) -> LLMService:
+    service = LLMService()
+    service.model_resolver.pinned_model = "test-model"
+
+    async def stream_generate_content(model, payload, timeout=None):
+        for i, chunk in enumerate(chunks):
+            if i == fail_after:
+                raise ConnectionError("stream reset")
+            yield chunk
+
+    service.transport.stream_generate_content = stream_generate_content
+    return service
+
+
+async def collect(service: LLMService, prompt: str) -> str:
+    return "".join([text async for text in service._stream_llm(prompt)])
+
+
+async def cached(service: LLMService, prompt: str):
+    model = await service.model_resolver.get_model()
+    return await service.response_cache.get(service._cache_key(model, prompt, 4096, None))
+
+
+def test_stream_broken_midway_is_not_cached():
+    prompt = f"broken stream {next(_prompts)}"
+    service = streaming_service(["first ", "second ", "third"], fail_after=2)
+
+    assert asyncio.run(collect(service, prompt)) == "first second "
+    assert asyncio.run(cached(service, prompt)) is None
+
+
+def test_finished_stream_is_cached():
+    prompt = f"finished stream {next(_prompts)}"
+    service = streaming_service(["first ", "second"])
+
+    assert asyncio.run(collect(service, prompt)) == "first second"
+    assert asyncio.run(cached(service, prompt)) == "first second"
+
+
+def test_governor_splits_the_limits_between_processes():
+    governor = LLMGovernor(requests_per_minute=60, tokens_per_minute=90000, processes=3)
+    assert (governor.requests.capacity, governor.tokens.capacity) == (20, 30000)
+
+
+def test_bank_pool_is_one_prompt_with_per_level_counts():
+    service = LLMService()
+    prompts = []
+
+    async def call_llm(prompt, max_tokens=4096, timeout=None, task="quiz", schema=None):
+        prompts.append(prompt)
+        return ""
+
+    async def no_extras(*args):
+        return {}
+
+    async def sharded(*args):
+        raise AssertionError("a bank pool must not be sharded")
+
+    service._call_llm = call_llm
+    service.extract_entities = no_extras
+    service.get_related_topics = no_extras
+    service.generate_quiz_sharded = sharded
+    section_texts = [{"heading": f"Part {i}", "text": f"Section {i} text. " * 50} for i in range(4)]
+    asyncio.run(service.generate_all_async(
+        "Pool", "Pool text", [], [], num_questions=12, section_texts=section_texts,
+        levels={"easy": 4, "medium": 4, "hard": 4}
+    ))
+
+    assert "Include 4 easy, 4 medium, and 4 hard questions" in prompts[0]
+
+
+def test_sharded_top_up_sees_the_article_without_condensing(monkeypatch):
+    monkeypatch.setattr(settings, "llm_condense_enabled", False)
+    service = LLMService()
+    topups = []
+    shard_ids = itertools.count()
+
+    async def generate_shard(title, chunk, difficulty, count):
+        i = next(shard_ids)
+        return [{"question": f"Shard {i} asks q{i}a q{i}b?", "options": ["a", "b", "c", "d"], "answer": "a",
+                 "difficulty": difficulty, "explanation": ""}]
+
+    async def call_llm(prompt, max_tokens=4096, timeout=None, task="quiz", schema=None):
+        topups.append(prompt)
+        return ""
+
+    service._generate_shard = generate_shard
+    service._call_llm = call_llm
+    section_texts = [{"heading": f"Part {i}", "text": f"Section {i} fact. " * 200} for i in range(4)]
+    asyncio.run(service.generate_quiz_sharded("Sharded", section_texts, [], "mixed", 10))
+
+    assert topups and "Section 0 fact." in topups[0]
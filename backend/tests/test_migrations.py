@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.migrations import LATEST_VERSION, MIGRATIONS, current_version, ensure_schema, migrate
+
+# The quizzes table as the first release created it, before schema versioning
+LEGACY_SCHEMA = """
+CREATE TABLE quizzes (
+    id INTEGER PRIMARY KEY,
+    url VARCHAR(500),
+    title VARCHAR(300),
+    summary TEXT,
+    key_entities JSON,
+    sections JSON,
+    quiz_data JSON,
+    related_topics JSON,
+    difficulty VARCHAR(20) DEFAULT 'mixed',
+    raw_html TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME
+)
+"""
+
+QUESTIONS = """[
+  {"question": "Who wrote the first published algorithm?", "options": ["Ada Lovelace", "Alan Turing", "Grace Hopper", "Charles Babbage"], "answer": "Ada Lovelace", "difficulty": "easy", "explanation": ""},
+  {"question": "Which machine was the algorithm written for?", "options": ["Analytical Engine", "Difference Engine", "ENIAC", "Colossus"], "answer": "Analytical Engine", "difficulty": "medium", "explanation": ""}
+]"""
+
+
+def temp_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path}/schema.db")
+
+
+def test_versions_are_numbered_in_order():
+    assert [m.version for m in MIGRATIONS] == list(range(1, LATEST_VERSION + 1))
+    assert len({m.name for m in MIGRATIONS}) == len(MIGRATIONS)
+
+
+def test_empty_database_migrates_to_latest_once(tmp_path):
+    engine = temp_engine(tmp_path)
+
+    assert migrate(engine) == LATEST_VERSION
+    assert migrate(engine) == LATEST_VERSION
+    with engine.connect() as conn:
+        assert current_version(conn) == LATEST_VERSION
+        assert conn.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == LATEST_VERSION
+        indexes = {index["name"] for index in inspect(conn).get_indexes("quizzes")}
+    assert "ix_quizzes_created_at_id" not in indexes
+    assert "uq_quizzes_canonical_key_difficulty_count" in indexes
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    engine = temp_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_SCHEMA))
+        conn.execute(text(
+            "INSERT INTO quizzes (url, title, summary, key_entities, sections, quiz_data, related_topics, difficulty, raw_html) "
+            "VALUES (:url, 'Ada Lovelace', '', '{}', '[]', :quiz, '[]', 'mixed', '<html>Ada</html>')"
+        ), [
+            {"url": "https://en.wikipedia.org/wiki/Ada_Lovelace", "quiz": QUESTIONS},
+            # Same article through another URL form; it keeps a NULL key rather than being deleted
+            {"url": "https://en.m.wikipedia.org/wiki/ada_Lovelace", "quiz": QUESTIONS},
+        ])
+
+    assert migrate(engine) == LATEST_VERSION
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT canonical_key, quality, snapshot_hash, raw_html FROM quizzes ORDER BY id"
+        )).all()
+        assert [row.canonical_key for row in rows] == ["en:Ada_Lovelace", None]
+        assert all(row.quality == "llm" and row.snapshot_hash and not row.raw_html for row in rows)
+        assert conn.execute(text("SELECT COUNT(*) FROM page_snapshots")).scalar() == 1
+        assert conn.execute(text("SELECT COUNT(*) FROM question_bank")).scalar() == 2
+        assert {"job_id"} <= {c["name"] for c in inspect(conn).get_columns("quiz_batch_items")}
+
+
+def test_stale_schema_is_refused_without_auto_migrate(tmp_path):
+    engine = temp_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_SCHEMA))
+
+    with pytest.raises(RuntimeError, match="python -m app.migrations"):
+        ensure_schema(engine, auto_migrate=False)
+    assert ensure_schema(engine) == LATEST_VERSION
+    assert ensure_schema(engine, auto_migrate=False) == LATEST_VERSION
@@ -0,0 +1,37 @@
+import pytest
+
+from app.services.question_dedup import DUPLICATE_THRESHOLD, NearDuplicateIndex, signature, similarity
+
+
+def q(text: str, answer: str) -> dict:
+    return {"question": text, "options": [], "answer": answer}
+
+
+DUPLICATES = [
+    (q("When was Alan Turing born?", "1912"), q("In what year was Alan Turing born?", "1912")),
+    (q("Who directed the film Avatar?", "James Cameron"), q("Which person directed the film Avatar?", "James Cameron")),
+    (q("In which year was Microsoft founded?", "1975"), q("What year was Microsoft founded?", "1975")),
+]
+
+DISTINCT = [
+    (q("Who directed Avatar?", "James Cameron"), q("Who wrote Avatar?", "James Cameron")),
+    (q("When did World War II begin?", "1939"), q("When did World War II end?", "1945")),
+    (q("When did WWII begin?", "1939"), q("When did WWII end?", "1945")),
+    (q("When was Alan Turing born?", "1912"), q("When did Alan Turing die?", "1954")),
+]
+
+
+@pytest.mark.parametrize("first, second", DUPLICATES)
+def test_rewordings_are_near_duplicates(first, second):
+    assert similarity(signature(first), signature(second)) >= DUPLICATE_THRESHOLD
+    index = NearDuplicateIndex()
+    index.add(signature(first))
+    assert not index.add_if_new(signature(second))
+
+
+@pytest.mark.parametrize("first, second", DISTINCT)
+def test_different_questions_are_kept(first, second):
+    assert similarity(signature(first), signature(second)) < DUPLICATE_THRESHOLD
+    index = NearDuplicateIndex()
+    index.add(signature(first))
+    assert index.add_if_new(signature(second))
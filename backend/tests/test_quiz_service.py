@@ -0,0 +1,53 @@
+import itertools
+
+from app.database import SessionLocal
+from app.models import Quiz
+from app.services.quiz_service import QuizService
+
+_keys = itertools.count()
+
+
+def make_quiz(key: str, difficulty: str = "mixed", num_questions: int = 6) -> Quiz:
+    return Quiz(
+        url=f"https://en.wikipedia.org/wiki/{key}", canonical_key=f"en:{key}", title=key, summary="",
+        key_entities={}, sections=[], quiz_data=[], related_topics=[], difficulty=difficulty,
+        quality="llm", num_questions=num_questions,
+    )
+
+
+def test_insert_quiz_race_returns_the_stored_quiz():
+    service = QuizService()
+    key = f"Race_{next(_keys)}"
+    first, second = SessionLocal(), SessionLocal()
+    try:
+        winner = service._insert_quiz(first, make_quiz(key))
+        # The loser was built before the winner committed and hits the unique index
+        loser = service._insert_quiz(second, make_quiz(key))
+        assert loser.id == winner.id
+    finally:
+        first.close()
+        second.close()
+
+
+def test_insert_quiz_keeps_other_lengths_separate(db):
+    service = QuizService()
+    key = f"Lengths_{next(_keys)}"
+    short = service._insert_quiz(db, make_quiz(key, num_questions=4))
+    long = service._insert_quiz(db, make_quiz(key, num_questions=10))
+    assert short.id != long.id
+
+
+def test_history_pages_through_to_the_end(db):
+    service = QuizService()
+    for _ in range(5):
+        service._insert_quiz(db, make_quiz(f"History_{next(_keys)}"))
+    expected = [row.id for row in service.get_quiz_history(db, limit=1000)[0]]
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = service.get_quiz_history(db, limit=2, cursor=cursor)
+        seen += [row.id for row in rows]
+        if cursor is None:
+            break
+        assert len(seen) <= len(expected)
+    assert seen == expected
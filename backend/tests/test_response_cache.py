@@ -0,0 +1,91 @@
+import itertools
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers.quiz import quiz_service
+from app.services.response_cache import CachedResponse, ResponseLRUCache, TTLResponseCache, etag_matches, make_etag
+from tests.test_quiz_service import make_quiz
+
+_keys = itertools.count()
+
+
+def entry(body: bytes) -> CachedResponse:
+    return CachedResponse(body=body, etag=make_etag(body))
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ("*", True),
+    ('"other"', False),
+    ("abc", False),
+])
+def test_if_none_match(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def test_etag_follows_the_body():
+    assert make_etag(b"one") == make_etag(b"one") != make_etag(b"two")
+
+
+def test_lru_evicts_by_count_and_by_bytes():
+    cache = ResponseLRUCache(max_entries=2, max_bytes=10)
+    cache.put(1, entry(b"aaa"))
+    cache.put(2, entry(b"bbb"))
+    cache.get(1)
+    cache.put(3, entry(b"ccc"))
+    assert (cache.get(1) is not None, cache.get(2), cache.get(3) is not None) == (True, None, True)
+
+    cache.put(4, entry(b"dddddddd"))
+    assert (len(cache), cache.total_bytes) == (1, 8)
+    cache.put(5, entry(b"x" * 11))
+    assert cache.get(5) is None
+
+    cache.invalidate(4)
+    assert (len(cache), cache.total_bytes) == (0, 0)
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLResponseCache(ttl=0.05)
+    cache.put("page", entry(b"[]"))
+    assert cache.get("page") is not None
+    time.sleep(0.06)
+    assert cache.get("page") is None
+
+    disabled = TTLResponseCache(ttl=0)
+    disabled.put("page", entry(b"[]"))
+    assert disabled.get("page") is None
+
+
+def test_quiz_endpoint_answers_a_matching_etag_with_304(db):
+    quiz = quiz_service._insert_quiz(db, make_quiz(f"Cached_{next(_keys)}"))
+    client = TestClient(app)
+
+    first = client.get(f"/api/quiz/{quiz.id}")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json()["id"] == quiz.id
+    assert "max-age" in first.headers["cache-control"]
+
+    # Served from the in-process cache, so the body and ETag are the same
+    again = client.get(f"/api/quiz/{quiz.id}")
+    assert (again.headers["etag"], again.content) == (etag, first.content)
+
+    revalidated = client.get(f"/api/quiz/{quiz.id}", headers={"If-None-Match": etag})
+    assert (revalidated.status_code, revalidated.content, revalidated.headers["etag"]) == (304, b"", etag)
+
+    changed = client.get(f"/api/quiz/{quiz.id}", headers={"If-None-Match": '"stale"'})
+    assert changed.status_code == 200
+
+
+def test_history_endpoint_sends_an_etag():
+    client = TestClient(app)
+    first = client.get("/api/quiz/history?limit=2")
+    assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+
+    revalidated = client.get("/api/quiz/history?limit=2", headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
@@ -0,0 +1,15 @@
+import pytest
+
+from app.services.scraper import extract_article
+from benchmarks.fixtures import build_article
+
+
+@pytest.mark.parametrize("engine", ["lxml", "bs4"])
+@pytest.mark.parametrize("markup", ["legacy", "mw-heading"])
+def test_sections_are_read_from_either_heading_markup(engine, markup):
+    html = build_article("Heading test", 4, 4, 7, markup)
+    result = extract_article(html, engine)
+
+    assert len(result["sections"]) > 4
+    assert "References" not in result["sections"]
+    assert [group["heading"] for group in result["section_texts"]][:2] == ["Introduction", result["sections"][0]]
@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+from app.services.quiz_service import QuizService
+from app.services.url_canonicalizer import canonicalize_url, record_alias, resolve_alias, try_canonicalize_url
+from tests.test_quiz_service import make_quiz
+
+_keys = itertools.count()
+
+
+@pytest.mark.parametrize("url", [
+    "https://en.wikipedia.org/wiki/Alan_Turing",
+    "http://en.wikipedia.org/wiki/Alan_Turing",
+    "https://EN.Wikipedia.org/wiki/Alan_Turing#Early_life",
+    "https://en.m.wikipedia.org/wiki/Alan_Turing",
+    "https://www.wikipedia.org/wiki/Alan_Turing",
+    "https://wikipedia.org/wiki/alan_Turing",
+    "https://en.wikipedia.org/wiki/Alan%20Turing",
+    "https://en.wikipedia.org/wiki/Alan__Turing_",
+    "https://en.wikipedia.org/w/index.php?title=Alan_Turing&oldid=1",
+    "  https://en.wikipedia.org/wiki/Alan_Turing?useskin=vector  ",
+])
+def test_url_variants_share_one_key(url):
+    assert canonicalize_url(url) == ("https://en.wikipedia.org/wiki/Alan_Turing", "en:Alan_Turing")
+
+
+def test_titles_keep_mediawiki_safe_characters():
+    canonical = canonicalize_url("https://en.wikipedia.org/wiki/C%2B%2B_(programming_language)")
+    assert canonical.url == "https://en.wikipedia.org/wiki/C%2B%2B_(programming_language)"
+    assert canonical.key == "en:C++_(programming_language)"
+
+
+@pytest.mark.parametrize("url", [
+    "https://example.com/wiki/Alan_Turing",
+    "https://en.wikipedia.org/",
+    "https://en.wikipedia.org/wiki/",
+    "https://en.wikipedia.org/w/index.php?search=Turing",
+    "https://de.wikipedia.org/wiki/Alan_Turing",
+    "not a url",
+])
+def test_other_urls_are_rejected(url):
+    with pytest.raises(ValueError):
+        canonicalize_url(url)
+    assert try_canonicalize_url(url) is None
+
+
+def test_alias_resolves_to_the_canonical_article(db):
+    alias, canonical = f"en:Turing_{next(_keys)}", f"en:Alan_Turing_{next(_keys)}"
+    assert resolve_alias(db, alias) == alias
+
+    record_alias(db, alias, canonical)
+    record_alias(db, alias, canonical)
+    record_alias(db, canonical, canonical)
+    db.commit()
+
+    assert resolve_alias(db, alias) == canonical
+    assert resolve_alias(db, canonical) == canonical
+
+
+def test_cached_quiz_is_found_through_an_alias(db):
+    service = QuizService()
+    title = f"Enigma_machine_{next(_keys)}"
+    quiz = service._insert_quiz(db, make_quiz(title))
+    record_alias(db, f"en:Enigma_{title}", f"en:{title}")
+    db.commit()
+
+    assert service.get_cached_quiz(db, f"https://en.m.wikipedia.org/wiki/enigma_{title}", "mixed").id == quiz.id
+    assert service.get_cached_quiz(db, f"https://en.wikipedia.org/wiki/{title}", "hard") is None
@@ -12,13 +12,39 @@ const api = axios.create({
   timeout: 120000
 })
 
+const JOB_POLL_INTERVAL = 1500
+// Stop polling after this long; a job still queued by then is most likely stuck
+const JOB_TIMEOUT = 5 * 60 * 1000
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
 export const generateQuiz = async (url, difficulty = 'mixed', numQuestions = 6) => {
   const response = await api.post('/api/quiz/generate', { 
     url,
     difficulty,
     num_questions: numQuestions
   })
-  return response.data
+  let job = response.data
+  const deadline = Date.now() + JOB_TIMEOUT
+
+  // Generation runs in a background worker; poll the job until it finishes
+  while (job.status === 'queued' || job.status === 'running') {
+    if (Date.now() >= deadline) {
+      const error = new Error('Quiz generation timed out')
+      error.response = { status: 504, data: { detail: 'Quiz generation is taking too long. Please try again later.' } }
+      throw error
+    }
+    await sleep(JOB_POLL_INTERVAL)
+    const poll = await api.get(`/api/quiz/jobs/${job.id}`)
+    job = poll.data
+  }
+
+  if (job.status !== 'succeeded') {
+    const error = new Error(job.error || 'Quiz generation failed')
+    error.response = { status: job.error_status, data: { detail: job.error } }
+    throw error
+  }
+  return getQuizById(job.quiz_id)
 }
 
 export const getQuizHistory = async () => {